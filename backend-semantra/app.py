@@ -8,6 +8,7 @@ from dotenv import load_dotenv
 
 from app.core.config import settings
 from app.core.database import engine, Base
+from app.core.schema import upgrade_schema
 from app.api.v1.api import api_router
 from app.core.celery_app import celery_app
 
@@ -17,8 +18,9 @@ load_dotenv()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Gestion du cycle de vie de l'application"""
-    # Créer les tables au démarrage
+    # Créer les tables au démarrage, puis ajouter les colonnes des tables existantes
     Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
     yield
     # Nettoyage à la fermeture
     pass
@@ -3,17 +3,23 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 import uuid
 from datetime import datetime
+import numpy as np
 
 from app.core.database import get_db
 from app.schemas.analysis import (
     AnalysisCreate, 
     AnalysisResponse, 
     AnalysisUpdate,
+    AnalysisPagesUpdate,
     AnalysisStatusResponse
 )
 from app.services.analysis_service import AnalysisService
+from app.services.artifact_store import ArtifactStore
 from app.services.crawl_service import CrawlService
-from app.tasks.analysis_tasks import start_analysis_task
+from app.services.settings_service import SettingsService
+from app.services.embedding_store import EmbeddingStore
+from app.services.partitioning import load_clusters
+from app.tasks.analysis_tasks import reextract_analysis_task, start_analysis_task, update_analysis_pages_task
 
 router = APIRouter()
 
@@ -25,13 +31,17 @@ async def create_analysis(
 ):
     """Créer une nouvelle analyse SEO"""
     try:
+        user_id = "temp-user-id"  # À remplacer par l'utilisateur authentifié
+        # Budgets de liens de l'utilisateur, sauf s'ils sont fournis pour cette analyse
+        ai_settings = SettingsService(db).analysis_ai_settings(user_id, analysis_data.ai_settings)
+        
         # Créer l'analyse en base
         analysis_service = AnalysisService(db)
         analysis = analysis_service.create_analysis(
-            user_id="temp-user-id",  # À remplacer par l'utilisateur authentifié
+            user_id=user_id,
             sitemap_url=str(analysis_data.sitemap_url),
             crawl_settings=analysis_data.crawl_settings,
-            ai_settings=analysis_data.ai_settings
+            ai_settings=ai_settings
         )
         
         # Lancer l'analyse en arrière-plan
@@ -40,7 +50,7 @@ async def create_analysis(
             analysis_id=analysis.id,
             sitemap_url=str(analysis_data.sitemap_url),
             crawl_settings=analysis_data.crawl_settings,
-            ai_settings=analysis_data.ai_settings
+            ai_settings=ai_settings
         )
         
         return analysis
@@ -114,6 +124,119 @@ async def get_analysis_results(
         "statistics": analysis.statistics
     }
 
+@router.get("/{analysis_id}/clusters")
+async def get_analysis_clusters(
+    analysis_id: str,
+    sample_pages: int = 5,
+    db: Session = Depends(get_db)
+):
+    """Partitions thématiques d'une analyse (moteur de similarité partitionné)"""
+    analysis_service = AnalysisService(db)
+    analysis = analysis_service.get_analysis(analysis_id)
+    
+    if not analysis:
+        raise HTTPException(status_code=404, detail="Analyse non trouvée")
+    
+    # Partitions de la dernière similarité, embeddings de la version qu'elle a lue
+    artifacts = ArtifactStore(analysis_id)
+    try:
+        similar = artifacts.open("similarity")
+        store = EmbeddingStore.open("embeddings", base_dir=artifacts.open("embed", similar.inputs.get("embed")).directory)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Embeddings de l'analyse introuvables")
+    
+    clusters = load_clusters(similar.path("clusters.npz"))
+    if clusters is None:
+        raise HTTPException(status_code=404, detail="Aucune partition enregistrée pour cette analyse")
+    
+    labels, centroids = clusters
+    matrix = store.matrix()
+    urls = store.urls
+    
+    # Pages de chaque partition, les plus proches du centroïde en premier
+    order = np.argsort(labels, kind="stable")
+    bounds = np.searchsorted(labels[order], np.arange(centroids.shape[0] + 1))
+    result = []
+    for cluster in range(centroids.shape[0]):
+        members = order[bounds[cluster]:bounds[cluster + 1]]
+        if members.size == 0:
+            continue
+        closeness = np.asarray(matrix[members], dtype=np.float32) @ centroids[cluster]
+        representatives = members[np.argsort(-closeness)[:sample_pages]]
+        result.append({
+            "cluster": cluster,
+            "size": int(members.size),
+            "pages": [urls[page] for page in representatives.tolist()]
+        })
+    result.sort(key=lambda item: item["size"], reverse=True)
+    
+    return {
+        "analysis_id": analysis_id,
+        "clusters": result
+    }
+
+@router.post("/{analysis_id}/pages")
+async def update_analysis_pages(
+    analysis_id: str,
+    pages_update: AnalysisPagesUpdate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """Mettre à jour les suggestions après l'ajout, la modification ou la suppression de pages"""
+    analysis_service = AnalysisService(db)
+    analysis = analysis_service.get_analysis(analysis_id)
+    
+    if not analysis:
+        raise HTTPException(status_code=404, detail="Analyse non trouvée")
+    
+    if analysis.status != "completed":
+        raise HTTPException(status_code=400, detail="L'analyse n'est pas encore terminée")
+    
+    if not pages_update.upsert and not pages_update.delete:
+        raise HTTPException(status_code=400, detail="Aucune page à mettre à jour")
+    
+    # Seules les pages concernées sont recrawlées et leurs voisins recalculés
+    background_tasks.add_task(
+        update_analysis_pages_task,
+        analysis_id=analysis_id,
+        upsert_urls=[str(url) for url in pages_update.upsert],
+        delete_urls=[str(url) for url in pages_update.delete]
+    )
+    
+    return {
+        "message": "Mise à jour incrémentale lancée",
+        "analysis_id": analysis_id,
+        "upsert": len(pages_update.upsert),
+        "delete": len(pages_update.delete)
+    }
+
+@router.post("/{analysis_id}/reextract")
+async def reextract_analysis(
+    analysis_id: str,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """Relancer l'extraction et les étapes suivantes sur le HTML stocké (sans recrawl)"""
+    analysis_service = AnalysisService(db)
+    analysis = analysis_service.get_analysis(analysis_id)
+    
+    if not analysis:
+        raise HTTPException(status_code=404, detail="Analyse non trouvée")
+    
+    if analysis.status in ("pending", "processing"):
+        raise HTTPException(status_code=400, detail="L'analyse est en cours")
+    
+    if ArtifactStore(analysis_id).current_version("crawl") is None:
+        raise HTTPException(status_code=400, detail="Aucun crawl enregistré pour cette analyse")
+    
+    # Aucune requête réseau : HTML relu depuis l'artefact du crawl et le stockage des blobs
+    background_tasks.add_task(reextract_analysis_task, analysis_id=analysis_id)
+    
+    return {
+        "message": "Nouvelle extraction lancée",
+        "analysis_id": analysis_id
+    }
+
 @router.put("/{analysis_id}", response_model=AnalysisResponse)
 async def update_analysis(
     analysis_id: str,
@@ -4,6 +4,7 @@ from typing import Dict, Any
 
 from app.core.database import get_db
 from app.services.settings_service import SettingsService
+from app.services.ai_providers import provider_registry
 
 router = APIRouter()
 
@@ -86,4 +87,11 @@ async def create_crawl_config(
     return {
         "message": "Configuration de crawl créée avec succès",
         "config": config
-    } 
\ No newline at end of file
+    } 
+
+@router.get("/ai-providers")
+async def get_ai_providers_status():
+    """État des providers IA (disjoncteurs, appels, latence moyenne)"""
+    return {
+        "providers": provider_registry.status()
+    }
\ No newline at end of file
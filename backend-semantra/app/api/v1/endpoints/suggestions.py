@@ -11,10 +11,16 @@ from app.schemas.suggestion import (
     SuggestionFilter,
     SuggestionListResponse,
     AnchorOptimizationRequest,
-    AnchorOptimizationResponse
+    AnchorOptimizationResponse,
+    BulkAnchorOptimizationRequest,
+    BulkAnchorOptimizationStatus
 )
 from app.services.suggestion_service import SuggestionService
+from app.services.analysis_service import AnalysisService
 from app.services.ai_service import AIService
+from app.services.anchor_cache import anchor_cache
+from app.tasks.ai_tasks import bulk_optimize_anchors_task
+from app.core.celery_app import celery_app
 
 router = APIRouter()
 
@@ -115,14 +121,15 @@ async def optimize_anchor(
         raise HTTPException(status_code=404, detail="Suggestion non trouvée")
     
     # Utiliser le service AI pour optimiser l'ancre
-    ai_service = AIService()
-    optimization_result = ai_service.optimize_anchor(
+    ai_service = AIService(db=db)
+    optimization_result = await ai_service.optimize_anchor(
         current_anchor=optimization_request.current_anchor,
         target_page_title=optimization_request.target_page_title,
         context=optimization_request.context,
         provider=optimization_request.provider,
         style=optimization_request.style,
-        max_length=optimization_request.max_length
+        max_length=optimization_request.max_length,
+        db=db
     )
     
     # Sauvegarder l'optimisation
@@ -130,10 +137,20 @@ async def optimize_anchor(
         suggestion_id=suggestion_id,
         original_anchor=optimization_request.current_anchor,
         optimized_anchor=optimization_result["optimized_anchor"],
-        provider=optimization_request.provider,
-        model=optimization_request.provider == "openai" and "gpt-4" or "gemini-pro",
+        provider=optimization_result["provider"],
+        model=optimization_result["model"],
         confidence_score=optimization_result["confidence_score"],
-        alternatives=optimization_result["alternatives"]
+        alternatives=optimization_result["alternatives"],
+        parameters={
+            "target_page_title": optimization_request.target_page_title,
+            "context": optimization_request.context,
+            "style": optimization_request.style,
+            "max_length": optimization_request.max_length,
+            "reasoning": optimization_result.get("reasoning"),
+            "latency": optimization_result.get("latency", 0.0),
+            "cached": optimization_result.get("cached", False)
+        },
+        cache_key=None if optimization_result.get("error") else optimization_result.get("cache_key")
     )
     
     return AnchorOptimizationResponse(
@@ -149,7 +166,7 @@ async def optimize_anchor_standalone(
 ):
     """Optimiser une ancre sans suggestion existante"""
     ai_service = AIService()
-    optimization_result = ai_service.optimize_anchor(
+    optimization_result = await ai_service.optimize_anchor(
         current_anchor=optimization_request.current_anchor,
         target_page_title=optimization_request.target_page_title,
         context=optimization_request.context,
@@ -165,6 +182,59 @@ async def optimize_anchor_standalone(
         reasoning=optimization_result.get("reasoning")
     )
 
+@router.post("/bulk-optimize-anchors", response_model=BulkAnchorOptimizationStatus)
+async def bulk_optimize_anchors(
+    bulk_request: BulkAnchorOptimizationRequest,
+    db: Session = Depends(get_db)
+):
+    """Lancer l'optimisation des ancres de toute une analyse en arrière-plan"""
+    if not AnalysisService(db).get_analysis(bulk_request.analysis_id):
+        raise HTTPException(status_code=404, detail="Analyse non trouvée")
+    
+    task = bulk_optimize_anchors_task.delay(
+        analysis_id=bulk_request.analysis_id,
+        filters=bulk_request.filters.dict(exclude_unset=True) if bulk_request.filters else None,
+        provider=bulk_request.provider,
+        style=bulk_request.style,
+        max_length=bulk_request.max_length,
+        suggestions_per_prompt=bulk_request.suggestions_per_prompt,
+        concurrency=bulk_request.concurrency
+    )
+    
+    return BulkAnchorOptimizationStatus(task_id=task.id, status="queued")
+
+@router.get("/bulk-optimize-anchors/{task_id}", response_model=BulkAnchorOptimizationStatus)
+async def get_bulk_optimize_anchors_status(task_id: str):
+    """Suivre la progression d'une optimisation d'ancres en masse"""
+    result = celery_app.AsyncResult(task_id)
+    info = result.info if isinstance(result.info, dict) else {}
+    
+    if result.state == "PROGRESS":
+        status = "processing"
+    elif result.state == "SUCCESS":
+        status = "failed" if info.get("status") == "error" else "completed"
+    elif result.state == "FAILURE":
+        status = "failed"
+        info = {"error": str(result.info)}
+    else:
+        status = "queued"
+    
+    return BulkAnchorOptimizationStatus(
+        task_id=task_id,
+        status=status,
+        total=info.get("total", 0),
+        processed=info.get("processed", 0),
+        optimized=info.get("optimized", 0),
+        cached=info.get("cached", 0),
+        failed=info.get("failed", 0),
+        error=info.get("error")
+    )
+
+@router.get("/anchor-cache/stats")
+async def get_anchor_cache_stats():
+    """Statistiques du cache d'optimisation d'ancres"""
+    return anchor_cache.stats()
+
 @router.post("/batch-update")
 async def batch_update_suggestions(
     suggestion_ids: List[str],
@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.signals import worker_ready
 from app.core.config import settings
 
 # Configuration Celery
@@ -26,4 +27,23 @@ celery_app.conf.update(
     task_soft_time_limit=25 * 60,  # 25 minutes
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
-) 
\ No newline at end of file
+    # Étapes de l'analyse : workers dédiés possibles par type de charge
+    task_routes={
+        "app.tasks.analysis_tasks.discover_stage_task": {"queue": settings.ANALYSIS_CRAWL_QUEUE},
+        "app.tasks.analysis_tasks.crawl_stage_task": {"queue": settings.ANALYSIS_CRAWL_QUEUE},
+        "app.tasks.analysis_tasks.crawl_shard_task": {"queue": settings.ANALYSIS_CRAWL_QUEUE},
+        "app.tasks.analysis_tasks.crawl_commit_task": {"queue": settings.ANALYSIS_CRAWL_QUEUE},
+        "app.tasks.analysis_tasks.extract_stage_task": {"queue": settings.ANALYSIS_CRAWL_QUEUE},
+        "app.tasks.analysis_tasks.embed_stage_task": {"queue": settings.ANALYSIS_EMBEDDING_QUEUE},
+        "app.tasks.analysis_tasks.similarity_stage_task": {"queue": settings.ANALYSIS_SIMILARITY_QUEUE},
+        "app.tasks.analysis_tasks.suggestions_stage_task": {"queue": settings.ANALYSIS_SIMILARITY_QUEUE},
+    },
+) 
+
+@worker_ready.connect
+def upgrade_schema_on_start(**kwargs):
+    """Schéma à jour avant les premières tâches (workers démarrés sans l'API)"""
+    from app.core.database import engine
+    from app.core.schema import upgrade_schema
+    
+    upgrade_schema(engine)
\ No newline at end of file
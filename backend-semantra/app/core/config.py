@@ -40,6 +40,83 @@ class Settings(BaseSettings):
         "text-embedding-3-large"
     ]
     
+    # Configuration du fournisseur d'embeddings local (sentence-transformers)
+    LOCAL_EMBEDDING_MODEL: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+    LOCAL_EMBEDDING_BATCH_SIZE: int = 64
+    LOCAL_EMBEDDING_THREADS: int = 0  # 0 = valeur par défaut de torch
+    LOCAL_EMBEDDING_DEVICE: str = "cpu"
+    
+    # Modèles utilisés pour l'optimisation des ancres (sortie JSON structurée)
+    OPENAI_ANCHOR_MODEL: str = "gpt-4-turbo-preview"
+    GEMINI_ANCHOR_MODEL: str = "gemini-pro"
+    
+    # Cache des optimisations d'ancres (mémoire, Redis optionnel)
+    ANCHOR_CACHE_MAX_ENTRIES: int = 10000
+    ANCHOR_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    ANCHOR_CACHE_REDIS_ENABLED: bool = False
+    
+    # Optimisation d'ancres en masse (tâche Celery)
+    ANCHOR_BULK_SUGGESTIONS_PER_PROMPT: int = 10
+    ANCHOR_BULK_CONCURRENCY: int = 8
+    ANCHOR_BULK_DB_BATCH_SIZE: int = 500
+    
+    # Enregistrement des suggestions d'une analyse (lignes par transaction)
+    SUGGESTION_DB_BATCH_SIZE: int = 1000
+    SUGGESTION_DB_USE_COPY: bool = True
+    
+    # Limites de débit des providers (requêtes par minute)
+    OPENAI_REQUESTS_PER_MINUTE: int = 500
+    GEMINI_REQUESTS_PER_MINUTE: int = 60
+    
+    # Registre des providers IA (timeouts, disjoncteurs, bascule)
+    OPENAI_TIMEOUT_SECONDS: float = 30.0
+    GEMINI_TIMEOUT_SECONDS: float = 30.0
+    LOCAL_TIMEOUT_SECONDS: float = 300.0
+    OPENAI_MAX_CONNECTIONS: int = 20
+    AI_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    AI_CIRCUIT_RECOVERY_SECONDS: float = 30.0
+    AI_RETRY_ATTEMPTS: int = 5
+    AI_FALLBACK_PROVIDERS: List[str] = ["openai", "gemini"]
+    EMBEDDING_REQUEST_BATCH_SIZE: int = 64  # textes par requête d'embedding distante
+    
+    # Service d'embeddings partagé (python -m app.services.embedding_batcher)
+    EMBEDDING_BATCHER_ENABLED: bool = False
+    EMBEDDING_BATCHER_MAX_BATCH: int = 256  # textes par lot formé
+    EMBEDDING_BATCHER_MAX_WAIT_MS: float = 5.0  # attente maximale avant d'envoyer un lot incomplet
+    EMBEDDING_BATCHER_JOB_SIZE: int = 64  # textes par dépôt d'une tâche (unité d'équité)
+    EMBEDDING_BATCHER_CONCURRENCY: int = 4  # lots exécutés en parallèle
+    EMBEDDING_BATCHER_TIMEOUT_SECONDS: float = 300.0
+
+    # Stockage des embeddings (fichiers mappés en mémoire, un dossier par analyse)
+    EMBEDDING_STORE_DIR: str = "data/embeddings"
+    
+    # Index de voisinage incrémental (un dossier par site)
+    NEIGHBOR_INDEX_DIR: str = "data/neighbor_index"
+    
+    # Analyse en étapes (chaîne Celery) et artefacts versionnés (un dossier par analyse)
+    ANALYSIS_STAGED_PIPELINE: bool = True
+    ARTIFACT_STORE_DIR: str = "data/artifacts"
+    ARTIFACT_KEEP_VERSIONS: int = 2  # versions conservées par étape (en plus de celles lues en aval)
+    ANALYSIS_STAGE_MAX_RETRIES: int = 3
+    ANALYSIS_STAGE_RETRY_DELAY_SECONDS: int = 30  # doublé à chaque nouvel essai
+    ANALYSIS_CRAWL_SHARD_SIZE: int = 5000  # URLs par tâche de crawl
+    ANALYSIS_CRAWL_MAX_SHARDS: int = 8
+    # Pages crawlées au format Parquet (groupes de lignes écrits pendant le crawl)
+    PAGE_STORE_ROW_GROUP_SIZE: int = 500
+    PAGE_STORE_COMPRESSION: str = "zstd"
+    # HTML brut hors des pages : blobs zstd adressés par empreinte, partagés entre analyses
+    HTML_STORE_ENABLED: bool = True
+    HTML_STORE_DIR: str = "data/html"
+    HTML_STORE_COMPRESSION_LEVEL: int = 9
+    HTML_STORE_DICTIONARY: bool = True  # dictionnaire zstd entraîné par site
+    HTML_STORE_DICTIONARY_SIZE: int = 112640  # octets
+    HTML_STORE_DICTIONARY_SAMPLES: int = 200  # premières pages crawlées servant à l'entraîner
+    HTML_STORE_QUEUE_SIZE: int = 256  # pages en attente d'écriture
+    # Files Celery des étapes (workers spécialisés : celery worker -Q <file>)
+    ANALYSIS_CRAWL_QUEUE: str = "celery"
+    ANALYSIS_EMBEDDING_QUEUE: str = "celery"
+    ANALYSIS_SIMILARITY_QUEUE: str = "celery"
+    
     # Configuration Google Sheets
     GOOGLE_SHEETS_CREDENTIALS_FILE: Optional[str] = None
     
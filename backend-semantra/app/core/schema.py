@@ -0,0 +1,46 @@
+"""Mises à niveau du schéma des bases existantes
+
+`Base.metadata.create_all` crée les tables absentes mais ne modifie jamais
+une table existante : chaque colonne ajoutée à un modèle après un premier
+déploiement est déclarée ici, avec son index. L'opération est idempotente
+(colonnes et index déjà présents ignorés) et s'exécute au démarrage de l'API ;
+elle peut aussi être lancée seule : `python -m app.core.schema`.
+"""
+from typing import List, Tuple
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+# (table, colonne, type SQL, index créé sur la colonne)
+SCHEMA_UPGRADES: List[Tuple[str, str, str, bool]] = [
+    ("anchor_optimizations", "cache_key", "VARCHAR", True),
+]
+
+def upgrade_schema(engine: Engine) -> List[str]:
+    """Ajouter les colonnes et index manquants ; instructions exécutées"""
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    executed = []
+
+    with engine.begin() as connection:
+        for table, column, column_type, indexed in SCHEMA_UPGRADES:
+            if table not in tables:
+                # Table créée par create_all avec toutes ses colonnes
+                continue
+            if column not in {existing["name"] for existing in inspector.get_columns(table)}:
+                statement = f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"
+                connection.execute(text(statement))
+                executed.append(statement)
+            # Même nom d'index que create_all (convention SQLAlchemy ix_<table>_<colonne>)
+            index_name = f"ix_{table}_{column}"
+            if indexed and index_name not in {index["name"] for index in inspector.get_indexes(table)}:
+                statement = f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({column})"
+                connection.execute(text(statement))
+                executed.append(statement)
+
+    return executed
+
+if __name__ == "__main__":
+    from app.core.database import engine
+
+    for statement in upgrade_schema(engine) or ["Schéma à jour"]:
+        print(statement)
\ No newline at end of file
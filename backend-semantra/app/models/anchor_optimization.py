@@ -27,6 +27,9 @@ class AnchorOptimization(Base):
     # Paramètres utilisés
     parameters = Column(JSON, default={})
     
+    # Clé du cache d'optimisation (entrées normalisées du prompt)
+    cache_key = Column(String, index=True)
+    
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
@@ -42,6 +42,11 @@ class AnalysisCreate(BaseModel):
             }
         }
 
+class AnalysisPagesUpdate(BaseModel):
+    """Pages ajoutées / modifiées (recrawlées) ou supprimées depuis l'analyse"""
+    upsert: List[HttpUrl] = Field(default_factory=list)
+    delete: List[HttpUrl] = Field(default_factory=list)
+
 class AnalysisUpdate(BaseModel):
     status: Optional[AnalysisStatus] = None
     progress: Optional[int] = Field(None, ge=0, le=100)
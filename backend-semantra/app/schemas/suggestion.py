@@ -78,4 +78,34 @@ class AnchorOptimizationResponse(BaseModel):
     optimized_anchor: str
     confidence_score: float
     alternatives: List[str]
-    reasoning: Optional[str] = None 
\ No newline at end of file
+    reasoning: Optional[str] = None
+
+class BulkAnchorOptimizationRequest(BaseModel):
+    analysis_id: str
+    filters: Optional[SuggestionFilter] = None
+    provider: Optional[str] = None  # openai, gemini (par défaut : paramètres IA de l'analyse)
+    style: str = "natural"  # natural, commercial, technical
+    max_length: int = Field(50, ge=1, le=200)
+    suggestions_per_prompt: Optional[int] = Field(None, ge=1, le=50)
+    concurrency: Optional[int] = Field(None, ge=1, le=64)
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "analysis_id": "3f1c2d4e-...",
+                "filters": {"status": "pending", "min_score": 0.8},
+                "provider": "openai",
+                "style": "natural",
+                "max_length": 50
+            }
+        }
+
+class BulkAnchorOptimizationStatus(BaseModel):
+    task_id: str
+    status: str
+    total: int = 0
+    processed: int = 0
+    optimized: int = 0
+    cached: int = 0
+    failed: int = 0
+    error: Optional[str] = None 
\ No newline at end of file
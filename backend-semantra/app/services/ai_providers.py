@@ -0,0 +1,421 @@
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+import time
+import weakref
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable
+import numpy as np
+from asyncio_throttle import Throttler
+from app.core.config import settings
+
+class ProviderUnavailableError(Exception):
+    """Aucun provider n'a pu traiter la requête"""
+
+class UnsupportedOperationError(ProviderUnavailableError):
+    """Opération non proposée par le provider (bascule sans toucher au disjoncteur)"""
+
+class CircuitBreaker:
+    """Disjoncteur : coupe un provider après des échecs consécutifs
+
+    closed -> open après `failure_threshold` échecs ; open -> half_open après
+    `recovery_timeout` secondes. En half_open, un seul appel (la sonde) passe,
+    les autres sont refusés jusqu'à son issue : un succès referme le circuit,
+    un échec le rouvre.
+    """
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Le provider peut-il être appelé ? (en half_open : seulement la sonde)"""
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.recovery_timeout:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def release(self):
+        """Appel terminé sans verdict (annulation, opération non supportée) : libérer la sonde"""
+        with self._lock:
+            self._probing = False
+
+    def retry_after(self) -> float:
+        """Secondes avant la prochaine tentative autorisée"""
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._probing = False
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+class AIProvider(ABC):
+    """Provider d'IA : embeddings et, selon le provider, complétion JSON"""
+
+    name = ""
+    supports_completion = False
+    supports_embeddings = False
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        completion_model: Optional[str] = None,
+        timeout: float = 30.0,
+        requests_per_minute: Optional[int] = None
+    ):
+        self.api_key = api_key
+        self.completion_model = completion_model
+        self.timeout = timeout
+        # Limite de débit partagée par tous les appels du processus vers ce provider
+        self.throttler = Throttler(rate_limit=requests_per_minute, period=60) if requests_per_minute else None
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.AI_CIRCUIT_FAILURE_THRESHOLD,
+            recovery_timeout=settings.AI_CIRCUIT_RECOVERY_SECONDS
+        )
+        self.stats = {"calls": 0, "failures": 0, "total_latency": 0.0}
+
+    @property
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    async def complete_json(self, prompt: str, max_tokens: int, model: Optional[str] = None) -> str:
+        """Complétion JSON (providers avec `supports_completion`)"""
+        raise UnsupportedOperationError(f"Complétion non supportée par {self.name}")
+
+    @abstractmethod
+    async def embed(self, texts: List[str], model: str) -> np.ndarray:
+        """Embeddings d'une liste de textes"""
+
+    async def aclose(self):
+        """Fermer les connexions ouvertes sur la boucle courante (aucune par défaut)"""
+
+class OpenAIProvider(AIProvider):
+    """OpenAI avec un client asynchrone poolé par boucle d'événements"""
+
+    name = "openai"
+    supports_completion = True
+    supports_embeddings = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Les connexions httpx sont liées à une boucle : un client par boucle
+        self._clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+    def _client(self):
+        import httpx
+        import openai
+
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                timeout=self.timeout,
+                max_retries=0,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                        max_keepalive_connections=settings.OPENAI_MAX_CONNECTIONS
+                    ),
+                    timeout=self.timeout
+                )
+            )
+            self._clients[loop] = client
+        return client
+
+    async def aclose(self):
+        """Fermer le client de la boucle courante (pool httpx) avant la fermeture de la boucle"""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+
+    async def complete_json(self, prompt: str, max_tokens: int, model: Optional[str] = None) -> str:
+        response = await self._client().chat.completions.create(
+            model=model or self.completion_model,
+            messages=[
+                {"role": "system", "content": "Vous êtes un expert SEO spécialisé dans l'optimisation des ancres de liens. Vous répondez en JSON."},
+                {"role": "user", "content": prompt}
+            ],
+            response_format={"type": "json_object"},
+            max_tokens=max_tokens,
+            temperature=0.7
+        )
+        return response.choices[0].message.content
+
+    async def embed(self, texts: List[str], model: str) -> np.ndarray:
+        response = await self._client().embeddings.create(input=texts, model=model)
+        return np.asarray([item.embedding for item in response.data], dtype=np.float32)
+
+class GeminiProvider(AIProvider):
+    """Google Gemini (SDK synchrone exécuté hors de la boucle d'événements)"""
+
+    name = "gemini"
+    supports_completion = True
+    supports_embeddings = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._models: Dict[str, Any] = {}
+        self._configured = False
+
+    def _genai(self):
+        """SDK Gemini configuré avec la clé du provider"""
+        import google.generativeai as genai
+
+        if not self._configured:
+            genai.configure(api_key=self.api_key)
+            self._configured = True
+        return genai
+
+    def _model(self, model_name: str):
+        genai = self._genai()
+
+        model = self._models.get(model_name)
+        if model is None:
+            model = genai.GenerativeModel(model_name)
+            self._models[model_name] = model
+        return model
+
+    async def complete_json(self, prompt: str, max_tokens: int, model: Optional[str] = None) -> str:
+        generative_model = self._model(model or self.completion_model)
+        response = await asyncio.to_thread(
+            generative_model.generate_content,
+            prompt,
+            generation_config={"max_output_tokens": max_tokens}
+        )
+        return response.text
+
+    async def embed(self, texts: List[str], model: str) -> np.ndarray:
+        genai = self._genai()
+        model = model if model.startswith("models/") else f"models/{model}"
+        response = await asyncio.to_thread(genai.embed_content, model=model, content=texts)
+        return np.asarray(response["embedding"], dtype=np.float32)
+
+class LocalProvider(AIProvider):
+    """Embeddings locaux sentence-transformers (pas de complétion)"""
+
+    name = "local"
+    supports_embeddings = True
+
+    @property
+    def is_configured(self) -> bool:
+        return True
+
+    async def embed(self, texts: List[str], model: str) -> np.ndarray:
+        from app.services.local_embedding_service import LocalEmbeddingService
+
+        return await LocalEmbeddingService(model_name=model).embed_async(texts)
+
+# Fabriques des providers connus
+PROVIDER_CLASSES = {
+    "openai": OpenAIProvider,
+    "gemini": GeminiProvider,
+    "local": LocalProvider
+}
+
+class ProviderRegistry:
+    """Registre des providers : clients poolés, disjoncteurs et bascule"""
+
+    def __init__(self):
+        self._providers: Dict[Tuple[str, Optional[str]], AIProvider] = {}
+        self._lock = threading.Lock()
+
+    def _defaults(self, name: str) -> Dict[str, Any]:
+        """Clé API, modèle de complétion et timeout par défaut d'un provider"""
+        if name == "openai":
+            return {
+                "api_key": settings.OPENAI_API_KEY,
+                "completion_model": settings.OPENAI_ANCHOR_MODEL,
+                "timeout": settings.OPENAI_TIMEOUT_SECONDS,
+                "requests_per_minute": settings.OPENAI_REQUESTS_PER_MINUTE
+            }
+        if name == "gemini":
+            return {
+                "api_key": settings.GEMINI_API_KEY,
+                "completion_model": settings.GEMINI_ANCHOR_MODEL,
+                "timeout": settings.GEMINI_TIMEOUT_SECONDS,
+                "requests_per_minute": settings.GEMINI_REQUESTS_PER_MINUTE
+            }
+        return {"timeout": settings.LOCAL_TIMEOUT_SECONDS}
+
+    def get(self, name: str, api_key: Optional[str] = None) -> AIProvider:
+        """Provider partagé (un par nom et clé API) pour réutiliser les connexions"""
+        if name not in PROVIDER_CLASSES:
+            raise ValueError(f"Provider non supporté: {name}")
+
+        key = (name, api_key)
+        provider = self._providers.get(key)
+        if provider is None:
+            with self._lock:
+                provider = self._providers.get(key)
+                if provider is None:
+                    options = self._defaults(name)
+                    if api_key:
+                        options["api_key"] = api_key
+                    provider = PROVIDER_CLASSES[name](**options)
+                    self._providers[key] = provider
+        return provider
+
+    async def aclose(self):
+        """Fermer les clients ouverts sur la boucle courante par tous les providers"""
+        for provider in list(self._providers.values()):
+            try:
+                await provider.aclose()
+            except Exception as e:
+                print(f"Erreur lors de la fermeture du provider {provider.name}: {str(e)}")
+
+    def resolve_embedding_model(self, db, model_name: str, provider_name: Optional[str] = None) -> Tuple[AIProvider, str]:
+        """Provider et identifiant de modèle d'embedding (table EmbeddingModel en priorité)"""
+        if db is not None:
+            from app.models.embedding_model import EmbeddingModel
+
+            try:
+                model = db.query(EmbeddingModel).filter(
+                    EmbeddingModel.name == model_name,
+                    EmbeddingModel.is_active == True
+                ).first()
+            except Exception as e:
+                print(f"Erreur de lecture des modèles d'embedding: {str(e)}")
+                model = None
+
+            if model:
+                return self.get(model.provider, model.api_key or None), model.model_id
+
+        if provider_name is None:
+            provider_name = "openai" if model_name in settings.EMBEDDING_MODELS else "local"
+        return self.get(provider_name), model_name
+
+    def completion_chain(
+        self,
+        primary: str,
+        fallbacks: Optional[List[str]] = None
+    ) -> List[AIProvider]:
+        """Provider principal puis providers de secours configurés"""
+        if fallbacks is None:
+            fallbacks = settings.AI_FALLBACK_PROVIDERS
+
+        chain = [self.get(primary)]
+        for name in fallbacks:
+            if name == primary or name not in PROVIDER_CLASSES:
+                continue
+            provider = self.get(name)
+            if provider.supports_completion and provider.is_configured:
+                chain.append(provider)
+        return chain
+
+    async def call(
+        self,
+        provider: AIProvider,
+        operation: Callable[[AIProvider], Awaitable[Any]],
+        throttle: bool = False
+    ) -> Any:
+        """Appeler un provider sous son timeout, en alimentant son disjoncteur
+
+        `throttle` : attendre la limite de débit du provider (hors timeout).
+        """
+        if throttle and provider.throttler is not None:
+            await provider.throttler.acquire()
+
+        if not provider.breaker.allow():
+            raise ProviderUnavailableError(f"Circuit ouvert pour {provider.name}")
+
+        start = time.perf_counter()
+        provider.stats["calls"] += 1
+        try:
+            result = await asyncio.wait_for(operation(provider), timeout=provider.timeout)
+        except UnsupportedOperationError:
+            provider.breaker.release()
+            raise
+        except Exception:
+            provider.stats["failures"] += 1
+            provider.breaker.record_failure()
+            raise
+        except BaseException:
+            # Annulation : ni succès ni échec du provider
+            provider.breaker.release()
+            raise
+        finally:
+            provider.stats["total_latency"] += time.perf_counter() - start
+
+        provider.breaker.record_success()
+        return result
+
+    async def call_with_failover(
+        self,
+        chain: List[AIProvider],
+        operation: Callable[[AIProvider], Awaitable[Any]],
+        throttle: bool = False
+    ) -> Tuple[Any, AIProvider]:
+        """Essayer chaque provider de la chaîne jusqu'au premier succès (chacun sous sa limite de débit)"""
+        errors = []
+        for provider in chain:
+            try:
+                return await self.call(provider, operation, throttle=throttle), provider
+            except Exception as e:
+                print(f"Provider {provider.name} en échec, bascule: {str(e)}")
+                errors.append(f"{provider.name}: {str(e)}")
+
+        raise ProviderUnavailableError("; ".join(errors) or "Aucun provider disponible")
+
+    async def call_with_retry(
+        self,
+        provider: AIProvider,
+        operation: Callable[[AIProvider], Awaitable[Any]],
+        attempts: int = None
+    ) -> Any:
+        """Réessayer le même provider (ex. embeddings, dont l'espace ne peut pas changer)
+
+        Quand le circuit est ouvert, attendre sa réouverture plutôt qu'échouer :
+        une panne se traduit par de la latence et non par l'échec de l'analyse.
+        """
+        attempts = attempts or settings.AI_RETRY_ATTEMPTS
+        delay = 1.0
+        for attempt in range(attempts):
+            try:
+                return await self.call(provider, operation)
+            except Exception:
+                if attempt == attempts - 1:
+                    raise
+                await asyncio.sleep(max(delay, provider.breaker.retry_after()))
+                delay = min(delay * 2, 30.0)
+
+    def status(self) -> List[Dict[str, Any]]:
+        """État des providers instanciés (disjoncteur, latence moyenne)"""
+        return [
+            {
+                "provider": provider.name,
+                "configured": provider.is_configured,
+                "circuit": provider.breaker.state,
+                "calls": provider.stats["calls"],
+                "failures": provider.stats["failures"],
+                "average_latency": (
+                    provider.stats["total_latency"] / provider.stats["calls"]
+                    if provider.stats["calls"] else 0.0
+                )
+            }
+            for provider in self._providers.values()
+        ]
+
+# Registre partagé par processus
+provider_registry = ProviderRegistry()
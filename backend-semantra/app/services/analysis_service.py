@@ -122,6 +122,19 @@ class AnalysisService:
         self.db.commit()
         return True
     
+    def start_analysis(self, analysis_id: str) -> bool:
+        """Marquer une analyse comme en cours"""
+        analysis = self.get_analysis(analysis_id)
+        if not analysis:
+            return False
+        
+        analysis.status = "processing"
+        analysis.progress = 0
+        analysis.started_at = datetime.utcnow()
+        
+        self.db.commit()
+        return True
+    
     def complete_analysis(
         self,
         analysis_id: str,
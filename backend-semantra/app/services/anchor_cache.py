@@ -0,0 +1,234 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+from app.core.config import settings
+
+def _normalize(text: Any) -> str:
+    """Normaliser une entrée de prompt (casse, espaces)"""
+    return re.sub(r"\s+", " ", str(text or "")).strip().lower()
+
+class AnchorOptimizationCache:
+    """Cache des réponses d'optimisation d'ancres
+
+    Niveau 1 : mémoire du processus (LRU + TTL).
+    Niveau 2 (optionnel) : Redis partagé entre les workers.
+    Niveau 3 : historique AnchorOptimization en base, utilisé pour réchauffer
+    le cache lors d'un défaut.
+    """
+
+    REDIS_PREFIX = "semantra:anchor-cache:"
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        ttl_seconds: int = 86400,
+        redis_url: Optional[str] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.redis_url = redis_url
+
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+
+        self.stats_counters = {
+            "hits": 0,
+            "memory_hits": 0,
+            "redis_hits": 0,
+            "history_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "saved_latency_seconds": 0.0
+        }
+
+    @staticmethod
+    def make_key(
+        provider: str,
+        model: str,
+        current_anchor: str,
+        target_page_title: str,
+        context: str,
+        style: str,
+        max_length: int
+    ) -> str:
+        """Clé de cache stable sur les entrées normalisées"""
+        payload = json.dumps(
+            [
+                provider,
+                model,
+                _normalize(current_anchor),
+                _normalize(target_page_title),
+                _normalize(context),
+                _normalize(style),
+                int(max_length)
+            ],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _get_redis(self):
+        """Client Redis paresseux (None si désactivé ou indisponible)"""
+        if not self.redis_url:
+            return None
+        if self._redis is None:
+            try:
+                import redis
+
+                self._redis = redis.Redis.from_url(self.redis_url, socket_timeout=0.2)
+            except Exception as e:
+                print(f"Cache d'ancres Redis indisponible: {str(e)}")
+                self.redis_url = None
+                return None
+        return self._redis
+
+    def _count_hit(self, level: str, entry: Dict[str, Any]):
+        self.stats_counters["hits"] += 1
+        self.stats_counters[f"{level}_hits"] += 1
+        self.stats_counters["saved_latency_seconds"] += entry.get("latency", 0.0)
+
+    def _store_memory(self, key: str, entry: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats_counters["evictions"] += 1
+
+    def get(self, key: str, db=None) -> Optional[Dict[str, Any]]:
+        """Récupérer un résultat en cache (mémoire, puis Redis, puis historique)"""
+        return self.get_many([key], db=db).get(key)
+
+    def get_many(self, keys: List[str], db=None) -> Dict[str, Dict[str, Any]]:
+        """Résultats en cache de plusieurs clés (un aller-retour Redis et une requête d'historique au plus)"""
+        now = time.time()
+        found: Dict[str, Dict[str, Any]] = {}
+        missing = []
+
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                entry = self._entries.get(key)
+                if entry is not None:
+                    if entry["expires_at"] > now:
+                        self._entries.move_to_end(key)
+                        self._count_hit("memory", entry)
+                        found[key] = entry["result"]
+                        continue
+                    del self._entries[key]
+                missing.append(key)
+
+        client = self._get_redis() if missing else None
+        if client is not None:
+            try:
+                raws = client.mget([self.REDIS_PREFIX + key for key in missing])
+                remaining = []
+                for key, raw in zip(missing, raws):
+                    if not raw:
+                        remaining.append(key)
+                        continue
+                    entry = json.loads(raw)
+                    entry["expires_at"] = now + self.ttl_seconds
+                    self._store_memory(key, entry)
+                    self._count_hit("redis", entry)
+                    found[key] = entry["result"]
+                missing = remaining
+            except Exception as e:
+                print(f"Erreur de lecture du cache d'ancres Redis: {str(e)}")
+
+        if db is not None and missing:
+            entries = self._load_from_history(db, missing)
+            for key, entry in entries.items():
+                self._store_memory(key, entry)
+                self._count_hit("history", entry)
+                found[key] = entry["result"]
+            missing = [key for key in missing if key not in entries]
+
+        self.stats_counters["misses"] += len(missing)
+        return found
+
+    def _load_from_history(self, db, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Réchauffer depuis la dernière optimisation enregistrée pour chaque clé"""
+        from app.models.anchor_optimization import AnchorOptimization
+
+        try:
+            optimizations = db.query(AnchorOptimization).filter(
+                AnchorOptimization.cache_key.in_(keys)
+            ).order_by(AnchorOptimization.created_at.desc()).all()
+        except Exception as e:
+            print(f"Erreur de lecture de l'historique d'ancres: {str(e)}")
+            return {}
+
+        entries: Dict[str, Dict[str, Any]] = {}
+        for optimization in optimizations:
+            if optimization.cache_key in entries:
+                continue
+
+            # Ne pas resservir un historique plus ancien que le TTL
+            if optimization.created_at and time.time() - optimization.created_at.timestamp() > self.ttl_seconds:
+                continue
+
+            parameters = optimization.parameters or {}
+            entries[optimization.cache_key] = {
+                "result": {
+                    "optimized_anchor": optimization.optimized_anchor,
+                    "confidence_score": optimization.confidence_score,
+                    "alternatives": optimization.alternatives or [],
+                    "reasoning": parameters.get("reasoning"),
+                    "provider": optimization.provider,
+                    "model": optimization.model
+                },
+                "latency": parameters.get("latency", 0.0),
+                "expires_at": time.time() + self.ttl_seconds
+            }
+        return entries
+
+    def set(self, key: str, result: Dict[str, Any], latency: float = 0.0):
+        """Mettre un résultat en cache avec la latence de l'appel d'origine"""
+        entry = {
+            "result": result,
+            "latency": latency,
+            "expires_at": time.time() + self.ttl_seconds
+        }
+        self._store_memory(key, entry)
+
+        client = self._get_redis()
+        if client is not None:
+            try:
+                client.setex(
+                    self.REDIS_PREFIX + key,
+                    self.ttl_seconds,
+                    json.dumps({"result": result, "latency": latency}, ensure_ascii=False)
+                )
+            except Exception as e:
+                print(f"Erreur d'écriture du cache d'ancres Redis: {str(e)}")
+
+    def clear(self):
+        """Vider le cache mémoire et les compteurs"""
+        with self._lock:
+            self._entries.clear()
+        for counter in self.stats_counters:
+            self.stats_counters[counter] = 0.0 if counter == "saved_latency_seconds" else 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Taux de succès et latence économisée"""
+        lookups = self.stats_counters["hits"] + self.stats_counters["misses"]
+        return {
+            **self.stats_counters,
+            "saved_latency_seconds": round(self.stats_counters["saved_latency_seconds"], 3),
+            "hit_rate": self.stats_counters["hits"] / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "redis_enabled": bool(self.redis_url)
+        }
+
+# Instance partagée par processus
+anchor_cache = AnchorOptimizationCache(
+    max_entries=settings.ANCHOR_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.ANCHOR_CACHE_TTL_SECONDS,
+    redis_url=settings.REDIS_URL if settings.ANCHOR_CACHE_REDIS_ENABLED else None
+)
@@ -0,0 +1,234 @@
+import re
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+
+# Mots vides exclus en début et fin de phrase-clé (français et anglais courants)
+ANCHOR_STOP_WORDS = frozenset("""
+a à afin ai aie al alors au aucun aussi autre aux avec avez avoir c ça ce ceci cela celle celles
+celui ces cet cette chez ci comme comment d dans de des deux donc dont du elle elles en encore
+entre est et être eu fait faire faut il ils j je l la le les leur leurs lui m ma mais me même mes
+moi mon n ne ni nos notre nous on ont ou où par pas peu peut plus pour pourquoi qu quand que quel
+quelle quelles quels qui s sa sans se ses si son sont sous sur t ta te tes toi ton tous tout
+toute toutes très tu un une vers vos votre vous y
+about after all also an and any are as at be been but by can do for from has have how if in
+into is it its more my no not of on or our out so than that the their them then there these
+they this to up was we what when where which who why will with you your
+accueil page pages site cliquez ici lire suite voir savoir
+""".split())
+
+# Mots de deux caractères ou plus, traits d'union internes autorisés
+TOKEN_PATTERN = r"(?u)\b[^\W_][\w-]*[^\W_]\b"
+_TOKEN_RE = re.compile(TOKEN_PATTERN)
+
+# Les phrases-clés ne traversent pas ces séparateurs (titre | site, ponctuation)
+_SEGMENT_RE = re.compile(r"[\n.!?;:|•·–—()\[\]{}\"«»]+")
+
+class KeyphraseAnchorGenerator:
+    """Génération locale d'ancres par phrases-clés TF-IDF
+
+    Une matrice TF-IDF creuse des n-grammes (titre, titres Hn, description)
+    est construite une seule fois pour toutes les pages ; les meilleures
+    phrases-clés de chaque cible sont extraites en une passe vectorisée, puis
+    classées pour chaque paire selon leur recouvrement avec le texte de la
+    page source. Aucun appel à un modèle de langage.
+    """
+
+    def __init__(
+        self,
+        max_ngram: int = 3,
+        candidates_per_target: int = 5,
+        min_df: int = 2,
+        max_df: float = 0.2,
+        max_anchor_length: int = 60,
+        overlap_weight: float = 1.0
+    ):
+        self.max_ngram = max_ngram
+        self.candidates_per_target = candidates_per_target
+        self.min_df = min_df
+        self.max_df = max_df
+        self.max_anchor_length = max_anchor_length
+        self.overlap_weight = overlap_weight
+
+        self.phrases: Optional[np.ndarray] = None
+        self.candidate_ids: Optional[np.ndarray] = None
+        self.candidate_scores: Optional[np.ndarray] = None
+        self._phrase_tokens: Optional[np.ndarray] = None
+        self._phrase_lengths: Optional[np.ndarray] = None
+        self._presence_keys: Optional[np.ndarray] = None
+        self._unigram_count = 0
+
+    def _analyze(self, text: str) -> List[str]:
+        """N-grammes contigus ne commençant ni ne finissant par un mot vide"""
+        phrases = []
+        for segment in _SEGMENT_RE.split(text.lower()):
+            tokens = _TOKEN_RE.findall(segment)
+            count = len(tokens)
+            for i, first in enumerate(tokens):
+                if first in ANCHOR_STOP_WORDS or first.isdigit():
+                    continue
+                phrases.append(first)
+                for j in range(i + 1, min(i + self.max_ngram, count)):
+                    last = tokens[j]
+                    if last in ANCHOR_STOP_WORDS or last.isdigit():
+                        continue
+                    phrases.append(" ".join(tokens[i:j + 1]))
+        return phrases
+
+    def fit(
+        self,
+        target_texts: List[str],
+        source_texts: Iterable[str],
+        corpus_texts: Optional[Iterable[str]] = None,
+        corpus_size: Optional[int] = None
+    ) -> "KeyphraseAnchorGenerator":
+        """Construire les matrices des pages (une ligne par page)
+
+        `target_texts` : champs d'ancre de chaque page (titre, titres, description)
+        `source_texts` : texte de chaque page utilisé pour le recouvrement (lu en flux)
+        `corpus_texts` : champs d'ancre de toutes les pages du site, lus en flux
+        (`corpus_size` pages) ; les fréquences des phrases y sont calculées,
+        indépendamment des pages à scorer. Par défaut : `target_texts`.
+        """
+        from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+
+        n = len(target_texts)
+        corpus_size = corpus_size if corpus_texts is not None and corpus_size else n
+        # Sur un petit site, une phrase propre à une seule page reste candidate
+        min_df = min(self.min_df, max(1, corpus_size // 50))
+        # Les phrases présentes sur une large part du site (nom du site, gabarit) sont exclues
+        max_df = max(min_df, int(self.max_df * corpus_size))
+
+        vectorizer = TfidfVectorizer(
+            analyzer=self._analyze,
+            min_df=min_df,
+            max_df=max_df,
+            sublinear_tf=True,
+            norm=None,
+            dtype=np.float32
+        )
+        try:
+            if corpus_texts is None:
+                matrix = vectorizer.fit_transform(target_texts).tocsr()
+            else:
+                matrix = vectorizer.fit(corpus_texts).transform(target_texts).tocsr()
+        except ValueError:
+            # Corpus trop petit ou sans phrase-clé exploitable
+            matrix = None
+
+        if matrix is None or matrix.shape[1] == 0:
+            self.phrases = np.empty(0, dtype=object)
+            self.candidate_ids = np.full((n, self.candidates_per_target), -1, dtype=np.int64)
+            self.candidate_scores = np.zeros((n, self.candidates_per_target), dtype=np.float32)
+            return self
+
+        self.phrases = vectorizer.get_feature_names_out()
+        lengths = np.fromiter((len(phrase) for phrase in self.phrases), dtype=np.int64, count=len(self.phrases))
+        word_counts = np.fromiter((phrase.count(" ") + 1 for phrase in self.phrases), dtype=np.int64, count=len(self.phrases))
+
+        # Favoriser les expressions de plusieurs mots, exclure les ancres trop longues
+        matrix = matrix.multiply((1.0 + 0.25 * (word_counts - 1)).astype(np.float32)).tocsr()
+        matrix.data[lengths[matrix.indices] > self.max_anchor_length] = 0.0
+        matrix.eliminate_zeros()
+
+        self.candidate_ids, self.candidate_scores = self._top_candidates(matrix)
+
+        # Phrase -> identifiants de ses mots porteurs de sens (complété par -1)
+        unigrams = {}
+        phrase_tokens = np.full((len(self.phrases), self.max_ngram), -1, dtype=np.int64)
+        for phrase_id, phrase in enumerate(self.phrases):
+            for position, token in enumerate(phrase.split(" ")[:self.max_ngram]):
+                if token not in ANCHOR_STOP_WORDS:
+                    phrase_tokens[phrase_id, position] = unigrams.setdefault(token, len(unigrams))
+        self._phrase_tokens = phrase_tokens
+        self._phrase_lengths = np.maximum((phrase_tokens >= 0).sum(axis=1), 1)
+        self._unigram_count = len(unigrams)
+
+        # Présence des mots dans chaque source, encodée en clés triées ligne * V + mot
+        presence = CountVectorizer(
+            vocabulary=unigrams,
+            token_pattern=TOKEN_PATTERN,
+            lowercase=True,
+            binary=True,
+            dtype=np.int8
+        ).transform(source_texts).tocsr()
+        presence.sort_indices()
+        rows = np.repeat(np.arange(presence.shape[0], dtype=np.int64), np.diff(presence.indptr))
+        self._presence_keys = rows * self._unigram_count + presence.indices.astype(np.int64)
+
+        return self
+
+    def _top_candidates(self, matrix) -> Tuple[np.ndarray, np.ndarray]:
+        """Meilleures phrases-clés de chaque ligne d'une matrice CSR (vectorisé)"""
+        n = matrix.shape[0]
+        m = self.candidates_per_target
+        rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(matrix.indptr))
+
+        order = np.lexsort((-matrix.data, rows))
+        rows, columns, scores = rows[order], matrix.indices[order], matrix.data[order]
+        rank = np.arange(rows.size) - matrix.indptr[rows]
+        keep = rank < m
+
+        candidate_ids = np.full((n, m), -1, dtype=np.int64)
+        candidate_scores = np.zeros((n, m), dtype=np.float32)
+        candidate_ids[rows[keep], rank[keep]] = columns[keep]
+        candidate_scores[rows[keep], rank[keep]] = scores[keep]
+        return candidate_ids, candidate_scores
+
+    def _overlap(self, sources: np.ndarray, candidate_ids: np.ndarray) -> np.ndarray:
+        """Part des mots de chaque candidat présents dans la page source"""
+        valid = candidate_ids >= 0
+        tokens = self._phrase_tokens[np.where(valid, candidate_ids, 0)]
+        keys = sources[:, None, None] * self._unigram_count + tokens
+
+        positions = np.searchsorted(self._presence_keys, keys)
+        positions = np.minimum(positions, max(self._presence_keys.size - 1, 0))
+        found = (tokens >= 0) & (self._presence_keys.size > 0)
+        if self._presence_keys.size:
+            found &= self._presence_keys[positions] == keys
+
+        lengths = self._phrase_lengths[np.where(valid, candidate_ids, 0)]
+        return np.where(valid, found.sum(axis=2) / lengths, 0.0).astype(np.float32)
+
+    def rank(self, sources: np.ndarray, targets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Candidats de chaque paire classés par score, retourne (ids, scores)"""
+        candidate_ids = self.candidate_ids[targets]
+        scores = self.candidate_scores[targets]
+
+        if self.phrases.size and candidate_ids.size:
+            scores = scores * (1.0 + self.overlap_weight * self._overlap(sources, candidate_ids))
+
+        scores = np.where(candidate_ids >= 0, scores, -np.inf)
+        order = np.argsort(-scores, axis=1, kind="stable")
+        return (
+            np.take_along_axis(candidate_ids, order, axis=1),
+            np.take_along_axis(scores, order, axis=1)
+        )
+
+    def generate(
+        self,
+        sources: np.ndarray,
+        targets: np.ndarray,
+        fallbacks: Optional[List[str]] = None,
+        chunk_size: int = 200000
+    ) -> List[Tuple[str, List[str]]]:
+        """Ancre retenue et alternatives pour chaque paire (source, cible)
+
+        `fallbacks` : ancre de repli par page (ex. titre) quand la cible n'a
+        aucune phrase-clé.
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        anchors = []
+
+        for start in range(0, sources.size, chunk_size):
+            end = min(start + chunk_size, sources.size)
+            candidate_ids, _ = self.rank(sources[start:end], targets[start:end])
+
+            for target, row in zip(targets[start:end].tolist(), candidate_ids.tolist()):
+                phrases = [self.phrases[phrase_id] for phrase_id in row if phrase_id >= 0]
+                if not phrases:
+                    anchors.append((fallbacks[target] if fallbacks else "", []))
+                    continue
+                anchors.append((phrases[0], phrases[1:]))
+
+        return anchors
@@ -0,0 +1,146 @@
+from typing import Callable, Dict, Any, List, Optional, Tuple
+import numpy as np
+
+def normalize_anchor(anchor: str) -> str:
+    """Forme de recherche d'une ancre (casse, espaces)"""
+    return " ".join((anchor or "").lower().split())
+
+def lower_with_offsets(text: str) -> Tuple[str, Optional[List[int]]]:
+    """Texte en minuscules et, si sa longueur change, position d'origine de chaque caractère
+
+    La table a un élément de plus (longueur du texte d'origine) pour les fins de correspondance.
+    """
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered, None
+
+    parts = []
+    offsets = []
+    for index, char in enumerate(text):
+        folded = char.lower()
+        parts.append(folded)
+        offsets.extend([index] * len(folded))
+    offsets.append(len(text))
+    return "".join(parts), offsets
+
+class AnchorPlacer:
+    """Placement des ancres candidates dans le texte des pages sources
+
+    Pour chaque page source, toutes les ancres candidates de ses cibles sont
+    compilées dans un automate Aho-Corasick ; le texte de la page est parcouru
+    une seule fois, en temps linéaire, pour trouver la première occurrence de
+    chaque ancre (sur des limites de mots), avec sa position et un extrait.
+    """
+
+    def __init__(self, snippet_chars: int = 80):
+        self.snippet_chars = snippet_chars
+        self.stats = {"sources": 0, "characters": 0, "pairs": 0, "placed": 0}
+
+    def _first_occurrences(self, text: str, patterns: List[str]) -> Dict[int, int]:
+        """Position de la première occurrence de chaque motif (limites de mots)"""
+        import ahocorasick
+
+        automaton = ahocorasick.Automaton()
+        for pattern_id, pattern in enumerate(patterns):
+            automaton.add_word(pattern, pattern_id)
+        automaton.make_automaton()
+
+        found: Dict[int, int] = {}
+        size = len(text)
+        for end_index, pattern_id in automaton.iter(text):
+            if pattern_id in found:
+                continue
+            start = end_index - len(patterns[pattern_id]) + 1
+            if start > 0 and text[start - 1].isalnum():
+                continue
+            if end_index + 1 < size and text[end_index + 1].isalnum():
+                continue
+            found[pattern_id] = start
+            if len(found) == len(patterns):
+                break
+        return found
+
+    def place(self, text: str, candidates: List[List[str]]) -> List[Optional[Dict[str, Any]]]:
+        """Placer les suggestions d'une page source
+
+        `candidates` : pour chaque suggestion, ses ancres par ordre de préférence.
+        Retourne, pour chaque suggestion, la première ancre placée (ou None).
+        """
+        # Recherche sur le texte en minuscules, positions et extraits sur le texte d'origine
+        lowered, offsets = lower_with_offsets(text)
+
+        patterns: List[str] = []
+        pattern_ids: Dict[str, int] = {}
+        candidate_patterns: List[List[int]] = []
+        for anchors in candidates:
+            ids = []
+            for anchor in anchors:
+                pattern = normalize_anchor(anchor)
+                if not pattern:
+                    ids.append(-1)
+                    continue
+                if pattern not in pattern_ids:
+                    pattern_ids[pattern] = len(patterns)
+                    patterns.append(pattern)
+                ids.append(pattern_ids[pattern])
+            candidate_patterns.append(ids)
+
+        found = self._first_occurrences(lowered, patterns) if patterns and lowered else {}
+
+        placements = []
+        for anchors, ids in zip(candidates, candidate_patterns):
+            placement = None
+            for rank, (anchor, pattern_id) in enumerate(zip(anchors, ids)):
+                if pattern_id not in found:
+                    continue
+                start = found[pattern_id]
+                end = start + len(patterns[pattern_id])
+                if offsets is not None:
+                    start, end = offsets[start], offsets[end - 1] + 1
+                snippet_start = max(0, start - self.snippet_chars)
+                snippet_end = min(len(text), end + self.snippet_chars)
+                placement = {
+                    "anchor": anchor,
+                    "candidate_rank": rank,
+                    "start": start,
+                    "end": end,
+                    "matched_text": text[start:end],
+                    "snippet": ("…" if snippet_start > 0 else "") + text[snippet_start:snippet_end] + ("…" if snippet_end < len(text) else "")
+                }
+                break
+            placements.append(placement)
+
+        self.stats["sources"] += 1
+        self.stats["characters"] += len(text)
+        self.stats["pairs"] += len(candidates)
+        self.stats["placed"] += sum(placement is not None for placement in placements)
+        return placements
+
+    def place_all(
+        self,
+        sources: np.ndarray,
+        candidates: List[List[str]],
+        text_for: Callable[[int], str]
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Placer toutes les paires, une lecture du texte par page source
+
+        `text_for(source)` fournit le texte d'une page source à la demande, de
+        sorte qu'un seul texte est en mémoire à la fois.
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        placements: List[Optional[Dict[str, Any]]] = [None] * sources.size
+        if sources.size == 0:
+            return placements
+
+        order = np.argsort(sources, kind="stable")
+        boundaries = np.flatnonzero(np.diff(sources[order])) + 1
+        for group in np.split(order, boundaries):
+            positions = group.tolist()
+            group_placements = self.place(
+                text_for(int(sources[positions[0]])),
+                [candidates[position] for position in positions]
+            )
+            for position, placement in zip(positions, group_placements):
+                placements[position] = placement
+
+        return placements
@@ -0,0 +1,212 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from app.core.config import settings
+
+# Étapes d'une analyse, dans l'ordre d'exécution
+ANALYSIS_STAGES = ("discover", "crawl", "extract", "embed", "similarity", "suggestions", "persist")
+
+class Artifact:
+    """Une version de l'artefact d'une étape : un dossier de fichiers et son manifeste"""
+
+    def __init__(
+        self,
+        stage: str,
+        directory: str,
+        version: Optional[int] = None,
+        meta: Optional[Dict[str, Any]] = None,
+        inputs: Optional[Dict[str, int]] = None
+    ):
+        self.stage = stage
+        self.directory = directory
+        self.version = version
+        self.meta = meta or {}
+        self.inputs = inputs or {}
+
+    def path(self, name: str) -> str:
+        """Chemin d'un fichier de l'artefact"""
+        return os.path.join(self.directory, name)
+
+    def write_jsonl(self, name: str, records: Iterable[Dict[str, Any]]) -> int:
+        """Écrire des enregistrements (un objet JSON par ligne) en flux"""
+        count = 0
+        with open(self.path(name), "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False))
+                f.write("\n")
+                count += 1
+        return count
+
+    def read_jsonl(self, name: str) -> Iterator[Dict[str, Any]]:
+        """Relire des enregistrements un par un"""
+        with open(self.path(name), "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def write_lines(self, name: str, lines: Iterable[str]) -> int:
+        """Écrire une valeur par ligne (URLs)"""
+        count = 0
+        with open(self.path(name), "w", encoding="utf-8") as f:
+            for line in lines:
+                f.write(line.replace("\n", " "))
+                f.write("\n")
+                count += 1
+        return count
+
+    def read_lines(self, name: str) -> List[str]:
+        """Relire une valeur par ligne"""
+        with open(self.path(name), "r", encoding="utf-8") as f:
+            return [line.rstrip("\n") for line in f]
+
+    @property
+    def reference(self) -> Dict[str, Any]:
+        """Référence transmise aux étapes suivantes"""
+        return {"version": self.version, **self.meta}
+
+class ArtifactStore:
+    """Artefacts versionnés des étapes d'une analyse (dossier local partagé par les workers)
+
+    Chaque exécution d'une étape écrit dans un dossier provisoire, renommé en
+    version numérotée à la validation ; CURRENT désigne la dernière version
+    validée. Une étape lit les versions qui lui sont transmises : la relancer
+    ne touche ni aux artefacts en amont ni aux versions déjà lues en aval.
+    Le manifeste note les versions amont lues (`inputs`) : une version encore
+    lue par la version CURRENT d'une étape aval n'est jamais supprimée.
+    """
+
+    MANIFEST_FILE = "manifest.json"
+    CURRENT_FILE = "CURRENT"
+
+    def __init__(self, analysis_id: str, base_dir: Optional[str] = None, keep_versions: Optional[int] = None):
+        self.analysis_id = analysis_id
+        self.directory = os.path.join(base_dir or settings.ARTIFACT_STORE_DIR, analysis_id)
+        self.keep_versions = keep_versions if keep_versions is not None else settings.ARTIFACT_KEEP_VERSIONS
+
+    def _stage_dir(self, stage: str) -> str:
+        """Dossier des versions d'une étape"""
+        if stage not in ANALYSIS_STAGES:
+            raise ValueError(f"Étape d'analyse inconnue: {stage}")
+        return os.path.join(self.directory, stage)
+
+    @staticmethod
+    def _version_name(version: int) -> str:
+        """Nom du dossier d'une version validée"""
+        return f"v{version:04d}"
+
+    def create(self, stage: str) -> Artifact:
+        """Nouvelle version provisoire d'une étape (invisible jusqu'à `commit`)"""
+        token = uuid.uuid4().hex
+        directory = os.path.join(self._stage_dir(stage), f".pending-{token}")
+        os.makedirs(directory)
+        return Artifact(stage, directory, meta={"pending": token})
+
+    def pending(self, stage: str, token: str) -> Artifact:
+        """Rouvrir une version provisoire (écriture répartie entre plusieurs tâches)"""
+        directory = os.path.join(self._stage_dir(stage), f".pending-{token}")
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"Artefact provisoire absent: {stage}/{token}")
+        return Artifact(stage, directory, meta={"pending": token})
+
+    def commit(self, artifact: Artifact, inputs: Optional[Dict[str, int]] = None, **meta) -> Artifact:
+        """Valider une version : manifeste, renommage atomique puis CURRENT
+
+        `inputs` : versions des artefacts amont à partir desquelles elle a été construite.
+        """
+        stage_dir = self._stage_dir(artifact.stage)
+        meta = {key: value for key, value in {**artifact.meta, **meta}.items() if key != "pending"}
+
+        while True:
+            version = max(self.versions(artifact.stage), default=0) + 1
+            manifest = {
+                "stage": artifact.stage,
+                "version": version,
+                "analysis_id": self.analysis_id,
+                "created_at": time.time(),
+                "inputs": inputs or {},
+                "meta": meta
+            }
+            with open(os.path.join(artifact.directory, self.MANIFEST_FILE), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False)
+            try:
+                # Échoue si une autre exécution a validé la même version entre-temps
+                os.rename(artifact.directory, os.path.join(stage_dir, self._version_name(version)))
+                break
+            except OSError:
+                if not os.path.isdir(os.path.join(stage_dir, self._version_name(version))):
+                    raise
+
+        current = os.path.join(stage_dir, self.CURRENT_FILE)
+        with open(current + ".tmp", "w", encoding="utf-8") as f:
+            f.write(str(version))
+        os.replace(current + ".tmp", current)
+
+        self._prune(artifact.stage)
+        return Artifact(artifact.stage, os.path.join(stage_dir, self._version_name(version)), version, meta, inputs)
+
+    def discard(self, artifact: Artifact):
+        """Abandonner une version provisoire (échec de l'étape)"""
+        if artifact.version is None:
+            shutil.rmtree(artifact.directory, ignore_errors=True)
+
+    def versions(self, stage: str) -> List[int]:
+        """Versions validées d'une étape"""
+        stage_dir = self._stage_dir(stage)
+        if not os.path.isdir(stage_dir):
+            return []
+        return sorted(
+            int(name[1:]) for name in os.listdir(stage_dir)
+            if name.startswith("v") and name[1:].isdigit()
+        )
+
+    def current_version(self, stage: str) -> Optional[int]:
+        """Dernière version validée d'une étape, None si elle n'a jamais abouti"""
+        try:
+            with open(os.path.join(self._stage_dir(stage), self.CURRENT_FILE), "r", encoding="utf-8") as f:
+                return int(f.read().strip())
+        except FileNotFoundError:
+            return None
+
+    def open(self, stage: str, version: Optional[int] = None) -> Artifact:
+        """Ouvrir une version validée (par défaut : CURRENT)"""
+        version = version if version is not None else self.current_version(stage)
+        if version is None:
+            raise FileNotFoundError(f"Aucun artefact pour l'étape {stage}")
+        directory = os.path.join(self._stage_dir(stage), self._version_name(version))
+        with open(os.path.join(directory, self.MANIFEST_FILE), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        return Artifact(stage, directory, version, manifest.get("meta", {}), manifest.get("inputs", {}))
+
+    def referenced_versions(self, stage: str) -> Set[int]:
+        """Versions d'une étape lues par les versions CURRENT des étapes aval"""
+        referenced = set()
+        for downstream in ANALYSIS_STAGES[ANALYSIS_STAGES.index(stage) + 1:]:
+            try:
+                inputs = self.open(downstream).inputs
+            except FileNotFoundError:
+                continue
+            if stage in inputs:
+                referenced.add(inputs[stage])
+        return referenced
+
+    def _prune(self, stage: str):
+        """Supprimer les versions anciennes (les `keep_versions` dernières sont conservées)
+
+        Une version encore lue par la version CURRENT d'une étape aval est
+        conservée : une analyse terminée garde toujours ses artefacts complets.
+        """
+        if not self.keep_versions or self.keep_versions <= 0:
+            return
+        referenced = self.referenced_versions(stage)
+        for version in self.versions(stage)[:-self.keep_versions]:
+            if version in referenced:
+                continue
+            shutil.rmtree(os.path.join(self._stage_dir(stage), self._version_name(version)), ignore_errors=True)
+
+    def delete(self):
+        """Supprimer tous les artefacts de l'analyse"""
+        shutil.rmtree(self.directory, ignore_errors=True)
\ No newline at end of file
@@ -0,0 +1,167 @@
+import hashlib
+import re
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+
+# Commentaires et éléments sans texte visible
+_DROP_RE = re.compile(r"(?is)<!--.*?-->|<(script|style|noscript|template|svg|iframe)\b[^>]*>.*?</\1\s*>")
+
+# Balises de niveau bloc : chaque bloc de texte est compté séparément
+_BLOCK_RE = re.compile(
+    r"(?i)</?(?:address|article|aside|blockquote|body|br|button|dd|div|dl|dt|fieldset|figcaption|figure|"
+    r"footer|form|h[1-6]|header|hr|li|main|nav|ol|option|p|pre|section|select|table|td|th|tr|ul)\b[^>]*>"
+)
+
+_TAG_RE = re.compile(r"<[^>]+>")
+
+# Estimation usuelle pour les modèles d'embedding (caractères par token)
+CHARS_PER_TOKEN = 4
+
+# Multiplicateurs (impairs) du hachage des lignes du sketch
+_SKETCH_SEEDS = np.array([
+    0x9E3779B97F4A7C15,
+    0xC2B2AE3D27D4EB4F,
+    0x165667B19E3779F9,
+    0xD6E8FEB86659FD93,
+    0xFF51AFD7ED558CCD,
+    0xC4CEB9FE1A85EC53
+], dtype=np.uint64)
+
+def split_blocks(html_content: str) -> List[str]:
+    """Blocs de texte d'une page HTML, dans l'ordre du document (espaces normalisés)"""
+    text = _DROP_RE.sub(" ", html_content or "")
+    text = _TAG_RE.sub(" ", _BLOCK_RE.sub("\n", text))
+    blocks = []
+    for block in text.split("\n"):
+        block = " ".join(block.split())
+        if block:
+            blocks.append(block)
+    return blocks
+
+def block_hash(block: str) -> int:
+    """Empreinte 64 bits stable d'un bloc (indépendante du processus)"""
+    digest = hashlib.blake2b(block.lower().encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+class BoilerplateDetector:
+    """Détection du gabarit d'un site (menus, bandeaux cookies, pied de page)
+
+    Un seul passage sur les pages crawlées compte, pour chaque bloc de texte,
+    le nombre de pages où il apparaît (count-min sketch : mémoire fixe quelle
+    que soit la taille du site, comptes surestimés d'au plus quelques unités).
+    Les blocs présents sur plus de `max_page_fraction` des pages sont retirés
+    avant la construction du texte à vectoriser.
+    """
+
+    def __init__(
+        self,
+        max_page_fraction: float = 0.5,
+        min_pages: int = 5,
+        sketch_width: int = 2 ** 20,
+        sketch_depth: int = 4,
+        window_chars: int = 2000
+    ):
+        if not 0 < max_page_fraction <= 1:
+            raise ValueError(f"Fraction de pages invalide: {max_page_fraction}")
+        self.max_page_fraction = max_page_fraction
+        self.min_pages = min_pages
+        self.sketch_bits = max(1, int(np.log2(sketch_width)))
+        self.sketch = np.zeros((min(sketch_depth, _SKETCH_SEEDS.size), 2 ** self.sketch_bits), dtype=np.uint32)
+        # Fenêtre de contenu vectorisée (estimation des tokens économisés)
+        self.window_chars = window_chars
+        self.pages = 0
+        # Empreintes figées (mise à jour incrémentale) : remplacent le sketch
+        self.frozen: Optional[set] = None
+        self.detected: set = set()
+        self.stats = {"pages": 0, "blocks_removed": 0, "chars_removed": 0, "tokens_saved": 0}
+
+    @classmethod
+    def from_settings(cls, ai_settings: Dict[str, Any]) -> Optional["BoilerplateDetector"]:
+        """Détecteur configuré, None si la suppression du gabarit est désactivée"""
+        if not ai_settings.get("boilerplate_removal", True):
+            return None
+        return cls(
+            max_page_fraction=ai_settings.get("boilerplate_max_page_fraction", 0.5),
+            min_pages=ai_settings.get("boilerplate_min_pages", 5)
+        )
+
+    @classmethod
+    def from_hashes(cls, hashes: Iterable[int]) -> "BoilerplateDetector":
+        """Détecteur figé sur les blocs retenus lors de l'analyse complète"""
+        detector = cls(sketch_width=2, sketch_depth=1)
+        detector.frozen = {int(value) for value in hashes}
+        return detector
+
+    def _buckets(self, hashes: np.ndarray) -> np.ndarray:
+        """Colonnes du sketch de chaque empreinte, une ligne par fonction de hachage"""
+        seeds = _SKETCH_SEEDS[:self.sketch.shape[0], None]
+        return (hashes[None, :] * seeds) >> np.uint64(64 - self.sketch_bits)
+
+    def observe(self, html_content: str):
+        """Compter les blocs d'une page (chaque bloc une seule fois par page)"""
+        self.pages += 1
+        hashes = np.unique(np.fromiter(
+            (block_hash(block) for block in split_blocks(html_content)),
+            dtype=np.uint64
+        ))
+        if hashes.size == 0:
+            return
+        buckets = self._buckets(hashes)
+        for row in range(self.sketch.shape[0]):
+            np.add.at(self.sketch[row], buckets[row], 1)
+
+    def fit(self, pages: Iterable[Dict[str, Any]]) -> "BoilerplateDetector":
+        """Passage unique sur les pages crawlées"""
+        for page in pages:
+            if page.get("content"):
+                self.observe(page["content"])
+        return self
+
+    @property
+    def active(self) -> bool:
+        """Assez de pages observées pour distinguer le gabarit du contenu"""
+        return self.frozen is not None or self.pages >= self.min_pages
+
+    def _boilerplate_mask(self, hashes: np.ndarray) -> np.ndarray:
+        """Blocs présents sur plus de la fraction de pages configurée"""
+        if self.frozen is not None:
+            return np.fromiter((int(value) in self.frozen for value in hashes), dtype=bool, count=hashes.size)
+        buckets = self._buckets(hashes)
+        counts = self.sketch[np.arange(self.sketch.shape[0])[:, None], buckets].min(axis=0)
+        return counts > self.max_page_fraction * self.pages
+
+    def strip(self, html_content: str, record: bool = False) -> str:
+        """Texte de la page sans les blocs du gabarit (un bloc par ligne)
+
+        `record` ajoute la page aux statistiques (une fois par page vectorisée).
+        """
+        blocks = split_blocks(html_content)
+        if not blocks or not self.active:
+            return "\n".join(blocks)
+
+        hashes = np.fromiter((block_hash(block) for block in blocks), dtype=np.uint64, count=len(blocks))
+        mask = self._boilerplate_mask(hashes)
+
+        if record:
+            # Tokens que le gabarit occupait dans la fenêtre de contenu vectorisée
+            position = window_boilerplate = 0
+            for block, is_boilerplate in zip(blocks, mask.tolist()):
+                if position >= self.window_chars:
+                    break
+                used = min(len(block) + 1, self.window_chars - position)
+                position += used
+                if is_boilerplate:
+                    window_boilerplate += used
+
+            removed = [block for block, is_boilerplate in zip(blocks, mask.tolist()) if is_boilerplate]
+            self.detected.update(int(value) for value in hashes[mask])
+            self.stats["pages"] += 1
+            self.stats["blocks_removed"] += len(removed)
+            self.stats["chars_removed"] += sum(len(block) for block in removed)
+            self.stats["tokens_saved"] += window_boilerplate // CHARS_PER_TOKEN
+        return "\n".join(block for block, is_boilerplate in zip(blocks, mask.tolist()) if not is_boilerplate)
+
+    def hashes(self) -> np.ndarray:
+        """Empreintes des blocs de gabarit rencontrés (conservées avec l'index du site)"""
+        values = self.frozen if self.frozen is not None else self.detected
+        return np.array(sorted(values), dtype=np.uint64)
\ No newline at end of file
@@ -1,5 +1,7 @@
 import asyncio
 import aiohttp
+import hashlib
+import html
 import time
 from typing import List, Dict, Any, Optional
 from urllib.parse import urljoin, urlparse
@@ -7,6 +9,8 @@ import re
 from datetime import datetime, timedelta
 import json
 
+from app.services.boilerplate import split_blocks
+
 class CrawlService:
     def __init__(self):
         self.session = None
@@ -222,9 +226,24 @@ class CrawlService:
         self,
         urls: List[str],
         analysis_id: str,
-        crawl_settings: Dict[str, Any] = None
+        crawl_settings: Dict[str, Any] = None,
+        extract: bool = True
     ) -> List[Dict[str, Any]]:
-        """Crawler les pages et extraire le contenu"""
+        """Crawler les pages et extraire le contenu
+
+        Avec `extract=False`, seul le HTML est récupéré (extraction faite par
+        une étape séparée, voir `extract_page`).
+        """
+        return [page async for page in self.iter_pages(urls, analysis_id, crawl_settings, extract=extract)]
+    
+    async def iter_pages(
+        self,
+        urls: List[str],
+        analysis_id: str,
+        crawl_settings: Dict[str, Any] = None,
+        extract: bool = True
+    ):
+        """Crawler les pages une par une (écriture au fil de l'eau par l'appelant)"""
         if not self.session:
             raise RuntimeError("CrawlService must be used as async context manager")
         
@@ -236,17 +255,24 @@ class CrawlService:
         # Limiter le nombre d'URLs
         urls = urls[:max_urls]
         
-        crawled_pages = []
+        # Pages crawlées sans passer par le sitemap (mise à jour incrémentale)
+        self.crawl_stats.setdefault(analysis_id, {
+            "start_time": datetime.utcnow(),
+            "total_urls": len(urls),
+            "crawled_urls": 0,
+            "failed_urls": 0,
+            "blocked_requests": 0,
+            "retry_queue": 0
+        })
         
         for i, url in enumerate(urls):
+            page_data = None
             try:
                 # Mettre à jour les statistiques
                 self.crawl_stats[analysis_id]["crawled_urls"] = i + 1
                 
                 # Crawler la page
-                page_data = await self._crawl_single_page(url, user_agent)
-                if page_data:
-                    crawled_pages.append(page_data)
+                page_data = await self._crawl_single_page(url, user_agent, extract=extract)
                 
                 # Délai entre les requêtes
                 if delay > 0:
@@ -255,35 +281,38 @@ class CrawlService:
             except Exception as e:
                 self.crawl_stats[analysis_id]["failed_urls"] += 1
                 print(f"Erreur lors du crawl de {url}: {str(e)}")
-        
-        return crawled_pages
+            
+            if page_data:
+                yield page_data
     
     async def _crawl_single_page(
         self,
         url: str,
-        user_agent: str
+        user_agent: str,
+        extract: bool = True
     ) -> Optional[Dict[str, Any]]:
         """Crawler une seule page"""
         try:
             headers = {'User-Agent': user_agent}
+            fetched_at = datetime.utcnow()
+            started = time.perf_counter()
             
             async with self.session.get(url, headers=headers) as response:
                 if response.status == 200:
                     content = await response.text()
-                    
-                    # Extraire les métadonnées
-                    title = self._extract_title(content)
-                    description = self._extract_description(content)
-                    headings = self._extract_headings(content)
-                    
-                    return {
+                    encoded = content.encode("utf-8")
+                    page = {
                         "url": url,
-                        "title": title,
-                        "description": description,
-                        "headings": headings,
                         "content": content,
-                        "status_code": response.status
+                        "status_code": response.status,
+                        "content_hash": hashlib.blake2b(encoded, digest_size=16).hexdigest(),
+                        "content_bytes": len(encoded),
+                        "fetched_at": fetched_at,
+                        "fetch_ms": (time.perf_counter() - started) * 1000
                     }
+                    
+                    # Extraire les métadonnées
+                    return self.extract_page(page) if extract else page
                 else:
                     return None
                     
@@ -291,6 +320,29 @@ class CrawlService:
             print(f"Erreur lors du crawl de {url}: {str(e)}")
             return None
     
+    def extract_page(self, page: Dict[str, Any]) -> Dict[str, Any]:
+        """Ajouter titre, description, titres Hn, texte visible et liens sortants à une page crawlée"""
+        content = page.get("content") or ""
+        return {
+            **page,
+            "title": self._extract_title(content),
+            "description": self._extract_description(content),
+            "headings": self._extract_headings(content),
+            "text": html.unescape("\n".join(split_blocks(content))),
+            "outlinks": self._extract_outlinks(content, page["url"])
+        }
+    
+    def _extract_outlinks(self, content: str, base_url: str) -> List[str]:
+        """Liens sortants absolus (http/https, sans fragment), dans l'ordre du document"""
+        outlinks = []
+        seen = set()
+        for href in re.findall(r'<a\b[^>]*?\bhref=["\']([^"\'#][^"\']*)["\']', content, re.IGNORECASE):
+            link = urljoin(base_url, html.unescape(href.strip())).split("#", 1)[0]
+            if urlparse(link).scheme in ("http", "https") and link not in seen:
+                seen.add(link)
+                outlinks.append(link)
+        return outlinks
+    
     def _extract_title(self, content: str) -> str:
         """Extraire le titre de la page"""
         match = re.search(r'<title>(.*?)</title>', content, re.IGNORECASE)
@@ -0,0 +1,307 @@
+"""Service d'embeddings partagé : batching dynamique entre les tâches d'un hôte
+
+Les tâches (analyses, mises à jour) déposent leurs textes par petits lots
+dans une file Redis par tenant. Le service forme des lots dynamiques (taille
+maximale ou attente maximale de quelques millisecondes), en prenant un lot
+par tenant à chaque tour (équité), les vectorise en un seul appel au
+provider ou au modèle local, puis renvoie à chaque tâche ses vecteurs.
+
+Lancement : python -m app.services.embedding_batcher
+"""
+import asyncio
+import json
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import numpy as np
+
+from app.core.config import settings
+
+QUEUE_PREFIX = "semantra:embed:queue:"
+TENANTS_KEY = "semantra:embed:tenants"
+RESULT_PREFIX = "semantra:embed:result:"
+HEARTBEAT_KEY = "semantra:embed:heartbeat"
+
+# Retirer un tenant de la liste active seulement si sa file est vide (atomique)
+_RELEASE_TENANT_SCRIPT = """
+if redis.call('LLEN', KEYS[1]) == 0 then
+    return redis.call('SREM', KEYS[2], ARGV[1])
+end
+return 0
+"""
+
+class BatcherUnavailable(Exception):
+    """Service d'embeddings partagé absent ou sans réponse : appel direct au provider"""
+
+def _encode_result(vectors: Optional[np.ndarray] = None, error: Optional[str] = None) -> bytes:
+    """En-tête JSON puis vecteurs float32 bruts"""
+    if error is not None:
+        return json.dumps({"error": error}).encode("utf-8") + b"\n"
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    return json.dumps({"shape": list(vectors.shape)}).encode("utf-8") + b"\n" + vectors.tobytes()
+
+def _decode_result(raw: bytes) -> np.ndarray:
+    """Vecteurs d'un résultat (RuntimeError si le lot a échoué)"""
+    header, _, payload = raw.partition(b"\n")
+    meta = json.loads(header)
+    if "error" in meta:
+        raise RuntimeError(meta["error"])
+    return np.frombuffer(payload, dtype=np.float32).reshape(meta["shape"]).copy()
+
+class EmbeddingBatchClient:
+    """Côté tâche : dépôt des textes dans la file du tenant et attente des vecteurs"""
+
+    def __init__(
+        self,
+        redis_url: str,
+        tenant: str = "default",
+        job_size: int = 64,
+        timeout_seconds: float = 300.0
+    ):
+        self.redis_url = redis_url
+        self.tenant = tenant
+        self.job_size = job_size
+        self.timeout_seconds = timeout_seconds
+        self._redis = None
+
+    @classmethod
+    def from_settings(cls, tenant: Optional[str] = None) -> Optional["EmbeddingBatchClient"]:
+        """Client configuré, None si le service partagé est désactivé"""
+        if not settings.EMBEDDING_BATCHER_ENABLED:
+            return None
+        return cls(
+            settings.REDIS_URL,
+            tenant=tenant or "default",
+            job_size=settings.EMBEDDING_BATCHER_JOB_SIZE,
+            timeout_seconds=settings.EMBEDDING_BATCHER_TIMEOUT_SECONDS
+        )
+
+    def _client(self):
+        """Client Redis asynchrone (une tâche Celery = une boucle d'événements)"""
+        if self._redis is None:
+            import redis.asyncio as redis
+
+            self._redis = redis.Redis.from_url(self.redis_url)
+        return self._redis
+
+    async def embed(self, texts: List[str], model: str, provider: Optional[str] = None) -> np.ndarray:
+        """Vectoriser des textes via le service partagé, dans l'ordre"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        client = self._client()
+        try:
+            if not await client.exists(HEARTBEAT_KEY):
+                raise BatcherUnavailable("aucun service actif")
+
+            # Tous les lots sont déposés d'un coup : le service les entrelace avec les autres tenants
+            job_ids = []
+            async with client.pipeline(transaction=True) as pipeline:
+                for start in range(0, len(texts), self.job_size):
+                    job_id = uuid.uuid4().hex
+                    job_ids.append(job_id)
+                    pipeline.rpush(QUEUE_PREFIX + self.tenant, json.dumps({
+                        "id": job_id,
+                        "tenant": self.tenant,
+                        "model": model,
+                        "provider": provider,
+                        "texts": texts[start:start + self.job_size]
+                    }, ensure_ascii=False))
+                pipeline.sadd(TENANTS_KEY, self.tenant)
+                await pipeline.execute()
+
+            deadline = time.monotonic() + self.timeout_seconds
+            parts = []
+            for job_id in job_ids:
+                remaining = max(1, int(deadline - time.monotonic()))
+                item = await client.blpop(RESULT_PREFIX + job_id, timeout=remaining)
+                if item is None:
+                    raise BatcherUnavailable("délai d'attente dépassé")
+                parts.append(_decode_result(item[1]))
+        except (BatcherUnavailable, RuntimeError):
+            raise
+        except Exception as e:
+            # Redis injoignable : la tâche vectorise elle-même
+            raise BatcherUnavailable(str(e))
+
+        return np.vstack(parts)
+
+    async def close(self):
+        """Fermer la connexion Redis"""
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+class EmbeddingBatcher:
+    """Côté service : lots dynamiques, équité entre tenants, un appel par lot"""
+
+    def __init__(
+        self,
+        redis_url: str,
+        max_batch_texts: int = 256,
+        max_wait_ms: float = 5.0,
+        max_concurrent_batches: int = 4,
+        result_ttl_seconds: int = 600
+    ):
+        self.redis_url = redis_url
+        self.max_batch_texts = max_batch_texts
+        self.max_wait = max_wait_ms / 1000.0
+        self.result_ttl_seconds = result_ttl_seconds
+        self._slots = asyncio.Semaphore(max_concurrent_batches)
+        self._redis = None
+        self._release_tenant = None
+        # Lots en formation par (modèle, provider) : tâches et instant du premier dépôt
+        self._pending: Dict[Tuple[str, Optional[str]], Tuple[float, List[Dict[str, Any]]]] = {}
+        self._pending_texts: Dict[Tuple[str, Optional[str]], int] = {}
+        self._tenants: Deque[str] = deque()
+        self._models: Dict[Tuple[str, Optional[str]], Tuple[Any, str]] = {}
+        self.stats = {"batches": 0, "jobs": 0, "texts": 0, "errors": 0}
+
+    @classmethod
+    def from_settings(cls) -> "EmbeddingBatcher":
+        """Service configuré depuis les variables d'environnement"""
+        return cls(
+            settings.REDIS_URL,
+            max_batch_texts=settings.EMBEDDING_BATCHER_MAX_BATCH,
+            max_wait_ms=settings.EMBEDDING_BATCHER_MAX_WAIT_MS,
+            max_concurrent_batches=settings.EMBEDDING_BATCHER_CONCURRENCY
+        )
+
+    async def run(self):
+        """Boucle principale : collecte équitable, formation et exécution des lots"""
+        import redis.asyncio as redis
+
+        self._redis = redis.Redis.from_url(self.redis_url)
+        self._release_tenant = self._redis.register_script(_RELEASE_TENANT_SCRIPT)
+        last_heartbeat = idle = 0.0
+        running = set()
+
+        while True:
+            now = time.monotonic()
+            if now - last_heartbeat >= 1.0:
+                await self._redis.set(HEARTBEAT_KEY, "1", ex=5)
+                last_heartbeat = now
+
+            collected = await self._collect_round()
+            for key in self._ready():
+                await self._slots.acquire()
+                task = asyncio.create_task(self._run_batch(key, self._take(key)))
+                running.add(task)
+                task.add_done_callback(running.discard)
+
+            # Attente courte et croissante quand aucune file n'a de travail
+            idle = 0.0 if collected else min(max(idle * 2, 0.001), 0.05)
+            await asyncio.sleep(idle if not self._pending else min(idle, self.max_wait / 2))
+
+    async def _collect_round(self) -> int:
+        """Un tour de collecte : au plus une tâche par tenant, dans un ordre tournant"""
+        members = {member.decode("utf-8") for member in await self._redis.smembers(TENANTS_KEY)}
+        self._tenants = deque(
+            [tenant for tenant in self._tenants if tenant in members]
+            + sorted(members.difference(self._tenants))
+        )
+
+        collected = 0
+        for _ in range(len(self._tenants)):
+            tenant = self._tenants[0]
+            self._tenants.rotate(-1)
+            if self._is_full():
+                break
+
+            raw = await self._redis.lpop(QUEUE_PREFIX + tenant)
+            if raw is None:
+                await self._release_tenant(keys=[QUEUE_PREFIX + tenant, TENANTS_KEY], args=[tenant])
+                continue
+
+            job = json.loads(raw)
+            key = (job["model"], job.get("provider"))
+            started, jobs = self._pending.setdefault(key, (time.monotonic(), []))
+            jobs.append(job)
+            self._pending_texts[key] = self._pending_texts.get(key, 0) + len(job["texts"])
+            collected += 1
+        return collected
+
+    def _is_full(self) -> bool:
+        """Un lot a atteint sa taille maximale : l'exécuter avant de collecter davantage"""
+        return any(count >= self.max_batch_texts for count in self._pending_texts.values())
+
+    def _ready(self) -> List[Tuple[str, Optional[str]]]:
+        """Lots pleins, ou dont la première tâche attend depuis `max_wait`"""
+        now = time.monotonic()
+        return [
+            key for key, (started, _) in self._pending.items()
+            if self._pending_texts[key] >= self.max_batch_texts or now - started >= self.max_wait
+        ]
+
+    def _take(self, key: Tuple[str, Optional[str]]) -> List[Dict[str, Any]]:
+        """Retirer un lot de la formation (au plus `max_batch_texts`, le reste attend)"""
+        started, jobs = self._pending.pop(key)
+        self._pending_texts.pop(key)
+        batch, count = [], 0
+        while jobs and (not batch or count + len(jobs[0]["texts"]) <= self.max_batch_texts):
+            job = jobs.pop(0)
+            batch.append(job)
+            count += len(job["texts"])
+        if jobs:
+            self._pending[key] = (started, jobs)
+            self._pending_texts[key] = sum(len(job["texts"]) for job in jobs)
+        return batch
+
+    def _resolve(self, model: str, provider: Optional[str]) -> Tuple[Any, str]:
+        """Provider et modèle, résolus comme dans la tâche (table EmbeddingModel)"""
+        key = (model, provider)
+        if key not in self._models:
+            from app.core.database import SessionLocal
+            from app.services.ai_providers import provider_registry
+
+            db = SessionLocal()
+            try:
+                self._models[key] = provider_registry.resolve_embedding_model(db, model, provider)
+            finally:
+                db.close()
+        return self._models[key]
+
+    async def _embed(self, model: str, provider: Optional[str], texts: List[str]) -> np.ndarray:
+        """Un seul appel pour tout le lot (provider distant ou modèle local)"""
+        from app.services.ai_providers import provider_registry
+        from app.services.local_embedding_service import LocalEmbeddingService
+
+        embedding_provider, model_id = self._resolve(model, provider)
+        if embedding_provider.name == "local":
+            return await LocalEmbeddingService(
+                model_name=None if model_id in settings.EMBEDDING_MODELS else model_id
+            ).embed_async(texts)
+        return await provider_registry.call_with_retry(
+            embedding_provider,
+            lambda current: current.embed(texts, model_id)
+        )
+
+    async def _run_batch(self, key: Tuple[str, Optional[str]], jobs: List[Dict[str, Any]]):
+        """Vectoriser un lot et renvoyer à chaque tâche ses vecteurs"""
+        try:
+            texts = [text for job in jobs for text in job["texts"]]
+            try:
+                vectors = np.asarray(await self._embed(key[0], key[1], texts), dtype=np.float32)
+                results, start = [], 0
+                for job in jobs:
+                    results.append(_encode_result(vectors[start:start + len(job["texts"])]))
+                    start += len(job["texts"])
+                self.stats["batches"] += 1
+                self.stats["jobs"] += len(jobs)
+                self.stats["texts"] += len(texts)
+            except Exception as e:
+                print(f"Erreur lors d'un lot d'embeddings partagé ({key[0]}): {str(e)}")
+                self.stats["errors"] += 1
+                results = [_encode_result(error=str(e)) for _ in jobs]
+
+            async with self._redis.pipeline(transaction=False) as pipeline:
+                for job, result in zip(jobs, results):
+                    pipeline.rpush(RESULT_PREFIX + job["id"], result)
+                    pipeline.expire(RESULT_PREFIX + job["id"], self.result_ttl_seconds)
+                await pipeline.execute()
+        finally:
+            self._slots.release()
+
+if __name__ == "__main__":
+    asyncio.run(EmbeddingBatcher.from_settings().run())
\ No newline at end of file
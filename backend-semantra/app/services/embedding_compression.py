@@ -0,0 +1,114 @@
+from typing import Optional, Tuple
+import numpy as np
+
+from app.services.vector_index import normalize_embeddings
+
+# Modèles entraînés pour supporter la troncature native des dimensions
+# (le paramètre `dimensions` d'OpenAI équivaut à tronquer puis renormaliser)
+NATIVE_TRUNCATION_MODELS = (
+    "text-embedding-3-small",
+    "text-embedding-3-large"
+)
+
+# Méthodes de réduction de dimension
+REDUCTION_METHODS = ("auto", "truncate", "pca")
+
+# Modes de quantification
+QUANTIZATION_MODES = ("none", "int8")
+
+def supports_native_truncation(model: Optional[str]) -> bool:
+    """Le modèle supporte-t-il la troncature native des dimensions ?"""
+    return bool(model) and model in NATIVE_TRUNCATION_MODELS
+
+def reduce_dimensions(
+    vectors: np.ndarray,
+    target_dimensions: int,
+    model: Optional[str] = None,
+    method: str = "auto",
+    pca_sample_size: int = 50000,
+    chunk_size: int = 16384
+) -> Tuple[np.ndarray, str]:
+    """Réduire la dimension des vecteurs, retourne (vecteurs normalisés, méthode)
+
+    - truncate : conserver les premières dimensions puis renormaliser
+      (natif pour text-embedding-3-*)
+    - pca : projection ACP ajustée sur l'analyse en cours
+    """
+    if method not in REDUCTION_METHODS:
+        raise ValueError(f"Méthode de réduction non supportée: {method}")
+
+    n, dimensions = vectors.shape
+    if not target_dimensions or target_dimensions >= dimensions:
+        return normalize_embeddings(vectors), "none"
+
+    if method == "auto":
+        method = "truncate" if supports_native_truncation(model) else "pca"
+
+    if method == "truncate":
+        return normalize_embeddings(vectors[:, :target_dimensions]), method
+
+    from sklearn.decomposition import PCA
+
+    target_dimensions = min(target_dimensions, n)
+
+    # Ajuster sur un échantillon pour borner le coût sur les gros sites
+    if n > pca_sample_size:
+        rng = np.random.default_rng(0)
+        sample = np.asarray(vectors[np.sort(rng.choice(n, pca_sample_size, replace=False))], dtype=np.float32)
+    else:
+        sample = np.asarray(vectors, dtype=np.float32)
+
+    pca = PCA(n_components=target_dimensions, svd_solver="randomized", random_state=0)
+    pca.fit(sample)
+
+    # Projeter par tranches pour éviter une copie float64 complète
+    reduced = np.empty((n, target_dimensions), dtype=np.float32)
+    for start in range(0, n, chunk_size):
+        end = min(start + chunk_size, n)
+        reduced[start:end] = pca.transform(np.asarray(vectors[start:end], dtype=np.float32))
+
+    return normalize_embeddings(reduced), method
+
+class Int8Vectors:
+    """Vecteurs quantifiés en int8 (quantification scalaire symétrique par dimension)"""
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray):
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def quantize(cls, vectors: np.ndarray, chunk_size: int = 16384) -> "Int8Vectors":
+        """Quantifier une matrice float en int8"""
+        n, dimensions = vectors.shape
+
+        max_abs = np.zeros(dimensions, dtype=np.float32)
+        for start in range(0, n, chunk_size):
+            chunk = np.abs(np.asarray(vectors[start:start + chunk_size], dtype=np.float32))
+            np.maximum(max_abs, chunk.max(axis=0), out=max_abs)
+
+        scales = max_abs / 127.0
+        scales[scales == 0] = 1.0
+
+        codes = np.empty((n, dimensions), dtype=np.int8)
+        for start in range(0, n, chunk_size):
+            end = min(start + chunk_size, n)
+            chunk = np.asarray(vectors[start:end], dtype=np.float32) / scales
+            codes[start:end] = np.clip(np.rint(chunk), -127, 127)
+
+        return cls(codes, scales.astype(np.float32))
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.codes.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes
+
+    def rows(self, start: int, end: int) -> np.ndarray:
+        """Lignes déquantifiées en float32"""
+        return self.codes[start:end].astype(np.float32) * self.scales
+
+    def dequantize(self) -> np.ndarray:
+        """Matrice complète déquantifiée (copie float32)"""
+        return self.rows(0, self.codes.shape[0])
@@ -0,0 +1,153 @@
+import json
+import os
+import shutil
+from typing import List, Optional, Sequence
+import numpy as np
+from app.core.config import settings
+
+# Types de stockage supportés pour les vecteurs
+STORAGE_DTYPES = {
+    "float32": np.float32,
+    "float16": np.float16
+}
+
+class EmbeddingStore:
+    """Stockage contigu et mappé en mémoire des embeddings d'une analyse
+
+    Les vecteurs sont normalisés puis ajoutés au fil de l'eau dans un fichier
+    binaire brut (une ligne par page). Un fichier annexe conserve l'ordre des
+    URLs et un fichier de métadonnées la dimension et le type. La lecture se
+    fait via np.memmap, sans copie.
+    """
+
+    VECTORS_FILE = "embeddings.bin"
+    URLS_FILE = "urls.txt"
+    META_FILE = "meta.json"
+
+    def __init__(
+        self,
+        analysis_id: str,
+        dtype: str = "float32",
+        base_dir: Optional[str] = None
+    ):
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Type de stockage non supporté: {dtype}")
+
+        self.analysis_id = analysis_id
+        self.dtype = dtype
+        self.directory = os.path.join(base_dir or settings.EMBEDDING_STORE_DIR, analysis_id)
+        self.dimensions: Optional[int] = None
+        self.count = 0
+
+        self._vectors_file = None
+        self._urls_file = None
+        self._urls: Optional[List[str]] = None
+
+    @classmethod
+    def open(cls, analysis_id: str, base_dir: Optional[str] = None) -> "EmbeddingStore":
+        """Ouvrir en lecture un stockage déjà écrit"""
+        directory = os.path.join(base_dir or settings.EMBEDDING_STORE_DIR, analysis_id)
+        with open(os.path.join(directory, cls.META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        store = cls(analysis_id, dtype=meta["dtype"], base_dir=base_dir)
+        store.dimensions = meta["dimensions"]
+        store.count = meta["count"]
+        return store
+
+    def _open_for_write(self):
+        """Créer les fichiers au premier ajout"""
+        os.makedirs(self.directory, exist_ok=True)
+        self._vectors_file = open(os.path.join(self.directory, self.VECTORS_FILE), "wb")
+        self._urls_file = open(os.path.join(self.directory, self.URLS_FILE), "w", encoding="utf-8")
+
+    def append_batch(self, urls: Sequence[str], vectors: np.ndarray):
+        """Ajouter un lot de vecteurs (normalisés à l'écriture)"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        if len(urls) != vectors.shape[0]:
+            raise ValueError("Le nombre d'URLs ne correspond pas au nombre de vecteurs")
+        if len(urls) == 0:
+            return
+
+        if self.dimensions is None:
+            self.dimensions = vectors.shape[1]
+            self._open_for_write()
+        elif vectors.shape[1] != self.dimensions:
+            raise ValueError(
+                f"Dimension incohérente: {vectors.shape[1]} au lieu de {self.dimensions}"
+            )
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        normalized = (vectors / norms).astype(STORAGE_DTYPES[self.dtype], copy=False)
+
+        self._vectors_file.write(np.ascontiguousarray(normalized).tobytes())
+        for url in urls:
+            self._urls_file.write(url.replace("\n", " ") + "\n")
+        self.count += len(urls)
+
+    def append(self, url: str, vector: Sequence[float]):
+        """Ajouter le vecteur d'une page"""
+        self.append_batch([url], np.asarray(vector, dtype=np.float32))
+
+    def close(self):
+        """Terminer l'écriture et enregistrer les métadonnées"""
+        if self._vectors_file:
+            self._vectors_file.close()
+            self._urls_file.close()
+            self._vectors_file = None
+            self._urls_file = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, self.META_FILE), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "analysis_id": self.analysis_id,
+                    "dtype": self.dtype,
+                    "dimensions": self.dimensions,
+                    "count": self.count,
+                    "normalized": True
+                },
+                f
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def matrix(self) -> np.ndarray:
+        """Matrice (count, dimensions) mappée en mémoire, en lecture seule"""
+        if self.count == 0 or self.dimensions is None:
+            return np.zeros((0, self.dimensions or 0), dtype=STORAGE_DTYPES[self.dtype])
+
+        return np.memmap(
+            os.path.join(self.directory, self.VECTORS_FILE),
+            dtype=STORAGE_DTYPES[self.dtype],
+            mode="r",
+            shape=(self.count, self.dimensions)
+        )
+
+    @property
+    def urls(self) -> List[str]:
+        """URLs dans l'ordre des lignes de la matrice"""
+        if self._urls is None:
+            path = os.path.join(self.directory, self.URLS_FILE)
+            if not os.path.exists(path):
+                return []
+            with open(path, "r", encoding="utf-8") as f:
+                self._urls = [line.rstrip("\n") for line in f][:self.count]
+        return self._urls
+
+    def nbytes(self) -> int:
+        """Taille des vecteurs stockés en octets"""
+        if self.dimensions is None:
+            return 0
+        return self.count * self.dimensions * np.dtype(STORAGE_DTYPES[self.dtype]).itemsize
+
+    def delete(self):
+        """Supprimer les fichiers de l'analyse"""
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,224 @@
+import os
+import queue
+import re
+import threading
+import uuid
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import zstandard
+
+from app.core.config import settings
+
+def site_key(url: str) -> str:
+    """Clé du site d'une URL (hôte), utilisée pour son dictionnaire de compression"""
+    host = (urlparse(url).hostname or "").lower()
+    return re.sub(r"[^a-z0-9.-]", "_", host) or "default"
+
+class HtmlBlobStore:
+    """HTML brut compressé (zstd) sur disque local, adressé par l'empreinte du contenu
+
+    Un blob par contenu distinct : une page identique d'une analyse à l'autre
+    n'est stockée qu'une fois. Un dictionnaire zstd entraîné sur les pages
+    d'un site (gabarit commun) peut servir à la compression ; son identifiant
+    est inscrit dans la trame et suffit à la relecture.
+    """
+
+    def __init__(self, base_dir: Optional[str] = None, level: Optional[int] = None):
+        self.directory = base_dir or settings.HTML_STORE_DIR
+        self.level = level if level is not None else settings.HTML_STORE_COMPRESSION_LEVEL
+        self._dictionaries: Dict[int, zstandard.ZstdCompressionDict] = {}
+        self._local = threading.local()
+
+    def _path(self, content_hash: str) -> str:
+        """Chemin d'un blob (sous-dossier par préfixe de l'empreinte)"""
+        return os.path.join(self.directory, "objects", content_hash[:2], f"{content_hash}.zst")
+
+    def _dictionary_path(self, dict_id: int) -> str:
+        """Chemin d'un dictionnaire par identifiant"""
+        return os.path.join(self.directory, "dictionaries", f"{dict_id}.zdict")
+
+    def _site_path(self, site: str) -> str:
+        """Fichier désignant le dictionnaire courant d'un site"""
+        return os.path.join(self.directory, "sites", site)
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        """Écrire un fichier complet ou rien (fichier temporaire puis renommage)"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, path)
+
+    def exists(self, content_hash: str) -> bool:
+        """Blob déjà stocké"""
+        return os.path.exists(self._path(content_hash))
+
+    def compressor(self, dictionary: Optional[zstandard.ZstdCompressionDict] = None) -> zstandard.ZstdCompressor:
+        """Compresseur zstd (un par thread d'écriture)"""
+        if dictionary is None:
+            return zstandard.ZstdCompressor(level=self.level)
+        return zstandard.ZstdCompressor(level=self.level, dict_data=dictionary)
+
+    def put(self, content_hash: str, html: str, compressor: Optional[zstandard.ZstdCompressor] = None) -> Optional[int]:
+        """Stocker un HTML ; taille compressée, None s'il était déjà stocké"""
+        path = self._path(content_hash)
+        if os.path.exists(path):
+            return None
+        data = (compressor or self.compressor()).compress(html.encode("utf-8"))
+        self._write_atomic(path, data)
+        return len(data)
+
+    def get(self, content_hash: str) -> Optional[str]:
+        """HTML d'une empreinte, None s'il n'a jamais été stocké"""
+        try:
+            with open(self._path(content_hash), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        dict_id = zstandard.get_frame_parameters(data).dict_id
+        return self._decompressor(dict_id).decompress(data).decode("utf-8")
+
+    def _decompressor(self, dict_id: int) -> zstandard.ZstdDecompressor:
+        """Décompresseur du thread courant pour un dictionnaire (0 : sans dictionnaire)"""
+        decompressors = getattr(self._local, "decompressors", None)
+        if decompressors is None:
+            decompressors = self._local.decompressors = {}
+        if dict_id not in decompressors:
+            if dict_id:
+                decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=self.load_dictionary(dict_id))
+            else:
+                decompressors[dict_id] = zstandard.ZstdDecompressor()
+        return decompressors[dict_id]
+
+    def load_dictionary(self, dict_id: int) -> zstandard.ZstdCompressionDict:
+        """Dictionnaire par identifiant (gardé en mémoire)"""
+        if dict_id not in self._dictionaries:
+            with open(self._dictionary_path(dict_id), "rb") as f:
+                self._dictionaries[dict_id] = zstandard.ZstdCompressionDict(f.read())
+        return self._dictionaries[dict_id]
+
+    def site_dictionary(self, site: str) -> Optional[zstandard.ZstdCompressionDict]:
+        """Dictionnaire courant d'un site, None s'il n'a pas encore été entraîné"""
+        try:
+            with open(self._site_path(site), "r", encoding="utf-8") as f:
+                return self.load_dictionary(int(f.read().strip()))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def train_dictionary(self, site: str, samples: List[bytes]) -> Optional[zstandard.ZstdCompressionDict]:
+        """Entraîner et enregistrer le dictionnaire d'un site sur un échantillon de pages"""
+        try:
+            dictionary = zstandard.train_dictionary(settings.HTML_STORE_DICTIONARY_SIZE, samples)
+        except zstandard.ZstdError as e:
+            # Échantillon trop petit ou trop homogène : compression sans dictionnaire
+            print(f"Erreur lors de l'entraînement du dictionnaire HTML de {site}: {str(e)}")
+            return None
+
+        dict_id = dictionary.dict_id()
+        self._write_atomic(self._dictionary_path(dict_id), dictionary.as_bytes())
+        self._write_atomic(self._site_path(site), str(dict_id).encode("utf-8"))
+        self._dictionaries[dict_id] = dictionary
+        return dictionary
+
+    def writer(self, site: Optional[str] = None) -> "HtmlBlobWriter":
+        """Écriture asynchrone des pages d'un site"""
+        return HtmlBlobWriter(self, site)
+
+class HtmlBlobWriter:
+    """Écriture des blobs dans un thread dédié (compression hors de la boucle du crawl)
+
+    La file est bornée (`HTML_STORE_QUEUE_SIZE`) : un disque plus lent que le
+    crawl le ralentit au lieu d'accumuler le HTML en mémoire. Sans dictionnaire
+    pour le site, les `HTML_STORE_DICTIONARY_SAMPLES` premières pages servent à
+    l'entraîner avant d'être écrites.
+    """
+
+    _STOP = object()
+
+    def __init__(self, store: HtmlBlobStore, site: Optional[str] = None, queue_size: Optional[int] = None):
+        self.store = store
+        self.site = site
+        self.stats = {"pages": 0, "stored": 0, "deduplicated": 0, "bytes": 0, "compressed_bytes": 0, "dictionary": None}
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size or settings.HTML_STORE_QUEUE_SIZE)
+        self._error: Optional[Exception] = None
+        self._thread = threading.Thread(target=self._run, name="html-blob-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, content_hash: str, html: str):
+        """Ajouter une page à écrire (bloque si la file est pleine)"""
+        if self._error is not None:
+            raise self._error
+        self._queue.put((content_hash, html))
+
+    def close(self) -> Dict[str, object]:
+        """Attendre l'écriture des pages en file ; statistiques d'écriture"""
+        self._queue.put(self._STOP)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return dict(self.stats)
+
+    def __enter__(self) -> "HtmlBlobWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._queue.put(self._STOP)
+            self._thread.join()
+
+    def _run(self):
+        """Boucle du thread d'écriture"""
+        dictionary = None
+        training = False
+        if self.site and settings.HTML_STORE_DICTIONARY:
+            dictionary = self.store.site_dictionary(self.site)
+            training = dictionary is None
+        compressor = self.store.compressor(dictionary)
+        pending = []
+
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                break
+            if self._error is not None:
+                # Les pages restantes sont consommées pour ne pas bloquer le crawl
+                continue
+            try:
+                if training:
+                    pending.append(item)
+                    if len(pending) < settings.HTML_STORE_DICTIONARY_SAMPLES:
+                        continue
+                    dictionary = self.store.train_dictionary(self.site, [html.encode("utf-8") for _, html in pending])
+                    compressor = self.store.compressor(dictionary)
+                    training = False
+                    for content_hash, html in pending:
+                        self._write(compressor, content_hash, html)
+                    pending = []
+                else:
+                    self._write(compressor, *item)
+            except Exception as e:
+                self._error = e
+
+        try:
+            # Site trop petit pour entraîner un dictionnaire
+            for content_hash, html in pending:
+                self._write(compressor, content_hash, html)
+        except Exception as e:
+            self._error = self._error or e
+        if dictionary is not None:
+            self.stats["dictionary"] = dictionary.dict_id()
+
+    def _write(self, compressor: zstandard.ZstdCompressor, content_hash: str, html: str):
+        """Écrire un blob et compter les octets économisés"""
+        size = self.store.put(content_hash, html, compressor)
+        self.stats["pages"] += 1
+        if size is None:
+            self.stats["deduplicated"] += 1
+        else:
+            self.stats["stored"] += 1
+            self.stats["bytes"] += len(html.encode("utf-8"))
+            self.stats["compressed_bytes"] += size
\ No newline at end of file
@@ -0,0 +1,210 @@
+from typing import Iterable, List, Tuple
+import numpy as np
+
+from app.services.anchor_generation import ANCHOR_STOP_WORDS, TOKEN_PATTERN
+
+Pairs = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+class BM25Index:
+    """Index inversé BM25 compact sur le texte des pages
+
+    Construit en une seule lecture des textes. Les listes de postings sont
+    stockées sous forme de tableaux d'entiers (pointeurs par terme, numéros
+    de documents int32, fréquences uint16) ; les poids BM25 sont recalculés
+    à la demande.
+    """
+
+    def __init__(
+        self,
+        k1: float = 1.2,
+        b: float = 0.75,
+        max_df: float = 0.5,
+        query_terms: int = 16,
+        max_postings_per_term: int = 256
+    ):
+        self.k1 = k1
+        self.b = b
+        self.max_df = max_df
+        self.query_terms = query_terms
+        self.max_postings_per_term = max_postings_per_term
+
+        self.vocabulary = {}
+        self.term_ptr = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.empty(0, dtype=np.int32)
+        self.term_freqs = np.empty(0, dtype=np.uint16)
+        self.doc_lengths = np.empty(0, dtype=np.int32)
+        self.idf = np.empty(0, dtype=np.float32)
+
+    @property
+    def doc_count(self) -> int:
+        return int(self.doc_lengths.size)
+
+    def nbytes(self) -> int:
+        """Taille des tableaux de l'index en octets"""
+        return sum(array.nbytes for array in (
+            self.term_ptr, self.doc_ids, self.term_freqs, self.doc_lengths, self.idf
+        ))
+
+    def build(self, texts: Iterable[str]) -> "BM25Index":
+        """Construire l'index en une passe sur les textes (itérable accepté)"""
+        from sklearn.feature_extraction.text import CountVectorizer
+
+        vectorizer = CountVectorizer(
+            token_pattern=TOKEN_PATTERN,
+            lowercase=True,
+            stop_words=list(ANCHOR_STOP_WORDS),
+            dtype=np.int32
+        )
+        try:
+            counts = vectorizer.fit_transform(texts)
+        except ValueError:
+            # Aucun terme indexable
+            return self
+
+        n = counts.shape[0]
+        self.doc_lengths = np.asarray(counts.sum(axis=1), dtype=np.int32).ravel()
+
+        # Postings par terme (colonnes de la matrice documents x termes)
+        postings = counts.tocsc()
+        postings.sort_indices()
+        df = np.diff(postings.indptr)
+
+        # Les termes présents dans la majorité des pages ne discriminent rien
+        keep = np.flatnonzero(df <= max(1, int(self.max_df * n)))
+        postings = postings[:, keep]
+        df = df[keep]
+        terms = vectorizer.get_feature_names_out()[keep]
+
+        self.vocabulary = {term: term_id for term_id, term in enumerate(terms.tolist())}
+        self.term_ptr = postings.indptr.astype(np.int64)
+        self.doc_ids = postings.indices.astype(np.int32)
+        self.term_freqs = np.minimum(postings.data, np.iinfo(np.uint16).max).astype(np.uint16)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        return self
+
+    def _term_doc_weights(self):
+        """Matrice creuse termes x documents des poids BM25"""
+        from scipy.sparse import csr_matrix
+
+        terms = np.repeat(np.arange(self.idf.size), np.diff(self.term_ptr))
+        lengths = self.doc_lengths[self.doc_ids].astype(np.float32)
+        average = max(float(self.doc_lengths.mean()), 1.0)
+        tf = self.term_freqs.astype(np.float32)
+        weights = self.idf[terms] * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * lengths / average))
+        return csr_matrix(
+            (weights.astype(np.float32), self.doc_ids, self.term_ptr),
+            shape=(self.idf.size, self.doc_count)
+        )
+
+    def _truncate_rows(self, matrix, limit: int):
+        """Conserver les `limit` plus grandes valeurs de chaque ligne d'une matrice CSR"""
+        from scipy.sparse import csr_matrix
+
+        rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+        order = np.lexsort((-matrix.data, rows))
+        rank = np.arange(order.size) - matrix.indptr[rows[order]]
+        selected = np.sort(order[rank < limit])
+        return csr_matrix(
+            (matrix.data[selected], (rows[selected], matrix.indices[selected])),
+            shape=matrix.shape
+        )
+
+    def top_k_pairs(self, k: int, max_chunk_nnz: int = 20_000_000) -> Pairs:
+        """k voisins lexicaux de chaque page (hors elle-même) : (lignes, colonnes, scores)
+
+        Chaque page est interrogée avec ses `query_terms` termes les plus
+        discriminants ; seules les `max_postings_per_term` pages les mieux
+        notées de chaque terme sont parcourues (postings tronqués par impact),
+        ce qui borne le coût d'une requête quel que soit le vocabulaire du site.
+        """
+        if self.doc_count == 0 or self.idf.size == 0:
+            return (
+                np.empty(0, dtype=np.int64),
+                np.empty(0, dtype=np.int64),
+                np.empty(0, dtype=np.float32)
+            )
+
+        weights = self._term_doc_weights()
+        impact = self._truncate_rows(weights, self.max_postings_per_term)
+        queries = self._truncate_rows(weights.T.tocsr(), self.query_terms)
+        queries.data[:] = 1.0
+
+        # Découper les requêtes selon le volume de postings qu'elles parcourent
+        work = np.cumsum(queries @ np.diff(impact.indptr).astype(np.float64))
+        boundaries = np.searchsorted(work, np.arange(max_chunk_nnz, work[-1] + max_chunk_nnz, max_chunk_nnz))
+        boundaries = np.unique(np.concatenate(([0], np.minimum(boundaries + 1, self.doc_count), [self.doc_count])))
+
+        parts: List[Pairs] = []
+        for start, end in zip(boundaries[:-1].tolist(), boundaries[1:].tolist()):
+            scores = (queries[start:end] @ impact).tocsr()
+            parts.append(self._top_k_rows(scores, k, start))
+
+        return tuple(np.concatenate([part[i] for part in parts]) for i in range(3))
+
+    def _top_k_rows(self, scores, k: int, row_offset: int) -> Pairs:
+        """Meilleures colonnes de chaque ligne d'une matrice CSR (hors diagonale)"""
+        indptr, indices, data = scores.indptr, scores.indices, scores.data
+        selected = []
+
+        # Lignes contiguës : sélection partielle par ligne plutôt qu'un tri global
+        for row in range(scores.shape[0]):
+            start, end = indptr[row], indptr[row + 1]
+            if start == end:
+                continue
+            positions = np.arange(start, end)
+            positions = positions[indices[start:end] != row + row_offset]
+            if positions.size > k:
+                positions = positions[np.argpartition(-data[positions], k - 1)[:k]]
+            selected.append(positions[np.argsort(-data[positions], kind="stable")])
+
+        if not selected:
+            return (
+                np.empty(0, dtype=np.int64),
+                np.empty(0, dtype=np.int64),
+                np.empty(0, dtype=np.float32)
+            )
+
+        selected = np.concatenate(selected)
+        rows = np.searchsorted(indptr, selected, side="right") - 1 + row_offset
+        return rows.astype(np.int64), indices[selected].astype(np.int64), data[selected].astype(np.float32)
+
+def reciprocal_rank_fusion(
+    rankings: List[Pairs],
+    n_pages: int,
+    top_k: int,
+    k: int = 60
+) -> Pairs:
+    """Fusion par rangs réciproques de plusieurs listes de voisins par page
+
+    Chaque liste (lignes, colonnes, scores) est classée par page source ; une
+    paire reçoit la somme des 1 / (k + rang). Le score fusionné est ramené
+    dans [0, 1] (1 = premier rang dans toutes les listes).
+    """
+    rows_parts, cols_parts, contributions = [], [], []
+    for rows, cols, scores in rankings:
+        if rows.size == 0:
+            continue
+        order = np.lexsort((-scores, rows))
+        rows, cols = rows[order], cols[order]
+        starts = np.searchsorted(rows, rows, side="left")
+        rank = np.arange(rows.size) - starts
+        rows_parts.append(rows)
+        cols_parts.append(cols)
+        contributions.append(1.0 / (k + rank + 1))
+
+    if not rows_parts:
+        return (
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.float32)
+        )
+
+    keys = np.concatenate(rows_parts).astype(np.int64) * n_pages + np.concatenate(cols_parts)
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    fused = np.bincount(inverse, weights=np.concatenate(contributions)) * (k + 1) / len(rankings)
+
+    rows, cols = unique_keys // n_pages, unique_keys % n_pages
+    order = np.lexsort((-fused, rows))
+    rows, cols, fused = rows[order], cols[order], fused[order]
+    keep = np.arange(rows.size) - np.searchsorted(rows, rows, side="left") < top_k
+    return rows[keep], cols[keep], fused[keep].astype(np.float32)
@@ -0,0 +1,94 @@
+import asyncio
+import threading
+from typing import Dict, List, Optional, Any
+import numpy as np
+from app.core.config import settings
+
+# Modèles sentence-transformers chargés une seule fois par processus worker
+_loaded_models: Dict[str, Any] = {}
+_models_lock = threading.Lock()
+
+def get_local_model(model_name: str, device: str = None) -> Any:
+    """Charger (une seule fois par worker) un modèle sentence-transformers"""
+    device = device or settings.LOCAL_EMBEDDING_DEVICE
+    cache_key = f"{model_name}@{device}"
+
+    model = _loaded_models.get(cache_key)
+    if model is not None:
+        return model
+
+    with _models_lock:
+        model = _loaded_models.get(cache_key)
+        if model is None:
+            # Import tardif : torch est lourd et inutile pour les providers distants
+            from sentence_transformers import SentenceTransformer
+
+            model = SentenceTransformer(model_name, device=device)
+            _loaded_models[cache_key] = model
+
+    return model
+
+def get_cross_encoder(model_name: str, device: str = None) -> Any:
+    """Charger (une seule fois par worker) un cross-encoder sentence-transformers"""
+    device = device or settings.LOCAL_EMBEDDING_DEVICE
+    cache_key = f"cross-encoder:{model_name}@{device}"
+
+    model = _loaded_models.get(cache_key)
+    if model is not None:
+        return model
+
+    with _models_lock:
+        model = _loaded_models.get(cache_key)
+        if model is None:
+            from sentence_transformers import CrossEncoder
+
+            model = CrossEncoder(model_name, device=device)
+            _loaded_models[cache_key] = model
+
+    return model
+
+class LocalEmbeddingService:
+    """Génération d'embeddings en local sur CPU avec sentence-transformers"""
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        num_threads: Optional[int] = None
+    ):
+        self.model_name = model_name or settings.LOCAL_EMBEDDING_MODEL
+        self.batch_size = batch_size or settings.LOCAL_EMBEDDING_BATCH_SIZE
+        self.num_threads = num_threads if num_threads is not None else settings.LOCAL_EMBEDDING_THREADS
+
+    def _configure_threads(self):
+        """Limiter le nombre de threads utilisés par torch"""
+        if self.num_threads and self.num_threads > 0:
+            import torch
+
+            if torch.get_num_threads() != self.num_threads:
+                torch.set_num_threads(self.num_threads)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Encoder une liste de textes par lots, retourne une matrice float32"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        self._configure_threads()
+        model = get_local_model(self.model_name)
+
+        vectors = model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return np.asarray(vectors, dtype=np.float32)
+
+    async def embed_async(self, texts: List[str]) -> np.ndarray:
+        """Encoder sans bloquer la boucle d'événements"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.embed, texts)
+
+    def get_dimensions(self) -> int:
+        """Dimension des vecteurs produits par le modèle"""
+        return get_local_model(self.model_name).get_sentence_embedding_dimension()
@@ -0,0 +1,495 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+from urllib.parse import urlparse
+import numpy as np
+from app.core.config import settings
+from app.services.partitioning import assign_clusters
+from app.services.similarity_service import SimilarityService
+
+# Champs de page conservés dans l'index (ancres des pages non recrawlées)
+PAGE_FIELDS = ("url", "title", "description", "headings")
+
+class NeighborIndex:
+    """Index persistant des k plus proches voisins des pages d'un site
+
+    Les vecteurs normalisés sont stockés dans un fichier brut mappé en mémoire
+    (une ligne par emplacement, les emplacements libérés sont réutilisés) ; les
+    listes de voisins (identifiants int32, scores float32) sont triées par
+    score décroissant et complétées par -1 / -inf.
+
+    Insérer ou modifier une page ne recalcule que ses propres voisins et met à
+    jour les listes des pages dont elle entre dans le top-k ; seules les pages
+    dont un voisin a disparu ou s'est éloigné sont recalculées entièrement.
+    Chaque opération retourne les paires ajoutées et retirées.
+    """
+
+    VECTORS_FILE = "vectors.bin"
+    NEIGHBORS_FILE = "neighbors.npz"
+    PAGES_FILE = "pages.json"
+    META_FILE = "meta.json"
+    CENTROIDS_FILE = "centroids.npy"
+    BOILERPLATE_FILE = "boilerplate.npy"
+    LOCK_FILE = ".lock"
+
+    def __init__(
+        self,
+        site_key: str,
+        k: int = 20,
+        embedding_model: Optional[str] = None,
+        base_dir: Optional[str] = None,
+        chunk_rows: int = 8192
+    ):
+        self.site_key = site_key
+        self.k = k
+        self.embedding_model = embedding_model
+        self.directory = os.path.join(base_dir or settings.NEIGHBOR_INDEX_DIR, site_key)
+        self.chunk_rows = chunk_rows
+
+        self.dimensions: Optional[int] = None
+        self.count = 0
+        self.capacity = 0
+        self.pages: List[Optional[Dict[str, Any]]] = []
+        self.free_slots: List[int] = []
+        self.slots: Dict[str, int] = {}
+        self.neighbor_ids = np.full((0, k), -1, dtype=np.int32)
+        self.neighbor_scores = np.full((0, k), -np.inf, dtype=np.float32)
+        self._vectors: Optional[np.memmap] = None
+        # Centroïdes des partitions de l'analyse (partition des pages insérées)
+        self.centroids: Optional[np.ndarray] = None
+        # Empreintes des blocs de gabarit retirés du texte vectorisé
+        self.boilerplate: Optional[np.ndarray] = None
+
+    @staticmethod
+    def key_for(user_id: str, sitemap_url: str) -> str:
+        """Clé d'index d'un site : domaine lisible et empreinte (utilisateur, domaine)"""
+        domain = (urlparse(sitemap_url).netloc or "site").lower()
+        digest = hashlib.sha1(f"{user_id}:{domain}".encode("utf-8")).hexdigest()[:12]
+        return f"{re.sub(r'[^a-z0-9.-]', '_', domain)}-{digest}"
+
+    @classmethod
+    def open(cls, site_key: str, base_dir: Optional[str] = None) -> Optional["NeighborIndex"]:
+        """Ouvrir l'index d'un site, None s'il n'a jamais été construit"""
+        directory = os.path.join(base_dir or settings.NEIGHBOR_INDEX_DIR, site_key)
+        meta_path = os.path.join(directory, cls.META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(site_key, k=meta["k"], embedding_model=meta.get("embedding_model"), base_dir=base_dir)
+        index.dimensions = meta["dimensions"]
+        index.count = meta["count"]
+        index.capacity = meta["capacity"]
+
+        with open(os.path.join(directory, cls.PAGES_FILE), "r", encoding="utf-8") as f:
+            index.pages = json.load(f)
+        index.free_slots = [slot for slot, page in enumerate(index.pages) if page is None]
+        index.slots = {page["url"]: slot for slot, page in enumerate(index.pages) if page is not None}
+
+        with np.load(os.path.join(directory, cls.NEIGHBORS_FILE)) as neighbors:
+            index.neighbor_ids = neighbors["ids"]
+            index.neighbor_scores = neighbors["scores"]
+        centroids_path = os.path.join(directory, cls.CENTROIDS_FILE)
+        if os.path.exists(centroids_path):
+            index.centroids = np.load(centroids_path)
+        index.boilerplate = cls.load_boilerplate(site_key, base_dir=base_dir)
+        index._open_vectors()
+        return index
+
+    @classmethod
+    def load_boilerplate(cls, site_key: str, base_dir: Optional[str] = None) -> Optional[np.ndarray]:
+        """Empreintes du gabarit du site (texte des pages mises à jour préparé à l'identique)"""
+        path = os.path.join(base_dir or settings.NEIGHBOR_INDEX_DIR, site_key, cls.BOILERPLATE_FILE)
+        if not os.path.exists(path):
+            return None
+        return np.load(path)
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """Verrou exclusif sur l'index du site (une mise à jour à la fois)"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, self.LOCK_FILE), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @property
+    def live(self) -> np.ndarray:
+        """Masque des emplacements occupés"""
+        return np.fromiter((page is not None for page in self.pages), dtype=bool, count=self.count)
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def _open_vectors(self):
+        """Mapper le fichier des vecteurs en lecture / écriture"""
+        self._vectors = None
+        if self.capacity == 0:
+            return
+        self._vectors = np.memmap(
+            os.path.join(self.directory, self.VECTORS_FILE),
+            dtype=np.float32,
+            mode="r+",
+            shape=(self.capacity, self.dimensions)
+        )
+
+    def _reserve(self, count: int):
+        """Agrandir le fichier des vecteurs et les listes de voisins (capacité doublée)"""
+        if count <= self.capacity:
+            return
+        capacity = max(count, 2 * self.capacity, 1024)
+
+        os.makedirs(self.directory, exist_ok=True)
+        if self._vectors is not None:
+            self._vectors.flush()
+        with open(os.path.join(self.directory, self.VECTORS_FILE), "ab") as f:
+            f.truncate(capacity * self.dimensions * 4)
+        self.capacity = capacity
+        self._open_vectors()
+
+        grown = capacity - self.neighbor_ids.shape[0]
+        self.neighbor_ids = np.vstack((self.neighbor_ids, np.full((grown, self.k), -1, dtype=np.int32)))
+        self.neighbor_scores = np.vstack((self.neighbor_scores, np.full((grown, self.k), -np.inf, dtype=np.float32)))
+
+    def _allocate(self, url: str) -> int:
+        """Emplacement d'une nouvelle page (emplacement libéré en priorité)"""
+        if self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            slot = self.count
+            self._reserve(slot + 1)
+            self.count += 1
+            self.pages.append(None)
+        self.slots[url] = slot
+        return slot
+
+    def _page_record(self, page: Dict[str, Any]) -> Dict[str, Any]:
+        """Champs d'une page conservés dans l'index"""
+        record = {field: page.get(field) for field in PAGE_FIELDS}
+        record["headings"] = (record["headings"] or [])[:10]
+        return record
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        """Vecteurs float32 normalisés, dimension vérifiée"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        if self.dimensions is None:
+            self.dimensions = vectors.shape[1]
+        elif vectors.shape[1] != self.dimensions:
+            raise ValueError(f"Dimension incohérente: {vectors.shape[1]} au lieu de {self.dimensions}")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def build(
+        self,
+        pages: Sequence[Dict[str, Any]],
+        vectors: np.ndarray,
+        similarity_settings: Optional[Dict[str, Any]] = None,
+        centroids: Optional[np.ndarray] = None,
+        boilerplate: Optional[np.ndarray] = None
+    ) -> "NeighborIndex":
+        """Construire l'index complet d'un site (fin d'une analyse complète)
+
+        `pages[i]` décrit la ligne `i` de `vectors`. La recherche utilise le
+        moteur configuré (exact, deux étapes, FAISS, partitionné) en mode top-k.
+        `centroids` : partitions de l'analyse, reprises pour les pages insérées.
+        `boilerplate` : empreintes du gabarit retiré avant vectorisation.
+        """
+        self.dimensions = None
+        self.count = self.capacity = 0
+        self.pages, self.free_slots, self.slots = [], [], {}
+        self.neighbor_ids = np.full((0, self.k), -1, dtype=np.int32)
+        self.neighbor_scores = np.full((0, self.k), -np.inf, dtype=np.float32)
+        self._vectors = None
+        if os.path.exists(os.path.join(self.directory, self.VECTORS_FILE)):
+            os.remove(os.path.join(self.directory, self.VECTORS_FILE))
+
+        n = len(pages)
+        if n == 0:
+            self.save()
+            return self
+
+        self.dimensions = vectors.shape[1]
+        self._reserve(n)
+        for start in range(0, n, self.chunk_rows):
+            end = min(start + self.chunk_rows, n)
+            self._vectors[start:end] = self._normalize(vectors[start:end])
+        self.count = n
+        self.pages = [self._page_record(page) for page in pages]
+        self.slots = {page["url"]: slot for slot, page in enumerate(self.pages)}
+        self.centroids = centroids
+        self.boilerplate = boilerplate
+        if centroids is not None:
+            for page, label in zip(self.pages, assign_clusters(self._vectors[:n], centroids).tolist()):
+                page["cluster"] = label
+
+        similarity_service = SimilarityService(dict(
+            similarity_settings or {},
+            similarity_mode="top_k",
+            similarity_top_k=self.k,
+            similarity_threshold=-1.0
+        ))
+        for rows, cols, scores in similarity_service.iter_pairs(self._vectors[:n], normalized=True):
+            # Paires produites par page source, voisins triés par score décroissant
+            ranks = np.arange(rows.size) - np.searchsorted(rows, rows, side="left")
+            keep = ranks < self.k
+            self.neighbor_ids[rows[keep], ranks[keep]] = cols[keep]
+            self.neighbor_scores[rows[keep], ranks[keep]] = scores[keep]
+
+        self.save()
+        return self
+
+    def save(self):
+        """Enregistrer les listes de voisins, les pages et les métadonnées"""
+        os.makedirs(self.directory, exist_ok=True)
+        if self._vectors is not None:
+            self._vectors.flush()
+
+        # Écriture dans des fichiers temporaires puis renommage atomique
+        neighbors_path = os.path.join(self.directory, self.NEIGHBORS_FILE)
+        with open(neighbors_path + ".tmp", "wb") as f:
+            np.savez(f, ids=self.neighbor_ids, scores=self.neighbor_scores)
+        os.replace(neighbors_path + ".tmp", neighbors_path)
+
+        centroids_path = os.path.join(self.directory, self.CENTROIDS_FILE)
+        if self.centroids is not None:
+            with open(centroids_path + ".tmp", "wb") as f:
+                np.save(f, np.asarray(self.centroids, dtype=np.float32))
+            os.replace(centroids_path + ".tmp", centroids_path)
+        elif os.path.exists(centroids_path):
+            os.remove(centroids_path)
+
+        boilerplate_path = os.path.join(self.directory, self.BOILERPLATE_FILE)
+        if self.boilerplate is not None:
+            with open(boilerplate_path + ".tmp", "wb") as f:
+                np.save(f, np.asarray(self.boilerplate, dtype=np.uint64))
+            os.replace(boilerplate_path + ".tmp", boilerplate_path)
+        elif os.path.exists(boilerplate_path):
+            os.remove(boilerplate_path)
+
+        for name, content in (
+            (self.PAGES_FILE, self.pages),
+            (self.META_FILE, {
+                "site_key": self.site_key,
+                "k": self.k,
+                "embedding_model": self.embedding_model,
+                "dimensions": self.dimensions,
+                "count": self.count,
+                "capacity": self.capacity,
+                "pages": len(self.slots)
+            })
+        ):
+            path = os.path.join(self.directory, name)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(content, f, ensure_ascii=False)
+            os.replace(path + ".tmp", path)
+
+    def _scores(self, query_vectors: np.ndarray) -> np.ndarray:
+        """Similarités (requêtes x emplacements), -inf pour les emplacements libres"""
+        scores = np.empty((query_vectors.shape[0], self.count), dtype=np.float32)
+        for start in range(0, self.count, self.chunk_rows):
+            end = min(start + self.chunk_rows, self.count)
+            scores[:, start:end] = query_vectors @ self._vectors[start:end].T
+        scores[:, ~self.live] = -np.inf
+        return scores
+
+    def _set_top_k(self, slots: np.ndarray, scores: np.ndarray):
+        """Remplacer les listes de voisins de `slots` par le top-k de `scores`"""
+        scores[np.arange(slots.size), slots] = -np.inf
+        k = min(self.k, self.count)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        self.neighbor_ids[slots] = -1
+        self.neighbor_scores[slots] = -np.inf
+        self.neighbor_ids[slots, :k] = np.where(np.isfinite(top_scores), top, -1)
+        self.neighbor_scores[slots, :k] = top_scores
+
+    def _recompute(self, slots: np.ndarray):
+        """Recalcul complet des voisins de quelques pages"""
+        for start in range(0, slots.size, self.chunk_rows):
+            chunk = slots[start:start + self.chunk_rows]
+            self._set_top_k(chunk, self._scores(np.asarray(self._vectors[chunk])))
+
+    def _sort_rows(self, slots: np.ndarray):
+        """Retrier des listes de voisins par score décroissant"""
+        order = np.argsort(-self.neighbor_scores[slots], axis=1, kind="stable")
+        self.neighbor_ids[slots] = np.take_along_axis(self.neighbor_ids[slots], order, axis=1)
+        self.neighbor_scores[slots] = np.take_along_axis(self.neighbor_scores[slots], order, axis=1)
+
+    def _snapshot(self, before: Dict[int, Tuple[str, List[Tuple[str, float]]]], slots):
+        """Mémoriser la liste de voisins de pages sur le point de changer"""
+        for slot in np.atleast_1d(slots).tolist():
+            if slot in before or self.pages[slot] is None:
+                continue
+            before[slot] = (self.pages[slot]["url"], self._neighbors_of(slot))
+
+    def _neighbors_of(self, slot: int) -> List[Tuple[str, float]]:
+        """Voisins d'un emplacement : [(url, score)] par score décroissant"""
+        return [
+            (self.pages[neighbor]["url"], float(score))
+            for neighbor, score in zip(self.neighbor_ids[slot].tolist(), self.neighbor_scores[slot].tolist())
+            if neighbor >= 0
+        ]
+
+    def neighbors(self, url: str) -> List[Tuple[str, float]]:
+        """Voisins actuels d'une page"""
+        slot = self.slots.get(url)
+        return [] if slot is None else self._neighbors_of(slot)
+
+    def page(self, url: str) -> Optional[Dict[str, Any]]:
+        """Champs enregistrés d'une page (titre, titres Hn, description)"""
+        slot = self.slots.get(url)
+        return None if slot is None else self.pages[slot]
+
+    def upsert(
+        self,
+        pages: Sequence[Dict[str, Any]],
+        vectors: np.ndarray,
+        threshold: float = -1.0
+    ) -> Dict[str, Any]:
+        """Insérer ou mettre à jour des pages, retourne les paires modifiées"""
+        vectors = self._normalize(vectors)
+        if len(pages) != vectors.shape[0]:
+            raise ValueError("Le nombre de pages ne correspond pas au nombre de vecteurs")
+        if len(pages) == 0:
+            return self._changes({}, set(), threshold)
+
+        before: Dict[int, Tuple[str, List[Tuple[str, float]]]] = {}
+        updated: Set[str] = set()
+        slots = []
+        for page, vector in zip(pages, vectors):
+            slot = self.slots.get(page["url"])
+            if slot is None:
+                slot = self._allocate(page["url"])
+            else:
+                updated.add(page["url"])
+                self._snapshot(before, slot)
+            self._vectors[slot] = vector
+            self.pages[slot] = self._page_record(page)
+            if self.centroids is not None:
+                self.pages[slot]["cluster"] = int(np.argmax(self.centroids @ vector))
+            slots.append(slot)
+        slots = np.asarray(slots, dtype=np.int64)
+
+        # Voisins des pages insérées : une seule passe sur les vecteurs du site
+        scores = self._scores(vectors)
+        self._set_top_k(slots, scores.copy())
+
+        in_batch = np.zeros(self.count, dtype=bool)
+        in_batch[slots] = True
+        ids = self.neighbor_ids[:self.count]
+        dirty: Set[int] = set()
+
+        for slot, column in zip(slots.tolist(), scores):
+            # Listes qui contenaient déjà la page (mise à jour) : score rafraîchi
+            holders = np.flatnonzero((ids == slot).any(axis=1) & ~in_batch)
+            if holders.size:
+                self._snapshot(before, holders)
+                positions = np.argmax(self.neighbor_ids[holders] == slot, axis=1)
+                old_minimum = np.where(
+                    self.neighbor_ids[holders] >= 0, self.neighbor_scores[holders], np.inf
+                ).min(axis=1)
+                full = (self.neighbor_ids[holders] >= 0).all(axis=1)
+                # Page éloignée sous l'ancien dernier voisin : une autre page peut la devancer
+                dirty.update(holders[full & (column[holders] < old_minimum)].tolist())
+                self.neighbor_scores[holders, positions] = column[holders]
+                self._sort_rows(holders)
+
+            # Pages dont la nouvelle page entre dans le top-k
+            kth = self.neighbor_scores[:self.count, self.k - 1]
+            candidates = np.flatnonzero((column > kth) & ~in_batch & self.live)
+            candidates = candidates[~(self.neighbor_ids[candidates] == slot).any(axis=1)]
+            if candidates.size:
+                self._snapshot(before, candidates)
+                self.neighbor_ids[candidates, self.k - 1] = slot
+                self.neighbor_scores[candidates, self.k - 1] = column[candidates]
+                self._sort_rows(candidates)
+
+        dirty.difference_update(slots.tolist())
+        if dirty:
+            dirty_slots = np.asarray(sorted(dirty), dtype=np.int64)
+            self._snapshot(before, dirty_slots)
+            self._recompute(dirty_slots)
+
+        for slot in slots.tolist():
+            before.setdefault(slot, (self.pages[slot]["url"], []))
+        self.save()
+        return self._changes(before, updated, threshold, upserted=len(pages))
+
+    def delete(self, urls: Sequence[str], threshold: float = -1.0) -> Dict[str, Any]:
+        """Retirer des pages, retourne les paires modifiées"""
+        slots = np.asarray([self.slots[url] for url in urls if url in self.slots], dtype=np.int64)
+        before: Dict[int, Tuple[str, List[Tuple[str, float]]]] = {}
+        if slots.size == 0:
+            return self._changes(before, set(), threshold)
+
+        # Pages ayant perdu un voisin : à recalculer une fois les pages retirées
+        holders = np.flatnonzero(np.isin(self.neighbor_ids[:self.count], slots).any(axis=1))
+        holders = holders[~np.isin(holders, slots)]
+        self._snapshot(before, holders)
+        self._snapshot(before, slots)
+
+        for slot in slots.tolist():
+            del self.slots[self.pages[slot]["url"]]
+            self.pages[slot] = None
+            self.free_slots.append(slot)
+            self._vectors[slot] = 0.0
+        self.neighbor_ids[slots] = -1
+        self.neighbor_scores[slots] = -np.inf
+
+        if holders.size and len(self.slots) > 1:
+            self._recompute(holders)
+        elif holders.size:
+            self.neighbor_ids[holders] = -1
+            self.neighbor_scores[holders] = -np.inf
+
+        self.save()
+        return self._changes(before, set(), threshold, deleted=int(slots.size))
+
+    def _changes(
+        self,
+        before: Dict[int, Tuple[str, List[Tuple[str, float]]]],
+        updated: Set[str],
+        threshold: float,
+        upserted: int = 0,
+        deleted: int = 0
+    ) -> Dict[str, Any]:
+        """Paires (source, cible) ajoutées ou retirées au-dessus du seuil
+
+        Les paires impliquant une page modifiée sont retirées puis réémises :
+        leur ancre et leur score doivent être recalculés.
+        """
+        added, removed = [], []
+        for slot, (source_url, old_neighbors) in before.items():
+            old = {url: score for url, score in old_neighbors if score >= threshold}
+            new = {}
+            if self.pages[slot] is not None:
+                new = {url: score for url, score in self._neighbors_of(slot) if score >= threshold}
+            stale = source_url in updated
+            for url in old:
+                if url not in new or stale or url in updated:
+                    removed.append((source_url, url))
+            for url, score in new.items():
+                if url not in old or stale or url in updated:
+                    added.append((source_url, url, score))
+
+        return {
+            "added": added,
+            "removed": removed,
+            "upserted_pages": upserted,
+            "deleted_pages": deleted,
+            "affected_pages": len(before)
+        }
@@ -0,0 +1,144 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.core.config import settings
+from app.services.html_store import HtmlBlobStore
+
+# Enregistrement d'une page crawlée (colonnes d'extraction vides dans l'artefact du crawl)
+PAGE_SCHEMA = pa.schema([
+    pa.field("url", pa.string(), nullable=False),
+    pa.field("status_code", pa.int16()),
+    pa.field("title", pa.string()),
+    pa.field("description", pa.string()),
+    pa.field("headings", pa.list_(pa.string())),
+    pa.field("text", pa.large_string()),
+    pa.field("outlinks", pa.list_(pa.string())),
+    pa.field("content_hash", pa.string()),
+    pa.field("content_bytes", pa.int32()),
+    pa.field("fetched_at", pa.timestamp("ms")),  # UTC
+    pa.field("fetch_ms", pa.float32()),
+    pa.field("content", pa.large_string())  # nul si le HTML est dans le HtmlBlobStore
+])
+
+PAGE_COLUMNS = tuple(PAGE_SCHEMA.names)
+
+# Colonnes lues par les étapes qui n'ont pas besoin du HTML
+PAGE_FIELD_COLUMNS = ("url", "title", "description", "headings")
+
+# Colonnes du texte vectorisé et des ancres (gabarit retiré du HTML)
+PAGE_CONTENT_COLUMNS = PAGE_FIELD_COLUMNS + ("content",)
+
+class PageWriter:
+    """Écriture en flux des pages crawlées dans un fichier Parquet compressé
+
+    Les pages sont mises en tampon par groupe de lignes (`row_group_size`)
+    puis écrites : la mémoire reste bornée quelle que soit la taille du site
+    et un fichier interrompu garde les groupes déjà écrits.
+    """
+
+    def __init__(self, path: str, row_group_size: Optional[int] = None, compression: Optional[str] = None):
+        self.path = path
+        self.row_group_size = row_group_size or settings.PAGE_STORE_ROW_GROUP_SIZE
+        self.compression = compression or settings.PAGE_STORE_COMPRESSION
+        self.count = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._writer: Optional[pq.ParquetWriter] = None
+
+    def write(self, page: Dict[str, Any]):
+        """Ajouter une page (champs absents : valeurs nulles)"""
+        self._buffer.append({column: page.get(column) for column in PAGE_COLUMNS})
+        if len(self._buffer) >= self.row_group_size:
+            self.flush()
+
+    def write_all(self, pages: Iterable[Dict[str, Any]]) -> int:
+        """Ajouter des pages en flux"""
+        for page in pages:
+            self.write(page)
+        return self.count
+
+    def flush(self):
+        """Écrire le groupe de lignes en cours"""
+        if not self._buffer:
+            return
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, PAGE_SCHEMA, compression=self.compression)
+        self._writer.write_table(pa.Table.from_pylist(self._buffer, schema=PAGE_SCHEMA), row_group_size=len(self._buffer))
+        self.count += len(self._buffer)
+        self._buffer = []
+
+    def close(self) -> int:
+        """Terminer le fichier (un fichier vide garde le schéma)"""
+        self.flush()
+        if self._writer is None:
+            pq.write_table(PAGE_SCHEMA.empty_table(), self.path, compression=self.compression)
+        else:
+            self._writer.close()
+            self._writer = None
+        return self.count
+
+    def __enter__(self) -> "PageWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        elif self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+class PageReader:
+    """Lecture par colonnes et par lots d'un ou plusieurs fichiers de pages (dans l'ordre)
+
+    Avec un `HtmlBlobStore`, la colonne `content` absente du fichier (HTML
+    stocké à part) est relue depuis les blobs, lot par lot, d'après `content_hash`.
+    """
+
+    def __init__(self, paths: Sequence[str], blobs: Optional[HtmlBlobStore] = None):
+        self.paths = list(paths)
+        self.blobs = blobs
+
+    def __len__(self) -> int:
+        """Nombre de pages (lu dans les métadonnées, sans parcourir les fichiers)"""
+        return sum(pq.ParquetFile(path).metadata.num_rows for path in self.paths)
+
+    def iter_batches(
+        self,
+        columns: Optional[Sequence[str]] = None,
+        batch_size: Optional[int] = None,
+        urls: Optional[Set[str]] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Pages par lots, limitées aux colonnes demandées (et éventuellement à quelques URLs)"""
+        columns = list(columns) if columns else list(PAGE_COLUMNS)
+        if urls is not None and "url" not in columns:
+            columns.append("url")
+        batch_size = batch_size or settings.PAGE_STORE_ROW_GROUP_SIZE
+        load_content = self.blobs is not None and "content" in columns
+        read_columns = columns + ["content_hash"] if load_content and "content_hash" not in columns else columns
+        for path in self.paths:
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=read_columns):
+                pages = batch.to_pylist()
+                if urls is not None:
+                    # Filtrage avant la lecture des blobs
+                    pages = [page for page in pages if page["url"] in urls]
+                if load_content:
+                    for page in pages:
+                        if page["content"] is None and page["content_hash"]:
+                            page["content"] = self.blobs.get(page["content_hash"])
+                        if read_columns is not columns:
+                            del page["content_hash"]
+                yield pages
+
+    def iter_pages(self, columns: Optional[Sequence[str]] = None, urls: Optional[Set[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Pages une par une (éventuellement restreintes à quelques URLs)"""
+        for batch in self.iter_batches(columns, urls=urls):
+            yield from batch
+
+    def read(self, columns: Optional[Sequence[str]] = None, urls: Optional[Set[str]] = None) -> List[Dict[str, Any]]:
+        """Pages en mémoire (éventuellement restreintes à quelques URLs)"""
+        return [page for batch in self.iter_batches(columns, urls=urls) for page in batch]
+
+    def column(self, name: str) -> List[Any]:
+        """Valeurs d'une seule colonne"""
+        return [value for path in self.paths for value in pq.read_table(path, columns=[name]).column(name).to_pylist()]
\ No newline at end of file
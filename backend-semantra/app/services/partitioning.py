@@ -0,0 +1,142 @@
+import os
+from typing import Dict, Optional, Tuple, Union
+import numpy as np
+
+from app.services.shared_vectors import Reference, open_vectors
+from app.services.vector_index import normalize_embeddings
+
+Pairs = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+def default_cluster_count(n: int) -> int:
+    """Nombre de partitions par défaut : environ racine carrée du nombre de pages"""
+    return max(1, min(int(np.sqrt(n)), 4096))
+
+def fit_partitions(
+    vectors: np.ndarray,
+    n_clusters: int,
+    sample_size: int = 100000,
+    batch_size: int = 1024,
+    chunk_size: int = 16384,
+    seed: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """K-means mini-batch sur les embeddings normalisés, retourne (labels, centroïdes)
+
+    Le modèle est ajusté sur un échantillon ; chaque page est ensuite affectée
+    au centroïde normalisé le plus proche en cosinus, par blocs.
+    """
+    from sklearn.cluster import MiniBatchKMeans
+
+    n = vectors.shape[0]
+    n_clusters = max(1, min(n_clusters, n))
+    if n > sample_size:
+        rng = np.random.default_rng(seed)
+        sample = np.asarray(vectors[np.sort(rng.choice(n, sample_size, replace=False))], dtype=np.float32)
+    else:
+        sample = np.asarray(vectors, dtype=np.float32)
+
+    kmeans = MiniBatchKMeans(
+        n_clusters=n_clusters,
+        batch_size=batch_size,
+        n_init=1,
+        random_state=seed
+    )
+    kmeans.fit(sample)
+    centroids = normalize_embeddings(kmeans.cluster_centers_)
+
+    return assign_clusters(vectors, centroids, chunk_size=chunk_size), centroids
+
+def assign_clusters(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 16384) -> np.ndarray:
+    """Partition de chaque vecteur normalisé (centroïde le plus proche)"""
+    labels = np.empty(vectors.shape[0], dtype=np.int32)
+    for start in range(0, vectors.shape[0], chunk_size):
+        end = min(start + chunk_size, vectors.shape[0])
+        labels[start:end] = np.argmax(np.asarray(vectors[start:end], dtype=np.float32) @ centroids.T, axis=1)
+    return labels
+
+def nearest_clusters(centroids: np.ndarray, probe: int) -> np.ndarray:
+    """Pour chaque partition, elle-même puis ses `probe - 1` plus proches voisines"""
+    probe = max(1, min(probe, centroids.shape[0]))
+    similarities = centroids @ centroids.T
+    np.fill_diagonal(similarities, np.inf)
+    nearest = np.argpartition(-similarities, probe - 1, axis=1)[:, :probe]
+    order = np.argsort(-np.take_along_axis(similarities, nearest, axis=1), axis=1)
+    return np.take_along_axis(nearest, order, axis=1)
+
+def cluster_summary(labels: np.ndarray) -> Dict[str, int]:
+    """Statistiques de taille des partitions (rapport de l'analyse)"""
+    sizes = np.bincount(labels)
+    sizes = sizes[sizes > 0]
+    return {
+        "count": int(sizes.size),
+        "largest": int(sizes.max()) if sizes.size else 0,
+        "median": int(np.median(sizes)) if sizes.size else 0,
+        "smallest": int(sizes.min()) if sizes.size else 0
+    }
+
+def save_clusters(path: str, labels: np.ndarray, centroids: np.ndarray):
+    """Enregistrer les partitions k-means des pages (ordre des lignes des embeddings)"""
+    with open(path, "wb") as f:
+        np.savez(f, labels=np.asarray(labels, dtype=np.int32), centroids=np.asarray(centroids, dtype=np.float32))
+
+def load_clusters(path: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Partitions enregistrées (labels, centroïdes), None si absentes"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return data["labels"], data["centroids"]
+
+def search_partition(
+    source: Union[np.ndarray, Reference],
+    task: Tuple[np.ndarray, np.ndarray],
+    mode: str,
+    top_k: int,
+    threshold: float,
+    tile_memory_mb: float
+) -> Pairs:
+    """Paires d'un lot de pages d'une partition avec les pages des partitions sondées
+
+    `task` = (queries, candidates), indices globaux triés ; les pages
+    requêtes font partie des candidates (partition d'origine sondée).
+    Dans un processus de calcul, seuls les indices transitent.
+    """
+    queries, candidates = task
+    vectors = open_vectors(source)
+    candidate_vectors = np.asarray(vectors[candidates])
+    self_positions = np.searchsorted(candidates, queries)
+
+    # Requêtes découpées pour borner la matrice de similarités
+    rows_per_chunk = max(1, int(tile_memory_mb * 1024 * 1024 // max(candidates.size * 4, 1)))
+    parts = []
+    for start in range(0, queries.size, rows_per_chunk):
+        end = min(start + rows_per_chunk, queries.size)
+        block = np.asarray(vectors[queries[start:end]]) @ candidate_vectors.T
+        block[np.arange(end - start), self_positions[start:end]] = -np.inf
+
+        if mode == "top_k":
+            k = min(top_k, candidates.size - 1)
+            if k <= 0:
+                continue
+            top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            rows = np.repeat(queries[start:end], k)
+            cols = candidates[top.reshape(-1)]
+            scores = top_scores.reshape(-1)
+        else:
+            local_rows, local_cols = np.nonzero(block >= threshold)
+            rows = queries[start:end][local_rows]
+            cols = candidates[local_cols]
+            scores = block[local_rows, local_cols]
+
+        mask = (scores >= threshold) & np.isfinite(scores)
+        parts.append((rows[mask].astype(np.int64), cols[mask].astype(np.int64), scores[mask].astype(np.float32)))
+
+    if not parts:
+        return (
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.float32)
+        )
+    return tuple(np.concatenate([part[i] for part in parts]) for i in range(3))
@@ -0,0 +1,180 @@
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+from app.core.config import settings
+from app.services.boilerplate import CHARS_PER_TOKEN
+from app.services.embedding_store import EmbeddingStore
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?;:])\s+")
+
+def split_passages(blocks: Sequence[str], max_tokens: int = 200, max_passages: Optional[int] = None) -> List[str]:
+    """Regrouper les blocs de texte d'une page en passages d'au plus `max_tokens`
+
+    Les blocs sont assemblés dans l'ordre du document ; un bloc trop long est
+    coupé aux fins de phrase, puis aux mots. Le nombre de tokens est estimé
+    à partir du nombre de caractères.
+    """
+    max_chars = max(1, max_tokens * CHARS_PER_TOKEN)
+
+    pieces: List[str] = []
+    for block in blocks:
+        if len(block) <= max_chars:
+            pieces.append(block)
+            continue
+        for sentence in _SENTENCE_RE.split(block):
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(" ", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                pieces.append(sentence[:cut])
+                sentence = sentence[cut:].lstrip()
+            if sentence:
+                pieces.append(sentence)
+
+    passages: List[str] = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + 1 + len(piece) > max_chars:
+            passages.append(current)
+            current = piece
+            if max_passages and len(passages) >= max_passages:
+                return passages
+        else:
+            current = f"{current} {piece}" if current else piece
+    if current and not (max_passages and len(passages) >= max_passages):
+        passages.append(current)
+    return passages
+
+class PassageIndex:
+    """Embeddings des passages d'une analyse, avec la page de chaque passage
+
+    Les vecteurs sont stockés dans un EmbeddingStore (une ligne par passage,
+    l'URL de la page en regard) dans le dossier de l'analyse ; les passages
+    d'une page sont contigus, dans l'ordre des pages. Les textes sont
+    conservés ligne à ligne avec leurs positions pour un accès direct.
+    """
+
+    TEXTS_FILE = "passages.txt"
+    TEXT_OFFSETS_FILE = "passage_offsets.npy"
+
+    def __init__(self, analysis_id: str, dtype: str = "float32", base_dir: Optional[str] = None):
+        self.analysis_id = analysis_id
+        self.store = EmbeddingStore(
+            "passages",
+            dtype=dtype,
+            base_dir=os.path.join(base_dir or settings.EMBEDDING_STORE_DIR, analysis_id)
+        )
+        self.directory = self.store.directory
+        self._texts_file = None
+        self._text_offsets: List[int] = []
+        self._position = 0
+        self._page_offsets: Optional[Tuple[List[str], np.ndarray]] = None
+
+    @classmethod
+    def open(cls, analysis_id: str, base_dir: Optional[str] = None) -> Optional["PassageIndex"]:
+        """Ouvrir en lecture l'index des passages d'une analyse, None s'il n'existe pas"""
+        root = os.path.join(base_dir or settings.EMBEDDING_STORE_DIR, analysis_id)
+        if not os.path.exists(os.path.join(root, "passages", EmbeddingStore.META_FILE)):
+            return None
+        index = cls(analysis_id, base_dir=base_dir)
+        index.store = EmbeddingStore.open("passages", base_dir=root)
+        return index
+
+    def append_page(self, url: str, texts: Sequence[str], vectors: np.ndarray):
+        """Ajouter les passages d'une page (contigus)"""
+        if not texts:
+            return
+        if self._texts_file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._texts_file = open(os.path.join(self.directory, self.TEXTS_FILE), "wb")
+        self.store.append_batch([url] * len(texts), vectors)
+        for text in texts:
+            line = (text.replace("\n", " ") + "\n").encode("utf-8")
+            self._text_offsets.append(self._position)
+            self._texts_file.write(line)
+            self._position += len(line)
+
+    def close(self):
+        """Terminer l'écriture (vecteurs, textes, positions)"""
+        self.store.close()
+        if self._texts_file is not None:
+            self._texts_file.close()
+            self._texts_file = None
+            np.save(
+                os.path.join(self.directory, self.TEXT_OFFSETS_FILE),
+                np.array(self._text_offsets + [self._position], dtype=np.int64)
+            )
+
+    def __len__(self) -> int:
+        return self.store.count
+
+    def matrix(self) -> np.ndarray:
+        """Vecteurs normalisés des passages (mappés en mémoire)"""
+        return self.store.matrix()
+
+    def page_offsets(self) -> Tuple[List[str], np.ndarray]:
+        """URLs des pages dans l'ordre et bornes de leurs passages (`offsets[i]:offsets[i + 1]`)"""
+        if self._page_offsets is None:
+            urls = self.store.urls
+            starts = [position for position in range(len(urls)) if position == 0 or urls[position] != urls[position - 1]]
+            self._page_offsets = (
+                [urls[start] for start in starts],
+                np.array(starts + [len(urls)], dtype=np.int64)
+            )
+        return self._page_offsets
+
+    def texts(self, positions: Sequence[int]) -> Dict[int, str]:
+        """Textes de quelques passages, lus directement dans le fichier"""
+        offsets = np.load(os.path.join(self.directory, self.TEXT_OFFSETS_FILE), mmap_mode="r")
+        texts = {}
+        with open(os.path.join(self.directory, self.TEXTS_FILE), "rb") as f:
+            for position in sorted(set(int(position) for position in positions)):
+                f.seek(int(offsets[position]))
+                texts[position] = f.read(int(offsets[position + 1] - offsets[position])).decode("utf-8").rstrip("\n")
+        return texts
+
+def max_sim_pairs(
+    vectors: np.ndarray,
+    offsets: np.ndarray,
+    sources: np.ndarray,
+    targets: np.ndarray,
+    top_m: int = 1
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Score de page à page par agrégation max-sim / top-m des passages
+
+    Pour chaque passage de la source, similarité maximale avec un passage de
+    la cible ; le score de la paire est la moyenne des `top_m` meilleurs
+    passages de la source (`top_m=1` : max-sim). Retourne (scores, indice
+    global du meilleur passage de la source, son score). Les paires sont
+    traitées par page source : un produit matriciel, réduit par segments.
+    """
+    scores = np.empty(sources.size, dtype=np.float32)
+    best_passages = np.empty(sources.size, dtype=np.int64)
+    best_scores = np.empty(sources.size, dtype=np.float32)
+    if sources.size == 0:
+        return scores, best_passages, best_scores
+
+    order = np.argsort(sources, kind="stable")
+    boundaries = np.flatnonzero(np.diff(sources[order])) + 1
+    for group in np.split(order, boundaries):
+        source = int(sources[group[0]])
+        source_vectors = np.asarray(vectors[offsets[source]:offsets[source + 1]], dtype=np.float32)
+        group_targets = targets[group]
+        lengths = offsets[group_targets + 1] - offsets[group_targets]
+        columns = np.concatenate([np.arange(offsets[target], offsets[target + 1]) for target in group_targets.tolist()])
+
+        block = source_vectors @ np.asarray(vectors[columns], dtype=np.float32).T
+        segment_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        per_target = np.maximum.reduceat(block, segment_starts, axis=1)
+
+        m = min(top_m, per_target.shape[0])
+        if m <= 1:
+            aggregated = per_target.max(axis=0)
+        else:
+            aggregated = -np.partition(-per_target, m - 1, axis=0)[:m].mean(axis=0)
+        scores[group] = aggregated
+        best_passages[group] = offsets[source] + per_target.argmax(axis=0)
+        best_scores[group] = per_target.max(axis=0)
+
+    return scores, best_passages, best_scores
\ No newline at end of file
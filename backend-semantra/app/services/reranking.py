@@ -0,0 +1,64 @@
+from typing import Callable, Optional, Tuple
+import numpy as np
+
+from app.core.config import settings
+from app.services.local_embedding_service import get_cross_encoder
+
+Pairs = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+class CrossEncoderReranker:
+    """Rescoring des paires candidates par un cross-encoder local
+
+    Le cross-encoder lit le texte des deux pages ensemble : plus précis que le
+    cosinus des embeddings mais bien plus coûteux, il n'est appliqué qu'aux
+    paires déjà retenues (top-k). Le score final mélange le cosinus et la
+    probabilité du cross-encoder selon `weight`.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        batch_size: Optional[int] = None,
+        weight: float = 0.5,
+        max_chars: int = 2000
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size or settings.LOCAL_EMBEDDING_BATCH_SIZE
+        self.weight = weight
+        self.max_chars = max_chars
+        self.stats = {"pairs": 0}
+
+    @classmethod
+    def from_settings(cls, ai_settings: dict) -> Optional["CrossEncoderReranker"]:
+        """Reranker configuré par les paramètres IA, ou None s'il est désactivé"""
+        ai_settings = ai_settings or {}
+        model_name = ai_settings.get("cross_encoder_model")
+        if not model_name:
+            return None
+        return cls(
+            model_name,
+            batch_size=ai_settings.get("cross_encoder_batch_size"),
+            weight=ai_settings.get("cross_encoder_weight", 0.5)
+        )
+
+    def rerank(self, pairs: Pairs, text_for: Callable[[int], str]) -> Pairs:
+        """Rescorer un lot de paires, retourne (lignes, colonnes, scores mélangés)"""
+        rows, cols, scores = pairs
+        if rows.size == 0:
+            return pairs
+
+        # Texte de chaque page du lot préparé une seule fois
+        texts = {
+            page: (text_for(page) or "")[:self.max_chars]
+            for page in np.unique(np.concatenate((rows, cols))).tolist()
+        }
+        # Modèles à une sortie : predict applique déjà la sigmoïde (score dans [0, 1])
+        probabilities = np.asarray(get_cross_encoder(self.model_name).predict(
+            [(texts[row], texts[col]) for row, col in zip(rows.tolist(), cols.tolist())],
+            batch_size=self.batch_size,
+            show_progress_bar=False
+        ), dtype=np.float32).reshape(-1)
+
+        self.stats["pairs"] += int(rows.size)
+        blended = (1.0 - self.weight) * scores + self.weight * probabilities
+        return rows, cols, blended.astype(np.float32)
@@ -35,10 +35,50 @@ class SettingsService:
             },
             "ai_settings": {
                 "embedding_model": "text-embedding-3-large",
+                "embedding_provider": "openai",
+                "embedding_batch_size": 64,
+                "embedding_threads": 0,
+                "embedding_storage_dtype": "float32",
+                "embedding_granularity": "page",
+                "passage_max_tokens": 200,
+                "passage_top_m": 1,
+                "embedding_dimensions": None,
+                "dimension_reduction": "auto",
+                "embedding_quantization": "none",
+                "max_outlinks_per_page": 10,
+                "max_inlinks_per_page": 20,
+                "max_suggestions": 50,
+                "retrieval_mode": "embedding",
+                "rank_fusion_k": 60,
+                "similarity_engine": "exact",
+                "similarity_mode": "threshold",
+                "similarity_top_k": 20,
+                "similarity_tile_memory_mb": 64,
+                "similarity_executor": "threads",
+                "similarity_shared_memory": "auto",
+                "incremental_index": True,
+                "boilerplate_removal": True,
+                "boilerplate_max_page_fraction": 0.5,
+                "candidate_dimensions": 256,
+                "candidate_quantization": "int8",
+                "rerank_factor": 4,
+                "cross_encoder_model": None,
+                "cross_encoder_weight": 0.5,
+                "partition_clusters": None,
+                "partition_probe": 3,
+                "partition_workers": None,
+                "faiss_index_type": "hnsw",
+                "faiss_nprobe": 8,
+                "faiss_ef_search": 64,
+                "anchor_generator": "keyphrase",
+                "anchor_candidates": 5,
+                "anchor_placement": True,
+                "unplaced_score_factor": 0.5,
                 "anchor_optimization": {
                     "enabled": True,
                     "provider": "openai",
-                    "model": "gpt-4"
+                    "model": "gpt-4-turbo-preview",
+                    "fallback_providers": ["gemini"]
                 }
             }
         }
@@ -47,6 +87,18 @@ class SettingsService:
         # Pour l'instant, retourner les paramètres par défaut
         return default_settings
     
+    def analysis_ai_settings(self, user_id: str, ai_settings: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Paramètres IA d'une nouvelle analyse : budgets de liens de l'utilisateur, sauf valeurs fournies"""
+        user_settings = self.get_user_settings(user_id)
+        user_ai_settings = user_settings.get("ai_settings", {})
+        budgets = {
+            "max_outlinks_per_page": user_ai_settings.get("max_outlinks_per_page"),
+            "max_inlinks_per_page": user_ai_settings.get("max_inlinks_per_page"),
+            # Plafond global réglé au niveau de l'utilisateur
+            "max_suggestions": user_settings.get("max_suggestions", user_ai_settings.get("max_suggestions"))
+        }
+        return {**budgets, **(ai_settings or {})}
+    
     def update_user_settings(self, user_id: str, settings_data: Dict[str, Any]) -> Dict[str, Any]:
         """Mettre à jour les paramètres d'un utilisateur"""
         # Ici on pourrait sauvegarder les paramètres en base de données
@@ -89,6 +141,16 @@ class SettingsService:
                     "max_tokens": 8191,
                     "is_active": True,
                     "is_default": True
+                },
+                {
+                    "id": "default-local-minilm",
+                    "name": "paraphrase-multilingual-MiniLM-L12-v2",
+                    "provider": "local",
+                    "model_id": "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+                    "dimensions": 384,
+                    "max_tokens": 128,
+                    "is_active": True,
+                    "is_default": False
                 }
             ]
             return default_models
@@ -0,0 +1,138 @@
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple, Union
+import numpy as np
+
+# Emplacements de la matrice partagée : segment POSIX (/dev/shm) ou fichier mappé
+SHARED_MEMORY_BACKENDS = ("auto", "shm", "file")
+
+# Référence transmise aux processus : ("shm", nom, forme) ou ("file", chemin, offset, forme)
+Reference = Tuple[Any, ...]
+
+# Matrice partagée ouverte une seule fois par processus de calcul
+_attached: Dict[Reference, Tuple[np.ndarray, Any]] = {}
+
+# Limites BLAS des processus de calcul (conservées pour rester actives)
+_blas_limits = None
+
+class SharedVectors:
+    """Matrice float32 placée une fois en mémoire partagée pour un pool de processus
+
+    Les processus ne reçoivent qu'une référence (nom du segment ou chemin du
+    fichier) et ouvrent la matrice sans copie ni sérialisation. Un memmap
+    float32 existant (EmbeddingStore) est réutilisé tel quel.
+    """
+
+    def __init__(self, vectors: np.ndarray, backend: str = "auto", chunk_rows: int = 16384):
+        if backend not in SHARED_MEMORY_BACKENDS:
+            raise ValueError(f"Mémoire partagée non supportée: {backend}")
+
+        self.shape = tuple(vectors.shape)
+        self._segment = None
+        self._temporary_file: Optional[str] = None
+
+        if isinstance(vectors, np.memmap) and vectors.dtype == np.float32 and vectors.filename and vectors.flags.c_contiguous:
+            self.reference: Reference = ("file", vectors.filename, int(vectors.offset), self.shape)
+            return
+
+        nbytes = int(np.prod(self.shape)) * np.dtype(np.float32).itemsize
+        if backend == "shm" or (backend == "auto" and _shm_fits(nbytes)):
+            from multiprocessing import shared_memory
+
+            self._segment = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+            target = np.ndarray(self.shape, dtype=np.float32, buffer=self._segment.buf)
+            for start in range(0, self.shape[0], chunk_rows):
+                target[start:start + chunk_rows] = vectors[start:start + chunk_rows]
+            del target
+            self.reference = ("shm", self._segment.name, self.shape)
+            return
+
+        # Repli : fichier temporaire, partagé par le cache de pages du système
+        handle, path = tempfile.mkstemp(suffix=".bin", prefix="vectors-")
+        with os.fdopen(handle, "wb") as f:
+            for start in range(0, self.shape[0], chunk_rows):
+                f.write(np.ascontiguousarray(vectors[start:start + chunk_rows], dtype=np.float32).tobytes())
+        self._temporary_file = path
+        self.reference = ("file", path, 0, self.shape)
+
+    def close(self):
+        """Libérer le segment ou le fichier temporaire"""
+        if self._segment is not None:
+            self._segment.close()
+            self._segment.unlink()
+            self._segment = None
+        if self._temporary_file:
+            os.remove(self._temporary_file)
+            self._temporary_file = None
+
+    def __enter__(self) -> "SharedVectors":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _shm_fits(nbytes: int) -> bool:
+    """Vérifier que /dev/shm peut accueillir la matrice (souvent 64 Mo dans Docker)"""
+    try:
+        stats = os.statvfs("/dev/shm")
+    except (AttributeError, OSError):
+        return False
+    return stats.f_bavail * stats.f_frsize > nbytes * 1.1
+
+def attach(reference: Reference) -> np.ndarray:
+    """Ouvrir (une fois par processus) la matrice partagée en lecture"""
+    cached = _attached.get(reference)
+    if cached is not None:
+        return cached[0]
+
+    _release_attached()
+    if reference[0] == "shm":
+        from multiprocessing import shared_memory
+
+        _, name, shape = reference
+        segment = shared_memory.SharedMemory(name=name)
+        vectors = np.ndarray(shape, dtype=np.float32, buffer=segment.buf)
+        vectors.flags.writeable = False
+    else:
+        _, path, offset, shape = reference
+        segment = None
+        vectors = np.memmap(path, dtype=np.float32, mode="r", offset=offset, shape=shape)
+    _attached[reference] = (vectors, segment)
+    return vectors
+
+def _release_attached():
+    """Fermer la matrice de la tâche précédente (segment supprimé ou fichier remplacé)"""
+    segments = [segment for _, segment in _attached.values() if segment is not None]
+    _attached.clear()
+    for segment in segments:
+        try:
+            segment.close()
+        except BufferError:
+            # Une vue sur le segment est encore référencée : fermé par le ramasse-miettes
+            pass
+
+def open_vectors(source: Union[np.ndarray, Reference]) -> np.ndarray:
+    """Matrice locale (threads) ou référence vers la matrice partagée (processus)"""
+    if isinstance(source, tuple):
+        return attach(source)
+    return source
+
+def limit_blas_threads():
+    """Un thread BLAS par processus : le parallélisme vient du pool"""
+    global _blas_limits
+    from threadpoolctl import threadpool_limits
+
+    _blas_limits = threadpool_limits(limits=1)
+
+def process_pool(workers: int) -> Optional[Executor]:
+    """Pool de processus de calcul, ou None si le processus courant ne peut pas en créer
+
+    Un worker Celery prefork (processus démon) ne peut pas créer de
+    sous-processus : l'appelant se replie alors sur des threads. Le mode
+    processus suppose un worker `--pool=threads` ou `--pool=solo`.
+    """
+    if workers <= 1 or multiprocessing.current_process().daemon:
+        return None
+    return ProcessPoolExecutor(max_workers=workers, initializer=limit_blas_threads)
\ No newline at end of file
@@ -0,0 +1,458 @@
+from typing import Dict, Any, Tuple, List, Union, Iterator
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+import os
+import numpy as np
+
+from app.services.vector_index import (
+    normalize_embeddings,
+    build_faiss_index,
+    search_faiss_index,
+    neighbors_to_pairs
+)
+from app.services.embedding_compression import (
+    Int8Vectors,
+    QUANTIZATION_MODES,
+    reduce_dimensions
+)
+from app.services.threshold_join import PrunedThresholdJoin, join_members
+from app.services.partitioning import (
+    default_cluster_count,
+    fit_partitions,
+    nearest_clusters,
+    search_partition
+)
+from app.services.shared_vectors import (
+    SHARED_MEMORY_BACKENDS,
+    Reference,
+    SharedVectors,
+    open_vectors,
+    process_pool
+)
+
+# Moteurs de similarité disponibles
+# two_stage : top-k dont les candidats sont tirés de vecteurs réduits / int8,
+# puis rescorés avec les vecteurs pleine précision
+# partitioned : recherche limitée à la partition k-means de chaque page et aux plus proches
+# pruned : toutes les paires au-dessus du seuil (exact), blocs élagués par bornes de partitions
+SIMILARITY_ENGINES = ("exact", "faiss", "two_stage", "partitioned", "pruned")
+
+# Modes de sélection des paires du moteur exact
+SIMILARITY_MODES = ("threshold", "top_k")
+
+# Exécution des tuiles : threads (BLAS libère le GIL) ou processus sur matrice partagée
+SIMILARITY_EXECUTORS = ("threads", "processes")
+
+Pairs = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+Vectors = Union[np.ndarray, Int8Vectors]
+
+def empty_pairs() -> Pairs:
+    """Résultat vide (source, cible, score)"""
+    empty = np.empty(0, dtype=np.int64)
+    return empty, empty.copy(), np.empty(0, dtype=np.float32)
+
+def concat_pairs(parts: List[Pairs]) -> Pairs:
+    """Concaténer des résultats partiels en conservant l'ordre"""
+    if not parts:
+        return empty_pairs()
+    return (
+        np.concatenate([part[0] for part in parts]),
+        np.concatenate([part[1] for part in parts]),
+        np.concatenate([part[2] for part in parts])
+    )
+
+def similarity_block(
+    vectors: Vectors,
+    start: int,
+    end: int,
+    col_start: int = 0,
+    col_chunk: int = 16384
+) -> np.ndarray:
+    """Similarités des lignes [start, end) avec les colonnes [col_start, n)"""
+    if not isinstance(vectors, Int8Vectors):
+        return vectors[start:end] @ vectors[col_start:].T
+
+    # Vecteurs int8 : déquantifier les colonnes par tranches pour rester en BLAS
+    n = vectors.shape[0]
+    left = vectors.rows(start, end)
+    block = np.empty((end - start, n - col_start), dtype=np.float32)
+    for chunk_start in range(col_start, n, col_chunk):
+        chunk_end = min(chunk_start + col_chunk, n)
+        block[:, chunk_start - col_start:chunk_end - col_start] = left @ vectors.rows(chunk_start, chunk_end).T
+    return block
+
+def threshold_tile(vectors: Vectors, start: int, end: int, threshold: float) -> Pairs:
+    """Paires (i < j) d'une tuile dont la similarité atteint le seuil"""
+    # Seules les colonnes j >= start peuvent vérifier i < j
+    block = similarity_block(vectors, start, end, col_start=start)
+
+    # Masquer la diagonale et le triangle inférieur
+    local_rows = np.arange(end - start)[:, None]
+    local_cols = np.arange(block.shape[1])[None, :]
+    block[local_cols <= local_rows] = -np.inf
+
+    rows, cols = np.nonzero(block >= threshold)
+    scores = block[rows, cols]
+    return rows + start, cols + start, scores
+
+def top_k_tile(vectors: Vectors, start: int, end: int, top_k: int, threshold: float) -> Pairs:
+    """Top-k voisins exacts de chaque ligne d'une tuile, filtrés par le seuil"""
+    n = vectors.shape[0]
+    k = min(top_k, n - 1)
+
+    block = similarity_block(vectors, start, end)
+    block[np.arange(end - start), np.arange(start, end)] = -np.inf
+
+    candidates = np.argpartition(-block, k - 1, axis=1)[:, :k]
+    candidate_scores = np.take_along_axis(block, candidates, axis=1)
+
+    # Trier les voisins de chaque ligne par score décroissant
+    order = np.argsort(-candidate_scores, axis=1)
+    candidates = np.take_along_axis(candidates, order, axis=1)
+    candidate_scores = np.take_along_axis(candidate_scores, order, axis=1)
+
+    return neighbors_to_pairs(candidate_scores, candidates, threshold, row_offset=start)
+
+def exact_tile(
+    source: Union[Vectors, Reference],
+    bounds: Tuple[int, int],
+    mode: str,
+    top_k: int,
+    threshold: float
+) -> Pairs:
+    """Tuile de lignes [start, end) du moteur exact, sur matrice locale ou partagée"""
+    vectors = open_vectors(source)
+    start, end = bounds
+    if mode == "top_k":
+        return top_k_tile(vectors, start, end, top_k, threshold)
+    return threshold_tile(vectors, start, end, threshold)
+
+def compact_task(function, source, item, **options) -> Pairs:
+    """Exécuter une tâche dans un processus et renvoyer des indices int32 (moitié moins à transférer)"""
+    rows, cols, scores = function(source, item, **options)
+    return rows.astype(np.int32), cols.astype(np.int32), scores.astype(np.float32, copy=False)
+
+class SimilarityService:
+    """Recherche des paires de pages similaires à partir des embeddings"""
+
+    def __init__(self, ai_settings: Dict[str, Any] = None):
+        ai_settings = ai_settings or {}
+
+        self.engine = ai_settings.get("similarity_engine", "exact")
+        if self.engine not in SIMILARITY_ENGINES:
+            raise ValueError(f"Moteur de similarité non supporté: {self.engine}")
+
+        self.similarity_threshold = ai_settings.get("similarity_threshold", 0.7)
+        self.top_k = ai_settings.get("similarity_top_k", 20)
+
+        # Moteur exact : toutes les paires au-dessus du seuil ou top-k par page
+        self.mode = ai_settings.get("similarity_mode", "threshold")
+        if self.mode not in SIMILARITY_MODES:
+            raise ValueError(f"Mode de similarité non supporté: {self.mode}")
+        if self.engine == "pruned" and self.mode != "threshold":
+            raise ValueError("Le moteur pruned calcule une jointure par seuil (similarity_mode=threshold)")
+
+        # Mémoire maximale d'une tuile de similarités et parallélisme
+        self.tile_memory_mb = ai_settings.get("similarity_tile_memory_mb", 64)
+        self.workers = ai_settings.get("similarity_workers") or os.cpu_count() or 1
+        # Processus : seulement hors worker Celery prefork (voir process_pool)
+        self.executor = ai_settings.get("similarity_executor", "threads")
+        if self.executor not in SIMILARITY_EXECUTORS:
+            raise ValueError(f"Exécution des similarités non supportée: {self.executor}")
+        self.shared_memory = ai_settings.get("similarity_shared_memory", "auto")
+        if self.shared_memory not in SHARED_MEMORY_BACKENDS:
+            raise ValueError(f"Mémoire partagée non supportée: {self.shared_memory}")
+
+        # Réduction de dimension et quantification
+        self.embedding_model = ai_settings.get("embedding_model")
+        self.reduced_dimensions = ai_settings.get("embedding_dimensions")
+        self.reduction_method = ai_settings.get("dimension_reduction", "auto")
+        self.quantization = ai_settings.get("embedding_quantization", "none")
+        if self.quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Quantification non supportée: {self.quantization}")
+
+        # Moteur en deux étapes : vecteurs des candidats et nombre de candidats par voisin retenu
+        self.candidate_dimensions = ai_settings.get("candidate_dimensions", 256)
+        self.candidate_quantization = ai_settings.get("candidate_quantization", "int8")
+        if self.candidate_quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Quantification non supportée: {self.candidate_quantization}")
+        self.rerank_factor = ai_settings.get("rerank_factor", 4)
+
+        # Moteur partitionné : k-means mini-batch, partitions sondées, processus de recherche
+        self.partition_clusters = ai_settings.get("partition_clusters")
+        self.partition_probe = ai_settings.get("partition_probe", 3)
+        self.partition_sample_size = ai_settings.get("partition_sample_size", 100000)
+        self.partition_batch_pages = ai_settings.get("partition_batch_pages", 4096)
+        self.partition_workers = ai_settings.get("partition_workers") or os.cpu_count() or 1
+        self.partitions = None
+        self.join_stats = None
+
+        # Paramètres FAISS
+        self.index_type = ai_settings.get("faiss_index_type", "hnsw")
+        self.nlist = ai_settings.get("faiss_nlist")
+        self.nprobe = ai_settings.get("faiss_nprobe", 8)
+        self.hnsw_m = ai_settings.get("faiss_hnsw_m", 32)
+        self.ef_search = ai_settings.get("faiss_ef_search", 64)
+
+    @property
+    def pairs_are_symmetric(self) -> bool:
+        """Chaque paire (i < j) vaut pour les deux sens (jointure exacte par seuil)"""
+        return self.engine in ("exact", "pruned") and self.mode == "threshold"
+
+    def find_pairs(self, embedding_matrix: np.ndarray, normalized: bool = False) -> Pairs:
+        """Retourner les paires (source, cible, score) au-dessus du seuil"""
+        return concat_pairs(list(self.iter_pairs(embedding_matrix, normalized=normalized)))
+
+    def iter_pairs(self, embedding_matrix: np.ndarray, normalized: bool = False) -> Iterator[Pairs]:
+        """Produire les paires par lots (une tuile à la fois pour le moteur exact)"""
+        if normalized and embedding_matrix.dtype == np.float32:
+            # Vecteurs déjà normalisés (ex. EmbeddingStore mappé) : aucune copie
+            vectors = embedding_matrix
+        elif normalized:
+            vectors = np.ascontiguousarray(embedding_matrix, dtype=np.float32)
+        else:
+            vectors = normalize_embeddings(embedding_matrix)
+
+        if vectors.shape[0] < 2:
+            return
+
+        if self.engine == "two_stage":
+            yield from self._iter_pairs_two_stage(vectors)
+            return
+
+        if self.engine == "partitioned":
+            yield from self._iter_pairs_partitioned(vectors)
+            return
+
+        if self.engine == "pruned":
+            yield from self._iter_pairs_pruned(vectors)
+            return
+
+        if self.reduced_dimensions:
+            vectors, _ = reduce_dimensions(
+                vectors,
+                self.reduced_dimensions,
+                model=self.embedding_model,
+                method=self.reduction_method
+            )
+
+        if self.engine == "faiss":
+            yield self._find_pairs_faiss(vectors)
+            return
+
+        if self.quantization == "int8":
+            vectors = Int8Vectors.quantize(vectors)
+
+        yield from self._iter_pairs_exact(vectors)
+
+    def _tile_rows(self, n: int) -> int:
+        """Nombre de lignes par tuile pour respecter le budget mémoire"""
+        row_bytes = n * np.dtype(np.float32).itemsize
+        return max(1, int(self.tile_memory_mb * 1024 * 1024 // row_bytes))
+
+    def _iter_pairs_exact(self, vectors: Vectors) -> Iterator[Pairs]:
+        """Similarités exactes calculées par tuiles de lignes (BLAS)"""
+        n = vectors.shape[0]
+        tile_rows = self._tile_rows(n)
+        bounds = [(start, min(start + tile_rows, n)) for start in range(0, n, tile_rows)]
+
+        yield from self._run_shared(
+            exact_tile,
+            vectors,
+            bounds,
+            self.workers if len(bounds) > 1 else 1,
+            mode=self.mode,
+            top_k=self.top_k,
+            threshold=self.similarity_threshold
+        )
+
+    def _iter_pairs_two_stage(self, vectors: np.ndarray) -> Iterator[Pairs]:
+        """Top-k en deux étapes : candidats sur vecteurs compressés, rescoring exact"""
+        candidate_vectors, _ = reduce_dimensions(
+            vectors,
+            self.candidate_dimensions,
+            model=self.embedding_model,
+            method=self.reduction_method
+        )
+        if self.candidate_quantization == "int8":
+            candidate_vectors = Int8Vectors.quantize(candidate_vectors)
+
+        yield from self._iter_tiles(
+            vectors.shape[0],
+            lambda start, end: self._two_stage_tile(vectors, candidate_vectors, start, end)
+        )
+
+    def _iter_pairs_partitioned(self, vectors: np.ndarray) -> Iterator[Pairs]:
+        """Recherche dans la partition de chaque page et ses plus proches partitions
+
+        Les affectations (labels, centroïdes) restent disponibles dans
+        `self.partitions` pour être enregistrées avec l'analyse.
+        """
+        n = vectors.shape[0]
+        labels, centroids = fit_partitions(
+            vectors,
+            self.partition_clusters or default_cluster_count(n),
+            sample_size=self.partition_sample_size
+        )
+        probes = nearest_clusters(centroids, self.partition_probe)
+        self.partitions = {"labels": labels, "centroids": centroids, "probes": probes}
+
+        # Pages de chaque partition, par indices croissants
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(centroids.shape[0] + 1))
+        members = [order[bounds[c]:bounds[c + 1]] for c in range(centroids.shape[0])]
+
+        def tasks() -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+            for cluster, queries in enumerate(members):
+                if queries.size == 0:
+                    continue
+                candidates = np.sort(np.concatenate([members[probe] for probe in probes[cluster]]))
+                for start in range(0, queries.size, self.partition_batch_pages):
+                    yield queries[start:start + self.partition_batch_pages], candidates
+
+        yield from self._run_shared(
+            search_partition,
+            vectors,
+            tasks(),
+            self.partition_workers,
+            mode=self.mode,
+            top_k=self.top_k,
+            threshold=self.similarity_threshold,
+            tile_memory_mb=self.tile_memory_mb
+        )
+
+    def _iter_pairs_pruned(self, vectors: np.ndarray) -> Iterator[Pairs]:
+        """Jointure exacte par seuil, blocs de partitions élagués par bornes angulaires"""
+        join = PrunedThresholdJoin(
+            self.similarity_threshold,
+            n_clusters=self.partition_clusters,
+            tile_memory_mb=self.tile_memory_mb
+        ).prepare(vectors)
+        self.partitions = {"labels": join.labels, "centroids": join.centroids}
+        self.join_stats = join.stats
+
+        yield from self._run_shared(
+            join_members,
+            vectors,
+            join.tasks(),
+            self.workers,
+            threshold=self.similarity_threshold,
+            tile_memory_mb=self.tile_memory_mb
+        )
+
+    def _iter_tiles(self, n: int, run_tile) -> Iterator[Pairs]:
+        """Exécuter `run_tile(start, end)` sur toutes les tuiles de lignes, dans l'ordre"""
+        tile_rows = self._tile_rows(n)
+        starts = range(0, n, tile_rows)
+
+        yield from self._run_ordered(
+            lambda start: run_tile(start, min(start + tile_rows, n)),
+            starts,
+            self.workers if len(starts) > 1 else 1
+        )
+
+    def _run_shared(self, function, vectors: Vectors, items, workers: int, **options) -> Iterator[Pairs]:
+        """Appliquer `function(vectors, item, **options)` à chaque élément, résultats dans l'ordre
+
+        En mode processus, la matrice est placée une fois en mémoire partagée :
+        les processus ne reçoivent que sa référence et les indices de chaque
+        tâche, et renvoient des paires compactes. Repli sur des threads si le
+        pool ne peut pas être créé (worker Celery prefork) ou pour des vecteurs int8.
+        """
+        executor = None
+        if self.executor == "processes" and isinstance(vectors, np.ndarray) and vectors.shape[0] < 2 ** 31:
+            executor = process_pool(workers)
+            if executor is None and workers > 1:
+                print("Pool de processus indisponible (worker Celery prefork) : similarités calculées sur des threads")
+
+        if executor is None:
+            yield from self._run_ordered(partial(function, vectors, **options), items, workers)
+            return
+
+        with SharedVectors(vectors, backend=self.shared_memory) as shared, executor:
+            task = partial(compact_task, function, shared.reference, **options)
+            for rows, cols, scores in self._run_ordered(task, items, workers, executor=executor):
+                yield rows.astype(np.int64), cols.astype(np.int64), scores
+
+    def _run_ordered(self, function, items, workers: int, executor: Executor = None) -> Iterator[Pairs]:
+        """Appliquer `function` à chaque élément, en parallèle, résultats dans l'ordre
+
+        Par défaut des threads : les produits matriciels libèrent le GIL. Le
+        nombre de tâches en vol est borné pour garder la mémoire sous contrôle.
+        """
+        if executor is None and workers <= 1:
+            for item in items:
+                yield function(item)
+            return
+
+        if executor is None:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                yield from self._run_ordered(function, items, workers, executor=executor)
+            return
+
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def _two_stage_tile(
+        self,
+        vectors: np.ndarray,
+        candidate_vectors: Vectors,
+        start: int,
+        end: int
+    ) -> Pairs:
+        """Candidats d'une tuile sur vecteurs compressés, rescorés en pleine précision"""
+        n = vectors.shape[0]
+        k = min(self.top_k, n - 1)
+        candidate_k = min(max(k * self.rerank_factor, k), n - 1)
+
+        block = similarity_block(candidate_vectors, start, end)
+        block[np.arange(end - start), np.arange(start, end)] = -np.inf
+        candidates = np.argpartition(-block, candidate_k - 1, axis=1)[:, :candidate_k]
+        del block
+
+        # Rescoring exact des seuls candidats, par paquets de lignes bornés en mémoire
+        dimensions = vectors.shape[1]
+        chunk_rows = max(1, int(self.tile_memory_mb * 1024 * 1024 // (candidate_k * dimensions * 4)))
+        exact_scores = np.empty(candidates.shape, dtype=np.float32)
+        for chunk_start in range(0, end - start, chunk_rows):
+            chunk_end = min(chunk_start + chunk_rows, end - start)
+            left = np.asarray(vectors[start + chunk_start:start + chunk_end], dtype=np.float32)
+            right = np.asarray(vectors[candidates[chunk_start:chunk_end].reshape(-1)], dtype=np.float32)
+            right = right.reshape(chunk_end - chunk_start, candidate_k, dimensions)
+            exact_scores[chunk_start:chunk_end] = np.matmul(right, left[:, :, None])[:, :, 0]
+
+        top = np.argpartition(-exact_scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(exact_scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top_ids = np.take_along_axis(np.take_along_axis(candidates, top, axis=1), order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        return neighbors_to_pairs(top_scores, top_ids, self.similarity_threshold, row_offset=start)
+
+    def _find_pairs_faiss(self, vectors: np.ndarray) -> Pairs:
+        """Top-k approximatif avec FAISS, puis application du seuil"""
+        index = build_faiss_index(
+            vectors,
+            index_type=self.index_type,
+            nlist=self.nlist,
+            hnsw_m=self.hnsw_m,
+            quantization=self.quantization
+        )
+
+        # k + 1 car chaque page est sa propre plus proche voisine
+        scores, ids = search_faiss_index(
+            index,
+            vectors,
+            self.top_k + 1,
+            nprobe=self.nprobe,
+            ef_search=self.ef_search
+        )
+
+        return neighbors_to_pairs(scores, ids, self.similarity_threshold)
@@ -0,0 +1,161 @@
+from typing import Dict, Any, Optional, Tuple, List
+import numpy as np
+
+Pairs = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+# Budgets appliqués quand les paramètres de l'analyse ne les précisent pas
+# (None ou 0 explicites : pas de contrainte)
+DEFAULT_MAX_OUTLINKS_PER_PAGE = 10
+DEFAULT_MAX_INLINKS_PER_PAGE = 20
+DEFAULT_MAX_SUGGESTIONS = 50
+
+def _rank_within_groups(sorted_groups: np.ndarray) -> np.ndarray:
+    """Rang de chaque élément dans son groupe (groupes déjà contigus)"""
+    if sorted_groups.size == 0:
+        return np.empty(0, dtype=np.int64)
+    boundaries = np.flatnonzero(np.diff(sorted_groups)) + 1
+    starts = np.concatenate(([0], boundaries))
+    counts = np.diff(np.concatenate((starts, [sorted_groups.size])))
+    return np.arange(sorted_groups.size) - np.repeat(starts, counts)
+
+class SuggestionSelector:
+    """Sélection des suggestions sous contraintes de degré
+
+    - max_outlinks : nombre maximal de liens sortants suggérés par page source
+    - max_inlinks : nombre maximal de liens entrants suggérés par page cible
+    - max_total : plafond global du nombre de suggestions
+
+    Les paires arrivent par lots (tuiles de similarité). Pour chaque source
+    et pour chaque cible, seuls les meilleurs candidats sont conservés
+    (équivalent d'un tas borné par page, fusionné de façon vectorisée), de
+    sorte que la mémoire et le coût restent en O(n·k log k) au lieu de porter
+    sur toutes les paires.
+    """
+
+    def __init__(
+        self,
+        max_outlinks: Optional[int] = None,
+        max_inlinks: Optional[int] = None,
+        max_total: Optional[int] = None,
+        overfetch: int = 2,
+        merge_min_size: int = 1_000_000
+    ):
+        self.max_outlinks = max_outlinks
+        self.max_inlinks = max_inlinks
+        self.max_total = max_total
+
+        # Conserver plus de candidats que le budget pour compenser les cibles saturées
+        self.per_source_pool = None
+        if max_outlinks:
+            self.per_source_pool = max_outlinks * overfetch if max_inlinks else max_outlinks
+        self.per_target_pool = None
+        if max_inlinks:
+            self.per_target_pool = max_inlinks * overfetch if max_outlinks else max_inlinks
+        # Coupe globale par score seulement sans budget par page : avec des
+        # budgets, les meilleurs scores peuvent se concentrer sur quelques pages
+        # saturées et la sélection gloutonne doit pouvoir puiser plus loin
+        self.global_pool = None
+        if max_total and not (max_outlinks or max_inlinks):
+            self.global_pool = max_total
+
+        self.merge_min_size = merge_min_size
+        self._kept: Pairs = (
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.float32)
+        )
+        self._buffer: List[Pairs] = []
+        self._buffered = 0
+        self.candidates_seen = 0
+
+    @classmethod
+    def from_settings(cls, ai_settings: Dict[str, Any] = None) -> Optional["SuggestionSelector"]:
+        """Construire le sélecteur depuis les paramètres IA (None si toutes les contraintes sont désactivées)"""
+        ai_settings = ai_settings or {}
+        max_outlinks = ai_settings.get("max_outlinks_per_page", DEFAULT_MAX_OUTLINKS_PER_PAGE)
+        max_inlinks = ai_settings.get("max_inlinks_per_page", DEFAULT_MAX_INLINKS_PER_PAGE)
+        max_total = ai_settings.get("max_suggestions", DEFAULT_MAX_SUGGESTIONS)
+
+        if not (max_outlinks or max_inlinks or max_total):
+            return None
+
+        return cls(max_outlinks=max_outlinks, max_inlinks=max_inlinks, max_total=max_total)
+
+    def add(self, rows: np.ndarray, cols: np.ndarray, scores: np.ndarray, symmetric: bool = False):
+        """Ajouter un lot de paires candidates (source, cible, score)"""
+        if rows.size == 0:
+            return
+
+        if symmetric:
+            # Une paire non orientée propose un lien dans chaque sens
+            rows, cols = np.concatenate((rows, cols)), np.concatenate((cols, rows))
+            scores = np.concatenate((scores, scores))
+
+        self.candidates_seen += rows.size
+        self._buffer.append((rows, cols, scores.astype(np.float32, copy=False)))
+        self._buffered += rows.size
+
+        # Fusion amortie : seulement quand le tampon dépasse l'état conservé
+        if self._buffered >= max(self.merge_min_size, self._kept[0].size):
+            self._merge()
+
+    def _merge(self):
+        """Fusionner le tampon avec les candidats conservés et élaguer"""
+        if not self._buffer:
+            return
+
+        rows = np.concatenate([self._kept[0]] + [part[0] for part in self._buffer])
+        cols = np.concatenate([self._kept[1]] + [part[1] for part in self._buffer])
+        scores = np.concatenate([self._kept[2]] + [part[2] for part in self._buffer])
+        self._buffer = []
+        self._buffered = 0
+
+        if self.per_source_pool:
+            order = np.lexsort((-scores, rows))
+            rows, cols, scores = rows[order], cols[order], scores[order]
+            keep = _rank_within_groups(rows) < self.per_source_pool
+            rows, cols, scores = rows[keep], cols[keep], scores[keep]
+
+        if self.per_target_pool:
+            order = np.lexsort((-scores, cols))
+            rows, cols, scores = rows[order], cols[order], scores[order]
+            keep = _rank_within_groups(cols) < self.per_target_pool
+            rows, cols, scores = rows[keep], cols[keep], scores[keep]
+
+        if self.global_pool and scores.size > self.global_pool:
+            top = np.argpartition(-scores, self.global_pool - 1)[:self.global_pool]
+            rows, cols, scores = rows[top], cols[top], scores[top]
+
+        self._kept = (rows, cols, scores)
+
+    def select(self) -> Pairs:
+        """Sélection gloutonne par score décroissant sous les budgets"""
+        self._merge()
+        rows, cols, scores = self._kept
+
+        order = np.argsort(-scores, kind="stable")
+        rows, cols, scores = rows[order], cols[order], scores[order]
+
+        if not self.max_outlinks and not self.max_inlinks:
+            limit = self.max_total or rows.size
+            return rows[:limit], cols[:limit], scores[:limit]
+
+        outlinks: Dict[int, int] = {}
+        inlinks: Dict[int, int] = {}
+        selected = []
+
+        for position, (source, target) in enumerate(zip(rows.tolist(), cols.tolist())):
+            if self.max_outlinks and outlinks.get(source, 0) >= self.max_outlinks:
+                continue
+            if self.max_inlinks and inlinks.get(target, 0) >= self.max_inlinks:
+                continue
+
+            outlinks[source] = outlinks.get(source, 0) + 1
+            inlinks[target] = inlinks.get(target, 0) + 1
+            selected.append(position)
+
+            if self.max_total and len(selected) >= self.max_total:
+                break
+
+        selected = np.asarray(selected, dtype=np.int64)
+        return rows[selected], cols[selected], scores[selected]
@@ -1,7 +1,10 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, desc, or_
-from typing import List, Optional, Dict, Any
+from sqlalchemy import and_, desc, or_, tuple_
+from typing import Iterable, List, Optional, Dict, Any, Tuple
 from datetime import datetime
+import csv
+import io
+import json
 import uuid
 
 from app.models.suggestion import Suggestion
@@ -31,6 +34,91 @@ class SuggestionService:
         
         return suggestion
     
+    # Colonnes écrites par l'enregistrement en masse (created_at : défaut du serveur)
+    BULK_COLUMNS = ("id", "analysis_id", "source_page", "target_page", "anchor_text", "score", "status", "reasoning", "metadata")
+    
+    def bulk_create_suggestions(
+        self,
+        suggestions: Iterable[SuggestionCreate],
+        analysis_id: Optional[str] = None,
+        batch_size: int = 1000,
+        use_copy: bool = True
+    ) -> int:
+        """Enregistrer un flux de suggestions par lots, une transaction par lot
+        
+        Chaque lot est écrit en une seule requête (COPY sous PostgreSQL, sinon
+        INSERT multi-lignes), sans relecture des lignes. `analysis_id`
+        remplace celui des suggestions s'il est fourni.
+        """
+        table = Suggestion.__table__
+        copy = use_copy and self._supports_copy()
+        created = 0
+        rows: List[Dict[str, Any]] = []
+        
+        for suggestion_data in suggestions:
+            rows.append({
+                "id": str(uuid.uuid4()),
+                "analysis_id": analysis_id or suggestion_data.analysis_id,
+                "source_page": suggestion_data.source_page,
+                "target_page": suggestion_data.target_page,
+                "anchor_text": suggestion_data.anchor_text,
+                "score": suggestion_data.score,
+                "status": "pending",
+                "reasoning": suggestion_data.reasoning,
+                "metadata": suggestion_data.metadata or {}
+            })
+            if not rows[-1]["analysis_id"]:
+                raise ValueError("Suggestion sans analyse associée")
+            
+            if len(rows) >= batch_size:
+                created += self._write_batch(table, rows, copy)
+                rows = []
+        
+        if rows:
+            created += self._write_batch(table, rows, copy)
+        return created
+    
+    def _supports_copy(self) -> bool:
+        """COPY disponible : PostgreSQL via psycopg2"""
+        bind = self.db.get_bind()
+        return bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg2"
+    
+    def _write_batch(self, table, rows: List[Dict[str, Any]], copy: bool) -> int:
+        """Écrire un lot de lignes puis valider la transaction"""
+        try:
+            if copy:
+                self._copy_rows(table, rows)
+            else:
+                self.db.execute(table.insert().values(rows))
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return len(rows)
+    
+    def _copy_rows(self, table, rows: List[Dict[str, Any]]):
+        """COPY ... FROM STDIN (CSV) sur la connexion de la session"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([
+                json.dumps(row[column], ensure_ascii=False) if column == "metadata" else row[column]
+                for column in self.BULK_COLUMNS
+            ])
+        buffer.seek(0)
+        
+        # Champ vide non entre guillemets = NULL, sauf pour les colonnes obligatoires
+        columns = ", ".join(f'"{column}"' for column in self.BULK_COLUMNS)
+        cursor = self.db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {table.name} ({columns}) FROM STDIN "
+                "WITH (FORMAT csv, FORCE_NOT_NULL (source_page, target_page, anchor_text))",
+                buffer
+            )
+        finally:
+            cursor.close()
+    
     def get_suggestion(self, suggestion_id: str) -> Optional[Suggestion]:
         """Récupérer une suggestion par son ID"""
         return self.db.query(Suggestion).filter(Suggestion.id == suggestion_id).first()
@@ -74,6 +162,32 @@ class SuggestionService:
         filters: SuggestionFilter = None
     ) -> Dict[str, Any]:
         """Lister les suggestions avec filtres"""
+        query = self._filtered_query(analysis_id, filters)
+        
+        # Compter le total
+        total = query.count()
+        
+        # Pagination
+        if filters:
+            query = query.offset(filters.offset).limit(filters.limit)
+        
+        # Tri par score décroissant
+        suggestions = query.order_by(desc(Suggestion.score)).all()
+        
+        return {
+            "suggestions": suggestions,
+            "total": total,
+            "limit": filters.limit if filters else 100,
+            "offset": filters.offset if filters else 0,
+            "has_more": total > (filters.offset + filters.limit) if filters else False
+        }
+    
+    def _filtered_query(
+        self,
+        analysis_id: Optional[str] = None,
+        filters: SuggestionFilter = None
+    ):
+        """Requête des suggestions avec filtres (sans pagination)"""
         query = self.db.query(Suggestion)
         
         # Filtrer par analyse
@@ -101,23 +215,35 @@ class SuggestionService:
                     )
                 )
         
-        # Compter le total
-        total = query.count()
-        
-        # Pagination
-        if filters:
-            query = query.offset(filters.offset).limit(filters.limit)
-        
-        # Tri par score décroissant
-        suggestions = query.order_by(desc(Suggestion.score)).all()
-        
-        return {
-            "suggestions": suggestions,
-            "total": total,
-            "limit": filters.limit if filters else 100,
-            "offset": filters.offset if filters else 0,
-            "has_more": total > (filters.offset + filters.limit) if filters else False
-        }
+        return query
+    
+    def count_suggestions(
+        self,
+        analysis_id: Optional[str] = None,
+        filters: SuggestionFilter = None
+    ) -> int:
+        """Compter les suggestions correspondant aux filtres"""
+        return self._filtered_query(analysis_id, filters).count()
+    
+    def iter_suggestions(
+        self,
+        analysis_id: Optional[str] = None,
+        filters: SuggestionFilter = None,
+        chunk_size: int = 1000
+    ):
+        """Parcourir les suggestions filtrées par lots (pagination par clé)"""
+        last_id = None
+        while True:
+            query = self._filtered_query(analysis_id, filters)
+            if last_id is not None:
+                query = query.filter(Suggestion.id > last_id)
+            
+            chunk = query.order_by(Suggestion.id).limit(chunk_size).all()
+            if not chunk:
+                return
+            
+            yield chunk
+            last_id = chunk[-1].id
     
     def batch_update_status(
         self,
@@ -135,6 +261,47 @@ class SuggestionService:
         self.db.commit()
         return updated_count
     
+    def delete_pairs(
+        self,
+        analysis_id: str,
+        pairs: List[Tuple[str, str]],
+        batch_size: int = 500
+    ) -> int:
+        """Supprimer les suggestions (source, cible) d'une analyse et leurs optimisations"""
+        deleted_count = 0
+        for start in range(0, len(pairs), batch_size):
+            suggestion_ids = [
+                row.id for row in self.db.query(Suggestion.id).filter(
+                    Suggestion.analysis_id == analysis_id,
+                    tuple_(Suggestion.source_page, Suggestion.target_page).in_(pairs[start:start + batch_size])
+                )
+            ]
+            if not suggestion_ids:
+                continue
+            
+            self.db.query(AnchorOptimization).filter(
+                AnchorOptimization.suggestion_id.in_(suggestion_ids)
+            ).delete(synchronize_session=False)
+            deleted_count += self.db.query(Suggestion).filter(
+                Suggestion.id.in_(suggestion_ids)
+            ).delete(synchronize_session=False)
+        
+        self.db.commit()
+        return deleted_count
+    
+    def delete_analysis_suggestions(self, analysis_id: str) -> int:
+        """Supprimer toutes les suggestions d'une analyse et leurs optimisations"""
+        suggestion_ids = self.db.query(Suggestion.id).filter(Suggestion.analysis_id == analysis_id)
+        self.db.query(AnchorOptimization).filter(
+            AnchorOptimization.suggestion_id.in_(suggestion_ids.scalar_subquery())
+        ).delete(synchronize_session=False)
+        deleted_count = self.db.query(Suggestion).filter(
+            Suggestion.analysis_id == analysis_id
+        ).delete(synchronize_session=False)
+        
+        self.db.commit()
+        return deleted_count
+    
     def save_anchor_optimization(
         self,
         suggestion_id: str,
@@ -143,7 +310,9 @@ class SuggestionService:
         provider: str,
         model: str,
         confidence_score: float,
-        alternatives: List[str] = None
+        alternatives: List[str] = None,
+        parameters: Dict[str, Any] = None,
+        cache_key: Optional[str] = None
     ) -> AnchorOptimization:
         """Sauvegarder une optimisation d'ancre"""
         optimization = AnchorOptimization(
@@ -155,7 +324,8 @@ class SuggestionService:
             model=model,
             confidence_score=confidence_score,
             alternatives=alternatives or [],
-            parameters={}
+            parameters=parameters or {},
+            cache_key=cache_key
         )
         
         self.db.add(optimization)
@@ -164,6 +334,33 @@ class SuggestionService:
         
         return optimization
     
+    def bulk_save_anchor_optimizations(
+        self,
+        optimizations: List[Dict[str, Any]]
+    ) -> int:
+        """Sauvegarder un lot d'optimisations d'ancres en une transaction"""
+        if not optimizations:
+            return 0
+        
+        self.db.add_all([
+            AnchorOptimization(
+                id=str(uuid.uuid4()),
+                suggestion_id=optimization["suggestion_id"],
+                original_anchor=optimization["original_anchor"],
+                optimized_anchor=optimization["optimized_anchor"],
+                provider=optimization["provider"],
+                model=optimization["model"],
+                confidence_score=optimization["confidence_score"],
+                alternatives=optimization.get("alternatives") or [],
+                parameters=optimization.get("parameters") or {},
+                cache_key=optimization.get("cache_key")
+            )
+            for optimization in optimizations
+        ])
+        self.db.commit()
+        
+        return len(optimizations)
+    
     def get_suggestions_by_score_range(
         self,
         min_score: float = 0.0,
@@ -0,0 +1,159 @@
+from typing import Iterator, List, Optional, Tuple, Union
+import numpy as np
+
+from app.services.partitioning import default_cluster_count, fit_partitions
+from app.services.shared_vectors import Reference, open_vectors
+
+Pairs = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+# Bloc de jointure : (membres, lignes candidates, candidates de la même partition)
+JoinTask = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+class PrunedThresholdJoin:
+    """Jointure exacte « toutes les paires de cosinus ≥ seuil » avec élagage
+
+    Les pages (vecteurs normalisés) sont regroupées par k-means ; chaque
+    partition B a un centroïde b et un rayon angulaire θ_B (angle maximal entre
+    une page de B et b). Par l'inégalité triangulaire sur la sphère, pour une
+    page x et toute page y de B :
+
+        angle(x, y) ≥ angle(x, b) - θ_B
+
+    Si angle(x, b) - θ_B dépasse arccos(seuil), aucune page de B ne peut être
+    appariée à x : le produit scalaire n'est pas calculé. Le résultat est
+    exactement celui du calcul exhaustif, aux arrondis float32 près.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        n_clusters: Optional[int] = None,
+        sample_size: int = 20000,
+        tile_memory_mb: float = 64,
+        chunk_size: int = 16384,
+        margin: float = 1e-4
+    ):
+        self.threshold = threshold
+        self.n_clusters = n_clusters
+        self.sample_size = sample_size
+        self.tile_memory_mb = tile_memory_mb
+        self.chunk_size = chunk_size
+        # Marge angulaire (radians) absorbant les arrondis float32 des bornes
+        self.margin = margin
+
+        self.labels: Optional[np.ndarray] = None
+        self.centroids: Optional[np.ndarray] = None
+        self.radii: Optional[np.ndarray] = None
+        self.members: List[np.ndarray] = []
+        self.candidates: List[np.ndarray] = []
+        self.stats = {"pages": 0, "clusters": 0, "computed_products": 0, "total_products": 0}
+
+    def prepare(self, vectors: np.ndarray) -> "PrunedThresholdJoin":
+        """Partitionner les pages et calculer, pour chaque partition, ses lignes candidates"""
+        n = vectors.shape[0]
+        self.labels, self.centroids = fit_partitions(
+            vectors,
+            self.n_clusters or default_cluster_count(n),
+            sample_size=self.sample_size,
+            chunk_size=self.chunk_size
+        )
+        n_clusters = self.centroids.shape[0]
+
+        # Rayon angulaire de chaque partition (page la plus éloignée du centroïde)
+        own_similarity = np.empty(n, dtype=np.float32)
+        for start in range(0, n, self.chunk_size):
+            end = min(start + self.chunk_size, n)
+            block = np.asarray(vectors[start:end], dtype=np.float32) @ self.centroids.T
+            own_similarity[start:end] = block[np.arange(end - start), self.labels[start:end]]
+        angles = np.arccos(np.clip(own_similarity, -1.0, 1.0))
+        self.radii = np.zeros(n_clusters, dtype=np.float64)
+        np.maximum.at(self.radii, self.labels, angles)
+
+        # Similarité minimale au centroïde pour qu'une page ait un voisin possible dans B
+        limit_angles = np.arccos(np.clip(self.threshold, -1.0, 1.0)) + self.radii + self.margin
+        limits = np.where(limit_angles >= np.pi, -np.inf, np.cos(np.minimum(limit_angles, np.pi)))
+
+        # Chaque paire {i, j} n'est évaluée qu'une fois : dans la partition de plus
+        # grand numéro, depuis la page de la partition de plus petit numéro
+        cluster_ids = np.arange(n_clusters)
+        pair_rows, pair_clusters = [], []
+        for start in range(0, n, self.chunk_size):
+            end = min(start + self.chunk_size, n)
+            block = np.asarray(vectors[start:end], dtype=np.float32) @ self.centroids.T
+            mask = (block >= limits[None, :]) & (self.labels[start:end, None] <= cluster_ids[None, :])
+            rows, clusters = np.nonzero(mask)
+            pair_rows.append((rows + start).astype(np.int64))
+            pair_clusters.append(clusters.astype(np.int32))
+
+        pair_rows = np.concatenate(pair_rows)
+        pair_clusters = np.concatenate(pair_clusters)
+        order = np.argsort(pair_clusters, kind="stable")
+        bounds = np.searchsorted(pair_clusters[order], np.arange(n_clusters + 1))
+        self.candidates = [pair_rows[order[bounds[c]:bounds[c + 1]]] for c in range(n_clusters)]
+
+        member_order = np.argsort(self.labels, kind="stable")
+        member_bounds = np.searchsorted(self.labels[member_order], np.arange(n_clusters + 1))
+        self.members = [member_order[member_bounds[c]:member_bounds[c + 1]] for c in range(n_clusters)]
+
+        self.stats.update({
+            "pages": n,
+            "clusters": n_clusters,
+            "computed_products": sum(
+                int(candidates.size) * int(members.size)
+                for candidates, members in zip(self.candidates, self.members)
+            ),
+            "total_products": n * (n - 1) // 2
+        })
+        return self
+
+    def tasks(self) -> Iterator[JoinTask]:
+        """Blocs à calculer (membres, lignes candidates, candidates de même partition)
+
+        Chaque bloc est autonome : il peut être calculé dans un processus qui
+        n'a reçu que ses indices.
+        """
+        for cluster, members in enumerate(self.members):
+            candidates = self.candidates[cluster]
+            if members.size and candidates.size:
+                yield members, candidates, self.labels[candidates] == cluster
+
+    @property
+    def pruned_fraction(self) -> float:
+        """Part des produits scalaires évités par rapport au calcul exhaustif"""
+        total = self.stats["total_products"]
+        if not total:
+            return 0.0
+        return max(0.0, 1.0 - self.stats["computed_products"] / total)
+
+def join_members(
+    source: Union[np.ndarray, Reference],
+    task: JoinTask,
+    threshold: float,
+    tile_memory_mb: float = 64
+) -> Pairs:
+    """Paires (i < j) au-dessus du seuil entre les lignes candidates et les membres d'une partition"""
+    members, candidates, same_cluster = task
+    vectors = open_vectors(source)
+    member_vectors = np.asarray(vectors[members], dtype=np.float32)
+
+    rows_per_chunk = max(1, int(tile_memory_mb * 1024 * 1024 // (members.size * 4)))
+    parts = []
+    for start in range(0, candidates.size, rows_per_chunk):
+        end = min(start + rows_per_chunk, candidates.size)
+        block = np.asarray(vectors[candidates[start:end]], dtype=np.float32) @ member_vectors.T
+        local_rows, local_cols = np.nonzero(block >= threshold)
+        rows = candidates[start:end][local_rows]
+        cols = members[local_cols]
+        # Dans une même partition, chaque paire n'est retenue que dans le sens i < j
+        keep = ~same_cluster[start:end][local_rows] | (rows < cols)
+        scores = block[local_rows[keep], local_cols[keep]]
+        rows, cols = rows[keep], cols[keep]
+        parts.append((np.minimum(rows, cols), np.maximum(rows, cols), scores.astype(np.float32)))
+
+    if not parts:
+        return (
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.float32)
+        )
+    return tuple(np.concatenate([part[i] for part in parts]) for i in range(3))
@@ -0,0 +1,134 @@
+from typing import Tuple, Optional
+import math
+import numpy as np
+
+# Types d'index FAISS supportés
+FAISS_INDEX_TYPES = ("flat", "ivf", "hnsw")
+
+# Quantifications supportées pour le stockage dans l'index
+FAISS_QUANTIZATIONS = ("none", "int8")
+
+def normalize_embeddings(matrix: np.ndarray) -> np.ndarray:
+    """Normaliser les vecteurs (norme L2) en float32 contigu"""
+    vectors = np.ascontiguousarray(matrix, dtype=np.float32)
+    if vectors.size == 0:
+        return vectors
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def build_faiss_index(
+    vectors: np.ndarray,
+    index_type: str = "flat",
+    nlist: Optional[int] = None,
+    hnsw_m: int = 32,
+    ef_construction: int = 80,
+    quantization: str = "none"
+):
+    """Construire un index FAISS en produit scalaire sur des vecteurs normalisés"""
+    import faiss
+
+    if index_type not in FAISS_INDEX_TYPES:
+        raise ValueError(f"Type d'index FAISS non supporté: {index_type}")
+    if quantization not in FAISS_QUANTIZATIONS:
+        raise ValueError(f"Quantification FAISS non supportée: {quantization}")
+
+    # Quantification scalaire 8 bits : 4x moins de mémoire que float32
+    use_int8 = quantization == "int8"
+    qtype = faiss.ScalarQuantizer.QT_8bit
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dimensions = vectors.shape
+
+    if index_type == "ivf":
+        nlist = nlist or max(1, int(4 * math.sqrt(n)))
+        # FAISS recommande ~39 points d'entraînement par centroïde
+        nlist = min(nlist, max(1, n // 39))
+
+        if nlist <= 1:
+            index_type = "flat"
+        else:
+            quantizer = faiss.IndexFlatIP(dimensions)
+            if use_int8:
+                index = faiss.IndexIVFScalarQuantizer(
+                    quantizer, dimensions, nlist, qtype, faiss.METRIC_INNER_PRODUCT
+                )
+            else:
+                index = faiss.IndexIVFFlat(quantizer, dimensions, nlist, faiss.METRIC_INNER_PRODUCT)
+
+            # Entraîner sur un échantillon pour borner le coût
+            sample_size = min(n, nlist * 256)
+            if sample_size < n:
+                rng = np.random.default_rng(0)
+                sample = vectors[rng.choice(n, sample_size, replace=False)]
+            else:
+                sample = vectors
+            index.train(sample)
+            index.add(vectors)
+            return index
+
+    if index_type == "hnsw":
+        if use_int8:
+            index = faiss.IndexHNSWSQ(dimensions, qtype, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)
+        else:
+            index = faiss.IndexHNSWFlat(dimensions, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+        index.add(vectors)
+        return index
+
+    if use_int8:
+        index = faiss.IndexScalarQuantizer(dimensions, qtype, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+    else:
+        index = faiss.IndexFlatIP(dimensions)
+    index.add(vectors)
+    return index
+
+def search_faiss_index(
+    index,
+    queries: np.ndarray,
+    k: int,
+    nprobe: int = 8,
+    ef_search: int = 64,
+    batch_size: int = 4096
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Rechercher les k plus proches voisins, par lots de requêtes"""
+    import faiss
+
+    # Paramètres de recherche selon le type d'index
+    ivf_index = faiss.try_extract_index_ivf(index)
+    if ivf_index is not None:
+        ivf_index.nprobe = min(nprobe, ivf_index.nlist)
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = max(ef_search, k)
+
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    n = queries.shape[0]
+    k = min(k, index.ntotal)
+
+    scores = np.empty((n, k), dtype=np.float32)
+    ids = np.empty((n, k), dtype=np.int64)
+
+    for start in range(0, n, batch_size):
+        end = min(start + batch_size, n)
+        scores[start:end], ids[start:end] = index.search(queries[start:end], k)
+
+    return scores, ids
+
+def neighbors_to_pairs(
+    scores: np.ndarray,
+    ids: np.ndarray,
+    threshold: float,
+    row_offset: int = 0
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Convertir des listes de voisins en paires (source, cible, score) filtrées"""
+    n, k = ids.shape
+    rows = np.repeat(np.arange(row_offset, row_offset + n, dtype=np.int64), k)
+    cols = ids.reshape(-1)
+    values = scores.reshape(-1)
+
+    # Exclure la page elle-même, les trous (-1) et les scores sous le seuil
+    mask = (cols >= 0) & (cols != rows) & (values >= threshold)
+    return rows[mask], cols[mask], values[mask]
@@ -0,0 +1,185 @@
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.ai_service import AIService
+from app.services.analysis_service import AnalysisService
+from app.services.suggestion_service import SuggestionService
+from app.schemas.suggestion import SuggestionFilter
+from typing import Dict, Any, List, Optional
+import asyncio
+
+@celery_app.task(bind=True)
+def bulk_optimize_anchors_task(
+    self,
+    analysis_id: str,
+    filters: Dict[str, Any] = None,
+    provider: Optional[str] = None,
+    style: str = "natural",
+    max_length: int = 50,
+    suggestions_per_prompt: Optional[int] = None,
+    concurrency: Optional[int] = None
+):
+    """Optimiser en masse les ancres des suggestions d'une analyse
+    
+    Sans `provider`, le provider, le modèle et les secours configurés dans
+    les paramètres IA de l'analyse sont utilisés.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    
+    try:
+        progress = loop.run_until_complete(
+            _run_bulk_anchor_optimization(
+                self,
+                analysis_id,
+                filters,
+                provider,
+                style,
+                max_length,
+                suggestions_per_prompt or settings.ANCHOR_BULK_SUGGESTIONS_PER_PROMPT,
+                concurrency or settings.ANCHOR_BULK_CONCURRENCY
+            )
+        )
+        
+        return {"status": "success", "analysis_id": analysis_id, **progress}
+        
+    except Exception as e:
+        return {"status": "error", "analysis_id": analysis_id, "error": str(e)}
+    finally:
+        loop.close()
+
+def _suggestion_item(suggestion) -> Dict[str, Any]:
+    """Extraire les entrées du prompt d'une suggestion"""
+    metadata = suggestion.metadata or {}
+    source_title = metadata.get("source_title") or suggestion.source_page
+    
+    return {
+        "suggestion_id": suggestion.id,
+        "current_anchor": suggestion.anchor_text,
+        "target_page_title": metadata.get("target_title") or suggestion.target_page,
+        "context": f"Lien depuis la page \"{source_title}\""
+    }
+
+async def _run_bulk_anchor_optimization(
+    task,
+    analysis_id: str,
+    filters: Optional[Dict[str, Any]],
+    provider: Optional[str],
+    style: str,
+    max_length: int,
+    suggestions_per_prompt: int,
+    concurrency: int
+) -> Dict[str, Any]:
+    """Optimiser les ancres par prompts groupés, traités par un pool borné de workers
+    
+    La limite de débit de chaque provider est appliquée à chaque appel (prompts
+    groupés, reprises individuelles et bascules) par le registre des providers.
+    """
+    db = SessionLocal()
+    ai_service = None
+    workers: List[asyncio.Task] = []
+    
+    try:
+        analysis = AnalysisService(db).get_analysis(analysis_id)
+        if not analysis:
+            raise ValueError("Analyse non trouvée")
+        
+        suggestion_service = SuggestionService(db)
+        ai_service = AIService(db=db, ai_settings=analysis.ai_settings or {}, tenant=analysis.user_id)
+        suggestion_filter = SuggestionFilter(**filters) if filters else None
+        
+        progress = {
+            "total": suggestion_service.count_suggestions(analysis_id, suggestion_filter),
+            "processed": 0,
+            "optimized": 0,
+            "cached": 0,
+            "failed": 0
+        }
+        
+        rows: List[Dict[str, Any]] = []
+        # File bornée : la lecture en base n'avance pas plus vite que les workers
+        packets: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+        
+        def flush_rows():
+            suggestion_service.bulk_save_anchor_optimizations(rows)
+            rows.clear()
+        
+        def record(items: List[Dict[str, Any]], results: List[Dict[str, Any]]):
+            for item, result in zip(items, results):
+                progress["processed"] += 1
+                
+                if result.get("error"):
+                    progress["failed"] += 1
+                    continue
+                
+                progress["optimized"] += 1
+                if result.get("cached"):
+                    progress["cached"] += 1
+                
+                rows.append({
+                    "suggestion_id": item["suggestion_id"],
+                    "original_anchor": item["current_anchor"],
+                    "optimized_anchor": result["optimized_anchor"],
+                    "provider": result["provider"],
+                    "model": result["model"],
+                    "confidence_score": result["confidence_score"],
+                    "alternatives": result["alternatives"],
+                    "cache_key": result.get("cache_key"),
+                    "parameters": {
+                        "target_page_title": item["target_page_title"],
+                        "context": item["context"],
+                        "style": style,
+                        "max_length": max_length,
+                        "reasoning": result.get("reasoning"),
+                        "latency": result.get("latency", 0.0),
+                        "cached": result.get("cached", False),
+                        "bulk_task_id": task.request.id
+                    }
+                })
+            
+            # Écriture en base par lots, une transaction par lot
+            if len(rows) >= settings.ANCHOR_BULK_DB_BATCH_SIZE:
+                flush_rows()
+            
+            task.update_state(state="PROGRESS", meta=progress)
+        
+        async def worker():
+            # Chaque worker enchaîne les paquets sans attendre les autres
+            while True:
+                items = await packets.get()
+                if items is None:
+                    return
+                try:
+                    results = await ai_service.optimize_anchors_batch(
+                        items,
+                        provider=provider,
+                        style=style,
+                        max_length=max_length,
+                        db=db
+                    )
+                except Exception as e:
+                    print(f"Erreur d'optimisation d'un paquet d'ancres: {str(e)}")
+                    results = [{"error": str(e)} for _ in items]
+                record(items, results)
+        
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        
+        for chunk in suggestion_service.iter_suggestions(analysis_id, suggestion_filter, suggestions_per_prompt * concurrency):
+            items = [_suggestion_item(suggestion) for suggestion in chunk]
+            for start in range(0, len(items), suggestions_per_prompt):
+                await packets.put(items[start:start + suggestions_per_prompt])
+        
+        for _ in workers:
+            await packets.put(None)
+        await asyncio.gather(*workers)
+        
+        flush_rows()
+        return progress
+        
+    finally:
+        for worker_task in workers:
+            worker_task.cancel()
+        if ai_service is not None:
+            # Clients HTTP des providers liés à la boucle de la tâche
+            await ai_service.close()
+        db.close()
\ No newline at end of file
@@ -1,11 +1,21 @@
-from celery import current_task
+from celery import chain, chord, current_task, group
 from app.core.celery_app import celery_app
 from app.services.analysis_service import AnalysisService
+from app.services.artifact_store import ANALYSIS_STAGES, Artifact, ArtifactStore
+from app.services.html_store import HtmlBlobStore, HtmlBlobWriter, site_key
+from app.services.page_store import PAGE_CONTENT_COLUMNS, PAGE_FIELD_COLUMNS, PageReader, PageWriter
 from app.services.crawl_service import CrawlService
-from app.services.ai_service import AIService
+from app.services.ai_service import AIService, EMBEDDING_GRANULARITIES
+from app.services.embedding_store import EmbeddingStore
+from app.services.passages import PassageIndex
+from app.services.boilerplate import BoilerplateDetector
 from app.core.database import SessionLocal
-from typing import Dict, Any, List
+from app.core.config import settings
+from app.services.neighbor_index import NeighborIndex
+from app.services.partitioning import cluster_summary, save_clusters
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
 import asyncio
+import numpy as np
 from app.services.suggestion_service import SuggestionService
 
 @celery_app.task(bind=True)
@@ -16,148 +26,799 @@ def start_analysis_task(
     crawl_settings: Dict[str, Any] = None,
     ai_settings: Dict[str, Any] = None
 ):
-    """Tâche principale pour démarrer une analyse SEO"""
+    """Tâche principale pour démarrer une analyse SEO
+    
+    L'analyse est découpée en étapes (découverte du sitemap, crawl,
+    extraction, embeddings, similarité, suggestions, enregistrement) qui
+    échangent des artefacts versionnés (ArtifactStore) : chaque étape est
+    relancée seule en cas d'échec et peut tourner sur un autre worker.
+    """
+    state = {
+        "analysis_id": analysis_id,
+        "sitemap_url": sitemap_url,
+        "crawl_settings": crawl_settings or {},
+        "ai_settings": ai_settings or {},
+        "artifacts": {}
+    }
+    
+    db = SessionLocal()
+    try:
+        AnalysisService(db).start_analysis(analysis_id)
+    finally:
+        db.close()
+    
+    return _run_pipeline(state, "discover")
+
+@celery_app.task(bind=True)
+def reextract_analysis_task(self, analysis_id: str):
+    """Relancer une analyse à partir de l'extraction, sur le HTML déjà crawlé
+    
+    Les URLs et le HTML (artefact du crawl et HtmlBlobStore) de la dernière
+    exécution sont réutilisés sans aucune requête réseau : seules
+    l'extraction et les étapes suivantes tournent (nouvel extracteur,
+    nouvelles règles de gabarit).
+    """
+    db = SessionLocal()
     try:
-        # Initialiser les services
-        db = SessionLocal()
         analysis_service = AnalysisService(db)
+        analysis = analysis_service.get_analysis(analysis_id)
+        if not analysis:
+            return {
+                "status": "error",
+                "analysis_id": analysis_id,
+                "error": "Analyse non trouvée"
+            }
         
-        # Mettre à jour le statut
-        analysis_service.update_analysis(
-            analysis_id,
-            {"status": "processing", "started_at": "now"}
-        )
-        
-        # Lancer l'analyse asynchrone
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
+        store = ArtifactStore(analysis_id)
         try:
-            result = loop.run_until_complete(
-                _run_analysis_async(
-                    analysis_id,
-                    sitemap_url,
-                    crawl_settings,
-                    ai_settings
-                )
-            )
-            
-            # Marquer comme terminé
-            analysis_service.complete_analysis(
-                analysis_id,
-                statistics=result.get("statistics", {})
-            )
-            
+            artifacts = {stage: store.open(stage).reference for stage in ("discover", "crawl")}
+        except FileNotFoundError as e:
             return {
-                "status": "success",
+                "status": "error",
                 "analysis_id": analysis_id,
-                "statistics": result.get("statistics", {})
+                "error": str(e)
             }
-            
-        finally:
-            loop.close()
-            
-    except Exception as e:
-        # Marquer comme échoué
-        analysis_service.fail_analysis(analysis_id, str(e))
         
+        state = {
+            "analysis_id": analysis_id,
+            "sitemap_url": analysis.sitemap_url,
+            "crawl_settings": analysis.crawl_settings or {},
+            "ai_settings": analysis.ai_settings or {},
+            "artifacts": artifacts
+        }
+        analysis_service.start_analysis(analysis_id)
+    finally:
+        db.close()
+    
+    return _run_pipeline(state, "extract")
+
+def _run_pipeline(state: Dict[str, Any], first_stage: str) -> Dict[str, Any]:
+    """Exécuter les étapes de l'analyse à partir de `first_stage` (artefacts amont déjà dans l'état)"""
+    analysis_id = state["analysis_id"]
+    stages = ANALYSIS_STAGES[ANALYSIS_STAGES.index(first_stage):]
+    
+    if settings.ANALYSIS_STAGED_PIPELINE:
+        # Chaîne Celery : chaque étape reçoit l'état (références d'artefacts) de la précédente
+        tasks = [_STAGE_TASKS[stage].s() for stage in stages]
+        tasks[0] = _STAGE_TASKS[first_stage].s(state)
+        result = chain(*tasks).apply_async()
+        return {
+            "status": "queued",
+            "analysis_id": analysis_id,
+            "task_id": result.id
+        }
+    
+    # Toutes les étapes dans le processus courant (sans worker dédié)
+    try:
+        for stage in stages:
+            state = _STAGE_FUNCTIONS[stage](state)
+    except Exception as e:
+        _fail_analysis(analysis_id, e)
         return {
             "status": "error",
             "analysis_id": analysis_id,
             "error": str(e)
         }
+    
+    return {
+        "status": "success",
+        "analysis_id": analysis_id,
+        "statistics": state.get("statistics", {})
+    }
+
+def _run_stage(task, function: Callable[..., Dict[str, Any]], state: Dict[str, Any], *args) -> Dict[str, Any]:
+    """Exécuter une étape : nouvel essai différé en cas d'erreur transitoire, échec de l'analyse sinon"""
+    try:
+        return function(state, *args)
+    except ValueError as e:
+        # Paramètres invalides : un nouvel essai donnerait le même résultat
+        _fail_analysis(state["analysis_id"], e)
+        raise
+    except Exception as e:
+        if task.request.retries >= task.max_retries:
+            _fail_analysis(state["analysis_id"], e)
+            raise
+        raise task.retry(exc=e, countdown=settings.ANALYSIS_STAGE_RETRY_DELAY_SECONDS * 2 ** task.request.retries)
+
+def _fail_analysis(analysis_id: str, error: Exception):
+    """Marquer l'analyse comme échouée (les artefacts validés sont conservés)"""
+    print(f"Erreur lors de l'analyse {analysis_id}: {str(error)}")
+    db = SessionLocal()
+    try:
+        AnalysisService(db).fail_analysis(analysis_id, str(error))
     finally:
         db.close()
 
-async def _run_analysis_async(
-    analysis_id: str,
-    sitemap_url: str,
-    crawl_settings: Dict[str, Any] = None,
-    ai_settings: Dict[str, Any] = None
-) -> Dict[str, Any]:
-    """Exécuter l'analyse de manière asynchrone"""
+@celery_app.task(bind=True, max_retries=settings.ANALYSIS_STAGE_MAX_RETRIES)
+def discover_stage_task(self, state: Dict[str, Any]):
+    """Étape 1 : URLs du sitemap"""
+    return _run_stage(self, _discover_stage, state)
+
+@celery_app.task(bind=True, max_retries=settings.ANALYSIS_STAGE_MAX_RETRIES)
+def crawl_stage_task(self, state: Dict[str, Any]):
+    """Étape 2 : HTML des pages, réparti en plusieurs tâches parallèles si configuré"""
+    shards = _crawl_shards(state)
+    if shards <= 1:
+        return _run_stage(self, _crawl_stage, state)
     
-    # Initialiser les services
+    # Accord Celery : une tâche par tranche d'URLs, validation de l'artefact à la fin
+    pending = _run_stage(self, _begin_crawl, state)
+    raise self.replace(chord(
+        group(crawl_shard_task.s(pending, shard, shards) for shard in range(shards)),
+        crawl_commit_task.s(pending)
+    ))
+
+@celery_app.task(bind=True, max_retries=settings.ANALYSIS_STAGE_MAX_RETRIES)
+def crawl_shard_task(self, state: Dict[str, Any], shard: int, shards: int):
+    """Crawl d'une tranche d'URLs dans la version provisoire de l'artefact"""
+    return _run_stage(self, _crawl_shard, state, shard, shards)
+
+@celery_app.task(bind=True, max_retries=settings.ANALYSIS_STAGE_MAX_RETRIES)
+def crawl_commit_task(self, counts: List[int], state: Dict[str, Any]):
+    """Valider l'artefact du crawl une fois toutes les tranches écrites"""
+    return _run_stage(self, _commit_crawl, state, counts)
+
+@celery_app.task(bind=True, max_retries=settings.ANALYSIS_STAGE_MAX_RETRIES)
+def extract_stage_task(self, state: Dict[str, Any]):
+    """Étape 3 : titre, description et titres Hn"""
+    return _run_stage(self, _extract_stage, state)
+
+@celery_app.task(bind=True, max_retries=settings.ANALYSIS_STAGE_MAX_RETRIES)
+def embed_stage_task(self, state: Dict[str, Any]):
+    """Étape 4 : embeddings des pages (ou des passages)"""
+    return _run_stage(self, _embed_stage, state)
+
+@celery_app.task(bind=True, max_retries=settings.ANALYSIS_STAGE_MAX_RETRIES)
+def similarity_stage_task(self, state: Dict[str, Any]):
+    """Étape 5 : paires similaires retenues"""
+    return _run_stage(self, _similarity_stage, state)
+
+@celery_app.task(bind=True, max_retries=settings.ANALYSIS_STAGE_MAX_RETRIES)
+def suggestions_stage_task(self, state: Dict[str, Any]):
+    """Étape 6 : ancres, emplacements et suggestions"""
+    return _run_stage(self, _suggestions_stage, state)
+
+@celery_app.task(bind=True, max_retries=settings.ANALYSIS_STAGE_MAX_RETRIES)
+def persist_stage_task(self, state: Dict[str, Any]):
+    """Étape 7 : enregistrement des suggestions et fin de l'analyse"""
+    return _run_stage(self, _persist_stage, state)
+
+# Tâche Celery et fonction (exécution dans le processus courant) de chaque étape
+_STAGE_TASKS = {
+    "discover": discover_stage_task,
+    "crawl": crawl_stage_task,
+    "extract": extract_stage_task,
+    "embed": embed_stage_task,
+    "similarity": similarity_stage_task,
+    "suggestions": suggestions_stage_task,
+    "persist": persist_stage_task
+}
+
+def _run_async(coroutine):
+    """Exécuter une coroutine dans une boucle propre à l'étape"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+def _write_artifact(
+    store: ArtifactStore,
+    state: Dict[str, Any],
+    stage: str,
+    write: Callable[[Artifact], Dict[str, Any]]
+) -> Artifact:
+    """Écrire puis valider une nouvelle version de l'artefact d'une étape"""
+    artifact = store.create(stage)
+    try:
+        meta = write(artifact)
+    except Exception:
+        store.discard(artifact)
+        raise
+    return store.commit(artifact, inputs=_inputs(state), **meta)
+
+def _inputs(state: Dict[str, Any]) -> Dict[str, int]:
+    """Versions des artefacts amont transmises dans l'état (inscrites au manifeste)"""
+    return {stage: reference["version"] for stage, reference in state["artifacts"].items()}
+
+def _advance(state: Dict[str, Any], artifact: Artifact, **updates) -> Dict[str, Any]:
+    """État transmis à l'étape suivante : référence de l'artefact validé"""
+    return {
+        **state,
+        **updates,
+        "artifacts": {**state["artifacts"], artifact.stage: artifact.reference}
+    }
+
+def _open_artifact(store: ArtifactStore, state: Dict[str, Any], stage: str) -> Artifact:
+    """Version de l'artefact d'une étape précédente transmise dans l'état"""
+    return store.open(stage, state["artifacts"][stage]["version"])
+
+def _embeddings(embedded: Artifact) -> Optional[EmbeddingStore]:
+    """Embeddings des pages d'une version de l'artefact des embeddings (None en mode lexical)"""
+    if not embedded.meta.get("embeddings"):
+        return None
+    return EmbeddingStore.open("embeddings", base_dir=embedded.directory)
+
+def _passages(embedded: Artifact) -> Optional[PassageIndex]:
+    """Index des passages d'une version de l'artefact des embeddings (granularité passage)"""
+    if not embedded.meta.get("passages"):
+        return None
+    return PassageIndex.open("embeddings", base_dir=embedded.directory)
+
+def _update_progress(analysis_id: str, progress: int, **counts):
+    """Progression de l'analyse (session courte, une par étape)"""
     db = SessionLocal()
-    analysis_service = AnalysisService(db)
-    ai_service = AIService()
+    try:
+        AnalysisService(db).update_analysis_progress(analysis_id, progress=progress, **counts)
+    finally:
+        db.close()
+
+def _crawled_pages(store: ArtifactStore, state: Dict[str, Any]) -> PageReader:
+    """Pages crawlées, dans l'ordre des URLs du sitemap (HTML dans le fichier ou le HtmlBlobStore)"""
+    artifact = _open_artifact(store, state, "crawl")
+    return PageReader([artifact.path(f"pages-{part:04d}.parquet") for part in range(artifact.meta.get("parts", 1))])
+
+def _pages(store: ArtifactStore, state: Dict[str, Any]) -> PageReader:
+    """Pages extraites, lues par colonnes selon les besoins de l'étape"""
+    return PageReader([_open_artifact(store, state, "extract").path("pages.parquet")], blobs=HtmlBlobStore())
+
+def _discover_stage(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Détecter le sitemap et enregistrer ses URLs filtrées"""
+    store = ArtifactStore(state["analysis_id"])
     
+    def write(artifact: Artifact) -> Dict[str, Any]:
+        async def discover() -> List[str]:
+            async with CrawlService() as crawl_service:
+                return await crawl_service.crawl_sitemap(
+                    state["sitemap_url"],
+                    state["analysis_id"],
+                    state["crawl_settings"]
+                )
+        
+        urls = _run_async(discover())
+        max_urls = state["crawl_settings"].get("max_urls", 1000000)
+        return {"urls": artifact.write_lines("urls.txt", urls[:max_urls])}
+    
+    artifact = _write_artifact(store, state, "discover", write)
+    _update_progress(state["analysis_id"], 10, crawled_urls=0, failed_urls=0)
+    return _advance(state, artifact)
+
+def _crawl_shards(state: Dict[str, Any]) -> int:
+    """Nombre de tâches de crawl parallèles (au moins `ANALYSIS_CRAWL_SHARD_SIZE` URLs chacune)"""
+    urls = state["artifacts"]["discover"]["urls"]
+    shard_size = max(1, settings.ANALYSIS_CRAWL_SHARD_SIZE)
+    return max(1, min(settings.ANALYSIS_CRAWL_MAX_SHARDS, -(-urls // shard_size)))
+
+def _crawl_stage(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Crawler toutes les URLs dans la tâche courante"""
+    store = ArtifactStore(state["analysis_id"])
+    pending = _begin_crawl(state)
     try:
-        # Étape 1: Crawler le sitemap
-        async with CrawlService() as crawl_service:
-            urls = await crawl_service.crawl_sitemap(
-                sitemap_url,
-                analysis_id,
-                crawl_settings
+        counts = [_crawl_shard(pending, 0, 1)]
+    except Exception:
+        store.discard(store.pending("crawl", pending["crawl_pending"]))
+        raise
+    return _commit_crawl(pending, counts)
+
+def _begin_crawl(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Ouvrir la version provisoire de l'artefact du crawl (partagée par les tranches)"""
+    artifact = ArtifactStore(state["analysis_id"]).create("crawl")
+    return {**state, "crawl_pending": artifact.meta["pending"]}
+
+def _crawl_shard(state: Dict[str, Any], shard: int, shards: int) -> int:
+    """Crawler une tranche contiguë des URLs (ordre du sitemap conservé)"""
+    store = ArtifactStore(state["analysis_id"])
+    urls = _open_artifact(store, state, "discover").read_lines("urls.txt")
+    shard_size = -(-len(urls) // shards) if urls else 0
+    urls = urls[shard * shard_size:(shard + 1) * shard_size]
+    
+    artifact = store.pending("crawl", state["crawl_pending"])
+    
+    async def crawl(blob_writer: Optional[HtmlBlobWriter]) -> int:
+        # Groupes de lignes écrits pendant le crawl : mémoire bornée quelle que soit la taille du site
+        with PageWriter(artifact.path(f"pages-{shard:04d}.parquet")) as writer:
+            async with CrawlService() as crawl_service:
+                async for page in crawl_service.iter_pages(
+                    urls,
+                    state["analysis_id"],
+                    state["crawl_settings"],
+                    extract=False
+                ):
+                    if blob_writer is not None:
+                        # HTML compressé par le thread d'écriture, seule l'empreinte reste dans la page
+                        blob_writer.put(page["content_hash"], page["content"])
+                        page = {**page, "content": None}
+                    writer.write(page)
+        return writer.count
+    
+    if not settings.HTML_STORE_ENABLED:
+        return _run_async(crawl(None))
+    
+    # Blobs tous écrits (file vidée) avant que la tranche ne soit déclarée terminée
+    with HtmlBlobStore().writer(site_key(state["sitemap_url"])) as blob_writer:
+        return _run_async(crawl(blob_writer))
+
+def _commit_crawl(state: Dict[str, Any], counts: List[int]) -> Dict[str, Any]:
+    """Valider l'artefact du crawl"""
+    store = ArtifactStore(state["analysis_id"])
+    artifact = store.commit(
+        store.pending("crawl", state["crawl_pending"]),
+        inputs=_inputs(state),
+        pages=sum(counts),
+        parts=len(counts)
+    )
+    state = {key: value for key, value in state.items() if key != "crawl_pending"}
+    urls = state["artifacts"]["discover"]["urls"]
+    _update_progress(state["analysis_id"], 50, crawled_urls=sum(counts), failed_urls=urls - sum(counts))
+    return _advance(state, artifact)
+
+def _extract_stage(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Extraire les champs des pages (titre, description, titres, texte, liens sortants)"""
+    store = ArtifactStore(state["analysis_id"])
+    
+    def write(artifact: Artifact) -> Dict[str, Any]:
+        with PageWriter(artifact.path("pages.parquet")) as writer:
+            writer.write_all(_extract_pages(_crawled_pages(store, state).iter_pages(), HtmlBlobStore()))
+        return {"pages": writer.count}
+    
+    artifact = _write_artifact(store, state, "extract", write)
+    _update_progress(state["analysis_id"], 55)
+    return _advance(state, artifact)
+
+def _extract_pages(pages: Iterable[Dict[str, Any]], blobs: HtmlBlobStore) -> Iterator[Dict[str, Any]]:
+    """Pages extraites une par une, le HTML stocké à part étant relu depuis les blobs"""
+    crawl_service = CrawlService()
+    for page in pages:
+        if page["content"] is not None or not page["content_hash"]:
+            # HTML conservé dans le fichier (HTML_STORE_ENABLED désactivé lors du crawl)
+            yield crawl_service.extract_page(page)
+            continue
+        extracted = crawl_service.extract_page({**page, "content": blobs.get(page["content_hash"])})
+        yield {**extracted, "content": None}
+
+def _embed_stage(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Vectoriser les pages (ou leurs passages) après retrait du gabarit du site
+    
+    Les vecteurs (EmbeddingStore, et PassageIndex par passage) sont écrits
+    dans l'artefact avec le gabarit et les statistiques : les étapes aval,
+    les partitions et les benchmarks les ouvrent par version.
+    """
+    analysis_id = state["analysis_id"]
+    ai_settings = state["ai_settings"]
+    store = ArtifactStore(analysis_id)
+    
+    granularity = ai_settings.get("embedding_granularity", "page")
+    if granularity not in EMBEDDING_GRANULARITIES:
+        raise ValueError(f"Granularité des embeddings non supportée: {granularity}")
+    
+    def write(artifact: Artifact) -> Dict[str, Any]:
+        meta = {"granularity": granularity, "embeddings": 0, "passages": None, "boilerplate": None}
+        if ai_settings.get("retrieval_mode", "embedding") == "lexical":
+            # Embeddings inutiles en mode lexical seul
+            return meta
+        
+        # Deux passes en flux (gabarit puis embeddings) sur les seules colonnes utiles
+        pages = _pages(store, state)
+        db = SessionLocal()
+        analysis = AnalysisService(db).get_analysis(analysis_id)
+        # Tenant du service d'embeddings partagé : l'utilisateur propriétaire de l'analyse
+        ai_service = AIService(
+            db=db,
+            ai_settings=ai_settings,
+            tenant=analysis.user_id if analysis else None
+        )
+        
+        async def embed():
+            try:
+                options = dict(
+                    provider=ai_settings.get("embedding_provider"),
+                    batch_size=ai_settings.get("embedding_batch_size"),
+                    num_threads=ai_settings.get("embedding_threads"),
+                    store=EmbeddingStore(
+                        "embeddings",
+                        dtype=ai_settings.get("embedding_storage_dtype", "float32"),
+                        base_dir=artifact.directory
+                    )
+                )
+                model = ai_settings.get("embedding_model", "text-embedding-3-large")
+                if granularity == "passage":
+                    # Passages vectorisés et indexés ; vecteurs de pages agrégés
+                    passages = PassageIndex(
+                        "embeddings",
+                        dtype=ai_settings.get("embedding_storage_dtype", "float32"),
+                        base_dir=artifact.directory
+                    )
+                    embeddings = await ai_service.generate_passage_embeddings(
+                        pages.iter_pages(PAGE_CONTENT_COLUMNS), model, passages=passages, **options
+                    )
+                    return embeddings, len(passages)
+                return await ai_service.generate_embeddings(pages.iter_pages(PAGE_CONTENT_COLUMNS), model, **options), None
+            finally:
+                await ai_service.close()
+        
+        try:
+            # Gabarit du site (menus, bandeaux) détecté en une passe et retiré du texte vectorisé
+            ai_service.fit_boilerplate(pages.iter_pages(["content"]))
+            embeddings, passages = _run_async(embed())
+        finally:
+            db.close()
+        
+        meta["embeddings"] = len(embeddings.urls)
+        meta["embedding_storage_bytes"] = embeddings.nbytes()
+        meta["passages"] = passages
+        if ai_service.boilerplate is not None:
+            np.save(artifact.path("boilerplate.npy"), ai_service.boilerplate.hashes())
+            meta["boilerplate"] = dict(ai_service.boilerplate.stats)
+        return meta
+    
+    artifact = _write_artifact(store, state, "embed", write)
+    _update_progress(analysis_id, 70)
+    return _advance(state, artifact)
+
+def _stage_ai_service(db, store: ArtifactStore, state: Dict[str, Any]) -> AIService:
+    """Service IA des étapes aval, avec le gabarit figé de l'étape des embeddings"""
+    ai_service = AIService(db=db, ai_settings=state["ai_settings"])
+    embedded = _open_artifact(store, state, "embed")
+    if embedded.meta.get("boilerplate") is not None:
+        ai_service.boilerplate = BoilerplateDetector.from_hashes(np.load(embedded.path("boilerplate.npy")).tolist())
+    return ai_service
+
+def _similarity_stage(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Calculer les paires similaires retenues (et l'index de voisinage du site)"""
+    analysis_id = state["analysis_id"]
+    ai_settings = state["ai_settings"]
+    store = ArtifactStore(analysis_id)
+    embedded = _open_artifact(store, state, "embed")
+    
+    def write(artifact: Artifact) -> Dict[str, Any]:
+        # Champs seuls en mémoire ; le HTML n'est relu, en flux, que pour le texte
+        # lexical ou le rescoring par cross-encoder (par lot de paires)
+        needs_content = (
+            ai_settings.get("retrieval_mode", "embedding") != "embedding"
+            or bool(ai_settings.get("cross_encoder_model"))
+        )
+        reader = _pages(store, state)
+        pages = reader.read(PAGE_FIELD_COLUMNS)
+        load_pages = (lambda urls: reader.iter_pages(PAGE_CONTENT_COLUMNS, urls=urls)) if needs_content else None
+        embeddings = _embeddings(embedded)
+        passages = _passages(embedded)
+        
+        db = SessionLocal()
+        try:
+            ai_service = _stage_ai_service(db, store, state)
+            ordered_pages, rows, cols, scores, hints = ai_service.similarity_pairs(
+                pages, embeddings, ai_settings, passages, load_pages=load_pages
             )
             
-            # Mettre à jour la progression
-            analysis_service.update_analysis_progress(
-                analysis_id,
-                progress=10,
-                crawled_urls=0,
-                failed_urls=0
-            )
+            # Partitions k-means (moteur partitionné) conservées avec les paires
+            partitions = ai_service.partitions
+            if partitions is not None and embeddings is not None:
+                save_clusters(artifact.path("clusters.npz"), partitions["labels"], partitions["centroids"])
             
-            # Étape 2: Crawler les pages
-            crawled_pages = await crawl_service.crawl_pages(
-                urls,
-                analysis_id,
-                crawl_settings
+            # Index de voisinage du site pour les mises à jour incrémentales
+            if embeddings is not None and ai_settings.get("incremental_index", True):
+                _build_neighbor_index(
+                    AnalysisService(db).get_analysis(analysis_id),
+                    pages,
+                    embeddings,
+                    ai_settings,
+                    partitions,
+                    ai_service.boilerplate
+                )
+        finally:
+            db.close()
+        
+        artifact.write_lines("pages.txt", (page["url"] for page in ordered_pages))
+        np.savez(artifact.path("pairs.npz"), rows=rows, cols=cols, scores=scores)
+        if hints is not None:
+            artifact.write_jsonl("passage_hints.jsonl", hints)
+        return {
+            "pairs": int(np.asarray(rows).size),
+            "passage_hints": hints is not None,
+            "clusters": cluster_summary(partitions["labels"]) if partitions is not None else None
+        }
+    
+    artifact = _write_artifact(store, state, "similarity", write)
+    _update_progress(analysis_id, 80)
+    return _advance(state, artifact)
+
+def _suggestions_stage(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Construire les suggestions (ancres, emplacements) des paires retenues"""
+    analysis_id = state["analysis_id"]
+    store = ArtifactStore(analysis_id)
+    similar = _open_artifact(store, state, "similarity")
+    
+    def write(artifact: Artifact) -> Dict[str, Any]:
+        urls = similar.read_lines("pages.txt")
+        with np.load(similar.path("pairs.npz")) as pairs:
+            rows, cols, scores = pairs["rows"], pairs["cols"], pairs["scores"]
+        
+        # Seules les pages d'au moins une paire sont lues : champs en mémoire, contenu relu en flux
+        reader = _pages(store, state)
+        involved = [urls[position] for position in np.union1d(rows, cols).tolist()]
+        pages = reader.read(PAGE_FIELD_COLUMNS, urls=set(involved))
+        
+        # Indices des paires ramenés aux pages lues (ordre du stockage, pages absentes en fin de liste)
+        positions: Dict[str, int] = {}
+        for position, page in enumerate(pages):
+            positions.setdefault(page["url"], position)
+        for url in involved:
+            if url not in positions:
+                positions[url] = len(pages)
+                pages.append({"url": url})
+        remap = np.array([positions.get(url, -1) for url in urls], dtype=np.int64)
+        rows, cols = remap[rows], remap[cols]
+        hints = list(similar.read_jsonl("passage_hints.jsonl")) if similar.meta.get("passage_hints") else None
+        
+        db = SessionLocal()
+        try:
+            suggestions = _stage_ai_service(db, store, state).build_suggestions(
+                pages,
+                rows,
+                cols,
+                scores,
+                state["ai_settings"],
+                analysis_id=analysis_id,
+                passage_hints=hints,
+                load_pages=lambda urls: reader.iter_pages(PAGE_CONTENT_COLUMNS, urls=urls),
+                # Statistiques des phrases-clés sur tout le site (champs seuls, en flux)
+                corpus_pages=reader.iter_pages(PAGE_FIELD_COLUMNS),
+                corpus_size=len(reader)
             )
-            
-            # Mettre à jour la progression
-            analysis_service.update_analysis_progress(
+        finally:
+            db.close()
+        return {"suggestions": artifact.write_jsonl("suggestions.jsonl", (suggestion.dict() for suggestion in suggestions))}
+    
+    artifact = _write_artifact(store, state, "suggestions", write)
+    _update_progress(analysis_id, 90)
+    return _advance(state, artifact)
+
+def _persist_stage(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Enregistrer les suggestions par lots et terminer l'analyse"""
+    from app.schemas.suggestion import SuggestionCreate
+    
+    analysis_id = state["analysis_id"]
+    ai_settings = state["ai_settings"]
+    store = ArtifactStore(analysis_id)
+    artifacts = state["artifacts"]
+    
+    def write(artifact: Artifact) -> Dict[str, Any]:
+        db = SessionLocal()
+        try:
+            suggestion_service = SuggestionService(db)
+            # Un nouvel essai repart de zéro : pas de doublons des lots déjà validés
+            suggestion_service.delete_analysis_suggestions(analysis_id)
+            count = suggestion_service.bulk_create_suggestions(
+                (
+                    SuggestionCreate(**record)
+                    for record in _open_artifact(store, state, "suggestions").read_jsonl("suggestions.jsonl")
+                ),
+                analysis_id=analysis_id,
+                batch_size=settings.SUGGESTION_DB_BATCH_SIZE,
+                use_copy=settings.SUGGESTION_DB_USE_COPY
+            )
+        finally:
+            db.close()
+        return {"suggestions": count}
+    
+    artifact = _write_artifact(store, state, "persist", write)
+    
+    # Calculer les statistiques
+    urls = artifacts["discover"]["urls"]
+    embedded = artifacts["embed"]
+    statistics = {
+        "total_pages": artifacts["crawl"]["pages"],
+        "total_suggestions": artifact.meta["suggestions"],
+        "success_rate": artifacts["crawl"]["pages"] / urls if urls else 0,
+        "embedding_storage_bytes": embedded.get("embedding_storage_bytes", 0),
+        "embedding_granularity": embedded["granularity"],
+        "retrieval_mode": ai_settings.get("retrieval_mode", "embedding"),
+        "artifacts": {stage: reference["version"] for stage, reference in artifacts.items()},
+        "processing_time": "completed"
+    }
+    if artifacts["similarity"].get("clusters") is not None:
+        statistics["clusters"] = artifacts["similarity"]["clusters"]
+    if embedded.get("boilerplate") is not None:
+        statistics["boilerplate"] = embedded["boilerplate"]
+    if embedded.get("passages") is not None:
+        statistics["passages"] = embedded["passages"]
+    
+    db = SessionLocal()
+    try:
+        AnalysisService(db).complete_analysis(analysis_id, statistics=statistics)
+    finally:
+        db.close()
+    return _advance(state, artifact, statistics=statistics)
+
+_STAGE_FUNCTIONS = {
+    "discover": _discover_stage,
+    "crawl": _crawl_stage,
+    "extract": _extract_stage,
+    "embed": _embed_stage,
+    "similarity": _similarity_stage,
+    "suggestions": _suggestions_stage,
+    "persist": _persist_stage
+}
+
+def _build_neighbor_index(
+    analysis,
+    pages: List[Dict[str, Any]],
+    embeddings: EmbeddingStore,
+    ai_settings: Dict[str, Any],
+    partitions: Dict[str, Any] = None,
+    boilerplate: BoilerplateDetector = None
+):
+    """Construire l'index de voisinage du site à partir des embeddings de l'analyse"""
+    try:
+        site_key = NeighborIndex.key_for(analysis.user_id, analysis.sitemap_url)
+        index = NeighborIndex(
+            site_key,
+            k=ai_settings.get("similarity_top_k", 20),
+            embedding_model=ai_settings.get("embedding_model", "text-embedding-3-large")
+        )
+        pages_by_url = {page["url"]: page for page in pages}
+        with index.lock():
+            index.build(
+                [pages_by_url[url] for url in embeddings.urls],
+                embeddings.matrix(),
+                ai_settings,
+                centroids=partitions["centroids"] if partitions is not None else None,
+                boilerplate=boilerplate.hashes() if boilerplate is not None else None
+            )
+    except Exception as e:
+        # L'analyse complète reste valable sans index incrémental
+        print(f"Erreur lors de la construction de l'index de voisinage: {str(e)}")
+
+@celery_app.task(bind=True)
+def update_analysis_pages_task(
+    self,
+    analysis_id: str,
+    upsert_urls: List[str] = None,
+    delete_urls: List[str] = None
+):
+    """Mettre à jour quelques pages d'une analyse terminée sans la relancer"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    
+    try:
+        result = loop.run_until_complete(
+            _update_pages_async(
                 analysis_id,
-                progress=50,
-                crawled_urls=len(crawled_pages),
-                failed_urls=len(urls) - len(crawled_pages)
+                upsert_urls or [],
+                delete_urls or []
             )
-        
-        # Étape 3: Générer les embeddings
-        embeddings = await ai_service.generate_embeddings(
-            crawled_pages,
-            ai_settings.get("embedding_model", "text-embedding-3-large")
         )
         
-        # Mettre à jour la progression
-        analysis_service.update_analysis_progress(
-            analysis_id,
-            progress=70
-        )
+        return {
+            "status": "success",
+            "analysis_id": analysis_id,
+            **result
+        }
         
-        # Étape 4: Analyser les similarités et générer les suggestions
-        suggestions = await ai_service.analyze_similarities(
-            crawled_pages,
-            embeddings,
-            ai_settings
-        )
+    except Exception as e:
+        return {
+            "status": "error",
+            "analysis_id": analysis_id,
+            "error": str(e)
+        }
+    finally:
+        loop.close()
+
+async def _update_pages_async(
+    analysis_id: str,
+    upsert_urls: List[str],
+    delete_urls: List[str]
+) -> Dict[str, Any]:
+    """Recrawler les pages ajoutées ou modifiées, mettre à jour l'index et les suggestions"""
+    db = SessionLocal()
+    ai_service = None
+    
+    try:
+        analysis = AnalysisService(db).get_analysis(analysis_id)
+        if not analysis:
+            raise ValueError("Analyse non trouvée")
         
-        # Étape 5: Sauvegarder les suggestions
-        suggestion_service = SuggestionService(db)
-        for suggestion_data in suggestions:
-            suggestion_service.create_suggestion(suggestion_data)
+        ai_settings = analysis.ai_settings or {}
+        model = ai_settings.get("embedding_model", "text-embedding-3-large")
+        threshold = ai_settings.get("similarity_threshold", 0.7)
+        site_key = NeighborIndex.key_for(analysis.user_id, analysis.sitemap_url)
+        ai_service = AIService(db=db, ai_settings=ai_settings, tenant=analysis.user_id)
         
-        # Mettre à jour la progression finale
-        analysis_service.update_analysis_progress(
-            analysis_id,
-            progress=100
-        )
+        # Gabarit de l'analyse complète : le texte des pages est préparé à l'identique
+        boilerplate = NeighborIndex.load_boilerplate(site_key)
+        if boilerplate is not None:
+            ai_service.boilerplate = BoilerplateDetector.from_hashes(boilerplate)
         
-        # Calculer les statistiques
-        statistics = {
-            "total_pages": len(crawled_pages),
-            "total_suggestions": len(suggestions),
-            "success_rate": len(crawled_pages) / len(urls) if urls else 0,
-            "processing_time": "completed"
-        }
+        # Crawl et embeddings des seules pages ajoutées ou modifiées
+        crawled_pages = []
+        embeddings = []
+        if upsert_urls:
+            async with CrawlService() as crawl_service:
+                crawled_pages = await crawl_service.crawl_pages(
+                    upsert_urls,
+                    analysis_id,
+                    analysis.crawl_settings
+                )
+        if crawled_pages:
+            # Même granularité que l'analyse complète : vecteurs de pages comparables
+            if ai_settings.get("embedding_granularity", "page") == "passage":
+                generate = ai_service.generate_passage_embeddings
+            else:
+                generate = ai_service.generate_embeddings
+            embeddings = await generate(
+                crawled_pages,
+                model,
+                provider=ai_settings.get("embedding_provider"),
+                batch_size=ai_settings.get("embedding_batch_size"),
+                num_threads=ai_settings.get("embedding_threads")
+            )
+        vectors = {embedding["url"]: embedding["embedding"] for embedding in embeddings}
+        embedded_pages = [page for page in crawled_pages if page["url"] in vectors]
+        
+        with NeighborIndex(site_key).lock():
+            index = NeighborIndex.open(site_key)
+            if index is None:
+                raise ValueError("Index de voisinage absent : relancer une analyse complète du site")
+            if index.embedding_model and index.embedding_model != model:
+                raise ValueError(
+                    f"Index construit avec {index.embedding_model}, analyse configurée avec {model}"
+                )
+            
+            change_sets = [index.delete(delete_urls, threshold=threshold)]
+            if embedded_pages:
+                change_sets.append(index.upsert(
+                    embedded_pages,
+                    np.array([vectors[page["url"]] for page in embedded_pages], dtype=np.float32),
+                    threshold=threshold
+                ))
+        
+        # Appliquer les changements dans l'ordre : retraits puis nouvelles suggestions
+        suggestion_service = SuggestionService(db)
+        removed = added = 0
+        for changes in change_sets:
+            removed += suggestion_service.delete_pairs(analysis_id, changes["removed"])
+            added += suggestion_service.bulk_create_suggestions(
+                ai_service.build_incremental_suggestions(
+                    changes, crawled_pages, index, ai_settings, analysis_id=analysis_id
+                ),
+                analysis_id=analysis_id,
+                batch_size=settings.SUGGESTION_DB_BATCH_SIZE,
+                use_copy=settings.SUGGESTION_DB_USE_COPY
+            )
         
         return {
-            "statistics": statistics,
-            "suggestions_count": len(suggestions)
+            "upserted_pages": len(embedded_pages),
+            "deleted_pages": sum(changes["deleted_pages"] for changes in change_sets),
+            "failed_urls": len(upsert_urls) - len(embedded_pages),
+            "affected_pages": sum(changes["affected_pages"] for changes in change_sets),
+            "suggestions_added": added,
+            "suggestions_removed": removed
         }
         
     finally:
+        if ai_service is not None:
+            await ai_service.close()
         db.close()
 
 @celery_app.task
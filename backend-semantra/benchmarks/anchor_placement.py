@@ -0,0 +1,68 @@
+"""Benchmark du placement des ancres (Aho-Corasick) sur un site synthétique
+
+Chaque page source reçoit `--targets` suggestions de `--candidates` ancres
+candidates, dont une partie figure réellement dans son texte. Rapporte le
+débit (pages et caractères par seconde) et la part de suggestions placées.
+
+Usage : python -m benchmarks.anchor_placement --pages 100000
+"""
+import argparse
+import numpy as np
+
+from app.services.anchor_placement import AnchorPlacer
+from benchmarks.common import timer
+
+def make_site(pages: int, words_per_page: int, vocabulary: int, seed: int = 0):
+    """Textes de pages synthétiques (mots tirés selon une loi de Zipf)"""
+    rng = np.random.default_rng(seed)
+    words = np.array([f"mot{i}" for i in range(vocabulary)], dtype=object)
+    ids = np.minimum(rng.zipf(1.3, size=(pages, words_per_page)) - 1, vocabulary - 1)
+    return [" ".join(words[row]) for row in ids], words, rng
+
+def make_candidates(texts, words, rng, targets: int, candidates: int, hit_rate: float):
+    """Ancres candidates par paire : n-grammes du texte source ou mots aléatoires"""
+    sources = np.repeat(np.arange(len(texts)), targets)
+    anchor_lists = []
+    for source in sources.tolist():
+        tokens = texts[source].split(" ")
+        anchors = []
+        for _ in range(candidates):
+            size = int(rng.integers(1, 4))
+            if rng.random() < hit_rate and len(tokens) > size:
+                start = int(rng.integers(0, len(tokens) - size))
+                anchors.append(" ".join(tokens[start:start + size]))
+            else:
+                anchors.append(" ".join(rng.choice(words, size=size)))
+        anchor_lists.append(anchors)
+    return sources, anchor_lists
+
+def run(pages: int, words_per_page: int, vocabulary: int, targets: int, candidates: int, hit_rate: float):
+    timings = {}
+    with timer(timings, "generation"):
+        texts, words, rng = make_site(pages, words_per_page, vocabulary)
+        sources, anchor_lists = make_candidates(texts, words, rng, targets, candidates, hit_rate)
+
+    placer = AnchorPlacer()
+    with timer(timings, "placement"):
+        placements = placer.place_all(sources, anchor_lists, lambda source: texts[source])
+
+    characters = placer.stats["characters"]
+    placed = sum(placement is not None for placement in placements)
+    print(
+        f"{pages} pages, {words_per_page} mots/page, {targets} cibles x {candidates} ancres par page "
+        f"(données générées en {timings['generation']:.1f}s)"
+    )
+    print(f"placement      : {timings['placement']:.2f}s")
+    print(f"débit          : {pages / timings['placement']:,.0f} pages/s, {characters / timings['placement'] / 1e6:.1f} M caractères/s")
+    print(f"paires placées : {placed}/{len(placements)} ({placed / max(len(placements), 1):.1%})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=100000)
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--targets", type=int, default=10)
+    parser.add_argument("--candidates", type=int, default=5)
+    parser.add_argument("--hit-rate", type=float, default=0.3)
+    args = parser.parse_args()
+    run(args.pages, args.words_per_page, args.vocabulary, args.targets, args.candidates, args.hit_rate)
@@ -0,0 +1,63 @@
+"""Benchmark rappel / latence des index FAISS face au calcul exact
+
+Usage : python -m benchmarks.ann_recall --pages 20000 --dimensions 768
+"""
+import argparse
+import numpy as np
+
+from app.services.vector_index import build_faiss_index, search_faiss_index, neighbors_to_pairs
+from benchmarks.common import load_or_generate_embeddings, exact_top_k, recall_at_k, pair_set, timer
+
+def run(analysis_id: str, pages: int, dimensions: int, k: int, threshold: float):
+    vectors = load_or_generate_embeddings(analysis_id, pages, dimensions)
+    pages, dimensions = vectors.shape
+
+    timings = {}
+    with timer(timings, "exact"):
+        exact_scores, exact_ids = exact_top_k(vectors, k)
+    exact_pairs = pair_set(*neighbors_to_pairs(exact_scores, exact_ids, threshold)[:2])
+
+    print(f"{pages} pages, {dimensions} dimensions, k={k}, seuil={threshold}")
+    print(f"exact (force brute)        : {timings['exact']:.2f}s, {len(exact_pairs)} paires")
+    print(f"{'configuration':<27}{'build':>8}{'search':>9}{'recall@k':>10}{'paires':>9}")
+
+    configurations = [
+        ("flat", {}),
+        ("ivf", {"nprobe": 4}),
+        ("ivf", {"nprobe": 16}),
+        ("ivf", {"nprobe": 64}),
+        ("hnsw", {"ef_search": 32}),
+        ("hnsw", {"ef_search": 64}),
+        ("hnsw", {"ef_search": 128}),
+    ]
+
+    for index_type, search_params in configurations:
+        with timer(timings, "build"):
+            index = build_faiss_index(vectors, index_type=index_type)
+        with timer(timings, "search"):
+            scores, ids = search_faiss_index(index, vectors, k + 1, **search_params)
+
+        # Retirer la page elle-même des résultats
+        keep = ids != np.arange(pages)[:, None]
+        trimmed_ids = np.array([row[mask][:k] for row, mask in zip(ids, keep)])
+        trimmed_scores = np.array([row[mask][:k] for row, mask in zip(scores, keep)])
+
+        recall = recall_at_k(trimmed_ids, exact_ids)
+        approx_pairs = pair_set(*neighbors_to_pairs(trimmed_scores, trimmed_ids, threshold)[:2])
+        pair_recall = len(approx_pairs & exact_pairs) / len(exact_pairs) if exact_pairs else 1.0
+
+        label = f"{index_type} {search_params}" if search_params else index_type
+        print(
+            f"{label:<27}{timings['build']:>7.2f}s{timings['search']:>8.2f}s"
+            f"{recall:>10.3f}{pair_recall:>9.3f}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--analysis-id", help="Utiliser les embeddings stockés d'une analyse")
+    parser.add_argument("--pages", type=int, default=20000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--threshold", type=float, default=0.7)
+    args = parser.parse_args()
+    run(args.analysis_id, args.pages, args.dimensions, args.k, args.threshold)
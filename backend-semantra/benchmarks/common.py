@@ -0,0 +1,80 @@
+"""Outils partagés par les benchmarks (données synthétiques, référence exacte)"""
+import time
+from contextlib import contextmanager
+from typing import Tuple
+import numpy as np
+
+from app.services.vector_index import normalize_embeddings
+
+def make_clustered_embeddings(
+    n: int,
+    dimensions: int,
+    n_clusters: int = 50,
+    noise: float = 0.6,
+    seed: int = 0
+) -> np.ndarray:
+    """Générer des embeddings normalisés regroupés en thématiques"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dimensions)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, size=n)
+    vectors = centers[labels] + noise * rng.standard_normal((n, dimensions)).astype(np.float32)
+    return normalize_embeddings(vectors)
+
+def load_or_generate_embeddings(
+    analysis_id: str = None,
+    pages: int = 20000,
+    dimensions: int = 768
+) -> np.ndarray:
+    """Charger les embeddings réels d'une analyse, sinon générer des données synthétiques
+
+    Les données synthétiques n'ont pas la structure des vrais embeddings
+    (ex. dimensions ordonnées des modèles text-embedding-3) : pour décider d'un
+    compromis client, relancer avec --analysis-id.
+    """
+    if analysis_id:
+        from app.services.artifact_store import ArtifactStore
+        from app.services.embedding_store import EmbeddingStore
+
+        # Embeddings de la dernière version validée de l'étape embed
+        embedded = ArtifactStore(analysis_id).open("embed")
+        store = EmbeddingStore.open("embeddings", base_dir=embedded.directory)
+        return np.ascontiguousarray(store.matrix()[:pages], dtype=np.float32)
+
+    return make_clustered_embeddings(pages, dimensions)
+
+def exact_top_k(vectors: np.ndarray, k: int, block_size: int = 2048) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k exact (hors page elle-même) par force brute, par blocs"""
+    n = vectors.shape[0]
+    ids = np.empty((n, k), dtype=np.int64)
+    scores = np.empty((n, k), dtype=np.float32)
+
+    for start in range(0, n, block_size):
+        end = min(start + block_size, n)
+        block = vectors[start:end] @ vectors.T
+        block[np.arange(end - start), np.arange(start, end)] = -np.inf
+        part = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        part_scores = np.take_along_axis(block, part, axis=1)
+        order = np.argsort(-part_scores, axis=1)
+        ids[start:end] = np.take_along_axis(part, order, axis=1)
+        scores[start:end] = np.take_along_axis(part_scores, order, axis=1)
+
+    return scores, ids
+
+def recall_at_k(approx_ids: np.ndarray, exact_ids: np.ndarray) -> float:
+    """Proportion moyenne des vrais k voisins retrouvés"""
+    k = exact_ids.shape[1]
+    hits = 0
+    for approx_row, exact_row in zip(approx_ids, exact_ids):
+        hits += len(set(approx_row[:k].tolist()) & set(exact_row.tolist()))
+    return hits / exact_ids.size
+
+def pair_set(rows: np.ndarray, cols: np.ndarray) -> set:
+    """Ensemble de paires (source, cible)"""
+    return set(zip(rows.tolist(), cols.tolist()))
+
+@contextmanager
+def timer(results: dict, key: str):
+    """Mesurer la durée d'un bloc en secondes"""
+    start = time.perf_counter()
+    yield
+    results[key] = time.perf_counter() - start
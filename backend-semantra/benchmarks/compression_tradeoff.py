@@ -0,0 +1,88 @@
+"""Benchmark réduction de dimension / quantification int8 face à la pleine précision
+
+Rapporte, pour chaque configuration, l'accélération du calcul de similarité,
+la mémoire des vecteurs et le recouvrement des meilleures suggestions
+(top-k par page) avec la pleine précision.
+
+Usage : python -m benchmarks.compression_tradeoff --pages 20000 --dimensions 3072
+"""
+import argparse
+import numpy as np
+
+from app.services.embedding_compression import Int8Vectors, reduce_dimensions
+from app.services.similarity_service import SimilarityService
+from benchmarks.common import load_or_generate_embeddings, recall_at_k, timer
+
+def top_k_ids(rows: np.ndarray, cols: np.ndarray, pages: int, k: int) -> np.ndarray:
+    """Matrice (pages, k) des voisins retenus, complétée par -1"""
+    ids = np.full((pages, k), -1, dtype=np.int64)
+    counts = np.zeros(pages, dtype=np.int64)
+    for row, col in zip(rows.tolist(), cols.tolist()):
+        if counts[row] < k:
+            ids[row, counts[row]] = col
+            counts[row] += 1
+    return ids
+
+def run(analysis_id: str, pages: int, dimensions: int, k: int, model: str):
+    full = load_or_generate_embeddings(analysis_id, pages, dimensions)
+    pages, dimensions = full.shape
+    base_settings = {
+        "similarity_mode": "top_k",
+        "similarity_top_k": k,
+        "similarity_threshold": -1.0,
+        "embedding_model": model
+    }
+
+    timings = {}
+    with timer(timings, "similarity"):
+        rows, cols, _ = SimilarityService(base_settings).find_pairs(full, normalized=True)
+    reference = top_k_ids(rows, cols, pages, k)
+    reference_time = timings["similarity"]
+
+    print(f"{pages} pages, {dimensions} dimensions, top-{k} par page, modèle {model}")
+    print(f"{'configuration':<26}{'mémoire':>10}{'gain mém.':>11}{'temps':>9}{'accél.':>8}{'recouvr.':>10}")
+    print(f"{'pleine précision':<26}{full.nbytes / 1e6:>8.1f}Mo{1.0:>10.1f}x{reference_time:>8.2f}s{1.0:>7.1f}x{1.0:>10.3f}")
+
+    configurations = []
+    for target in (1024, 512, 256):
+        if target < dimensions:
+            configurations.append((target, "truncate", "none"))
+            configurations.append((target, "pca", "none"))
+    configurations.append((None, "auto", "int8"))
+    for target in (512, 256):
+        if target < dimensions:
+            configurations.append((target, "auto", "int8"))
+
+    for target, method, quantization in configurations:
+        settings = dict(
+            base_settings,
+            embedding_dimensions=target,
+            dimension_reduction=method,
+            embedding_quantization=quantization
+        )
+
+        # Mémoire des vecteurs effectivement utilisés pour la recherche
+        vectors = full
+        if target:
+            vectors, method = reduce_dimensions(full, target, model=model, method=method)
+        memory = Int8Vectors.quantize(vectors).nbytes if quantization == "int8" else vectors.nbytes
+
+        with timer(timings, "similarity"):
+            rows, cols, _ = SimilarityService(settings).find_pairs(full, normalized=True)
+        overlap = recall_at_k(top_k_ids(rows, cols, pages, k), reference)
+
+        label = f"{target or dimensions}d {method}" + (" int8" if quantization == "int8" else "")
+        print(
+            f"{label:<26}{memory / 1e6:>8.1f}Mo{full.nbytes / memory:>10.1f}x"
+            f"{timings['similarity']:>8.2f}s{reference_time / timings['similarity']:>7.1f}x{overlap:>10.3f}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--analysis-id", help="Utiliser les embeddings stockés d'une analyse")
+    parser.add_argument("--pages", type=int, default=20000)
+    parser.add_argument("--dimensions", type=int, default=3072)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--model", default="text-embedding-3-large")
+    args = parser.parse_args()
+    run(args.analysis_id, args.pages, args.dimensions, args.k, args.model)
@@ -0,0 +1,64 @@
+"""Passage à l'échelle du calcul des similarités sur plusieurs cœurs
+
+Pour chaque nombre de workers, mesure le moteur exact (ou celui choisi) en
+threads et en processus sur matrice partagée, vérifie que les paires sont
+identiques à l'exécution séquentielle et rapporte l'accélération.
+
+Usage : python -m benchmarks.parallel_similarity --pages 50000 --dimensions 768 --workers 1 2 4 8
+"""
+import argparse
+import numpy as np
+
+from app.services.similarity_service import SimilarityService
+from benchmarks.common import load_or_generate_embeddings, timer
+
+def pair_keys(rows: np.ndarray, cols: np.ndarray, pages: int) -> np.ndarray:
+    """Clés triées des paires orientées, sans ensemble Python"""
+    return np.sort(rows * pages + cols)
+
+def run(analysis_id: str, pages: int, dimensions: int, workers_list, engine: str, mode: str, threshold: float):
+    vectors = load_or_generate_embeddings(analysis_id, pages, dimensions)
+    pages, dimensions = vectors.shape
+    print(f"{pages} pages, {dimensions} dimensions, moteur {engine} ({mode})")
+    print(f"{'workers':<9}{'exécution':<11}{'paires':>12}{'temps':>9}{'accél.':>8}  vérification")
+
+    base_settings = {
+        "similarity_engine": engine,
+        "similarity_mode": mode,
+        "similarity_threshold": threshold
+    }
+
+    timings = {}
+    with timer(timings, "sequential"):
+        rows, cols, _ = SimilarityService(dict(base_settings, similarity_workers=1)).find_pairs(vectors, normalized=True)
+    expected = pair_keys(rows, cols, pages)
+    print(f"{1:<9}{'séquentiel':<11}{expected.size:>12}{timings['sequential']:>8.2f}s{1.0:>7.1f}x")
+
+    for workers in workers_list:
+        for executor in ("threads", "processes"):
+            settings = dict(
+                base_settings,
+                similarity_workers=workers,
+                partition_workers=workers,
+                similarity_executor=executor
+            )
+            with timer(timings, executor):
+                rows, cols, _ = SimilarityService(settings).find_pairs(vectors, normalized=True)
+            found = pair_keys(rows, cols, pages)
+            check = "identique" if np.array_equal(found, expected) else f"ÉCHEC ({found.size} paires)"
+            print(
+                f"{workers:<9}{executor:<11}{found.size:>12}{timings[executor]:>8.2f}s"
+                f"{timings['sequential'] / timings[executor]:>7.1f}x  {check}"
+            )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--analysis-id", help="Utiliser les embeddings stockés d'une analyse")
+    parser.add_argument("--pages", type=int, default=50000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--engine", default="exact", choices=["exact", "partitioned", "pruned"])
+    parser.add_argument("--mode", default="threshold", choices=["threshold", "top_k"])
+    parser.add_argument("--threshold", type=float, default=0.8)
+    args = parser.parse_args()
+    run(args.analysis_id, args.pages, args.dimensions, args.workers, args.engine, args.mode, args.threshold)
@@ -0,0 +1,64 @@
+"""Jointure exacte par seuil avec élagage face au calcul exhaustif
+
+Pour chaque seuil, vérifie que le moteur `pruned` retourne exactement les
+mêmes paires que le moteur exact (aux arrondis float32 près : seules des
+paires à moins de 1e-5 du seuil peuvent différer) et rapporte la part des
+produits scalaires évités et l'accélération.
+
+Usage : python -m benchmarks.threshold_join --pages 20000 --dimensions 768
+"""
+import argparse
+import numpy as np
+
+from app.services.similarity_service import SimilarityService
+from benchmarks.common import load_or_generate_embeddings, timer
+
+def pair_keys(rows: np.ndarray, cols: np.ndarray, pages: int) -> np.ndarray:
+    """Clés triées des paires (i < j), sans ensemble Python"""
+    return np.unique(np.minimum(rows, cols) * pages + np.maximum(rows, cols))
+
+def run(analysis_id: str, pages: int, dimensions: int, thresholds, clusters: int):
+    vectors = load_or_generate_embeddings(analysis_id, pages, dimensions)
+    pages, dimensions = vectors.shape
+    print(f"{pages} pages, {dimensions} dimensions")
+    print(f"{'seuil':<8}{'paires':>12}{'exact':>9}{'élagué':>9}{'accél.':>8}{'évités':>9}  vérification")
+
+    timings = {}
+    for threshold in thresholds:
+        base_settings = {"similarity_mode": "threshold", "similarity_threshold": threshold}
+
+        with timer(timings, "exact"):
+            rows, cols, scores = SimilarityService(base_settings).find_pairs(vectors, normalized=True)
+        service = SimilarityService(dict(base_settings, similarity_engine="pruned", partition_clusters=clusters))
+        with timer(timings, "pruned"):
+            pruned_rows, pruned_cols, _ = service.find_pairs(vectors, normalized=True)
+
+        expected = pair_keys(rows, cols, pages)
+        found = pair_keys(pruned_rows, pruned_cols, pages)
+        # Écarts tolérés : paires au ras du seuil, dont le score dépend de l'ordre des sommes
+        differences = np.setxor1d(expected, found, assume_unique=True)
+        left, right = differences // pages, differences % pages
+        gaps = np.abs(np.einsum("ij,ij->i", vectors[left], vectors[right]) - threshold)
+        if differences.size == 0:
+            check = "identique"
+        elif gaps.max() < 1e-5:
+            check = f"{differences.size} paires au ras du seuil"
+        else:
+            check = f"ÉCHEC ({differences.size} paires)"
+
+        stats = service.join_stats
+        avoided = 1.0 - stats["computed_products"] / max(stats["total_products"], 1)
+        print(
+            f"{threshold:<8.2f}{expected.size:>12}{timings['exact']:>8.2f}s{timings['pruned']:>8.2f}s"
+            f"{timings['exact'] / timings['pruned']:>7.1f}x{max(avoided, 0.0):>9.1%}  {check}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--analysis-id", help="Utiliser les embeddings stockés d'une analyse")
+    parser.add_argument("--pages", type=int, default=20000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.7, 0.75, 0.8, 0.85])
+    parser.add_argument("--clusters", type=int, help="Nombre de partitions (défaut : racine carrée des pages)")
+    args = parser.parse_args()
+    run(args.analysis_id, args.pages, args.dimensions, args.thresholds, args.clusters)
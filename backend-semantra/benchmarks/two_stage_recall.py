@@ -0,0 +1,66 @@
+"""Benchmark de la recherche en deux étapes face au top-k exact
+
+Étape 1 : candidats tirés de vecteurs réduits (et quantifiés int8) ;
+étape 2 : rescoring des seuls candidats avec les vecteurs pleine précision.
+Rapporte, pour chaque configuration, le rappel@k par rapport au calcul exact
+et l'accélération obtenue.
+
+Usage : python -m benchmarks.two_stage_recall --pages 20000 --dimensions 3072
+"""
+import argparse
+
+from app.services.similarity_service import SimilarityService
+from benchmarks.common import load_or_generate_embeddings, recall_at_k, timer
+from benchmarks.compression_tradeoff import top_k_ids
+
+def run(analysis_id: str, pages: int, dimensions: int, k: int, model: str):
+    vectors = load_or_generate_embeddings(analysis_id, pages, dimensions)
+    pages, dimensions = vectors.shape
+    base_settings = {
+        "similarity_mode": "top_k",
+        "similarity_top_k": k,
+        "similarity_threshold": -1.0,
+        "embedding_model": model
+    }
+
+    timings = {}
+    with timer(timings, "similarity"):
+        rows, cols, _ = SimilarityService(base_settings).find_pairs(vectors, normalized=True)
+    reference = top_k_ids(rows, cols, pages, k)
+    reference_time = timings["similarity"]
+
+    print(f"{pages} pages, {dimensions} dimensions, top-{k} par page, modèle {model}")
+    print(f"{'candidats':<22}{'facteur':>8}{'temps':>9}{'accél.':>8}{f'rappel@{k}':>11}")
+    print(f"{'exact':<22}{'-':>8}{reference_time:>8.2f}s{1.0:>7.1f}x{1.0:>11.3f}")
+
+    for candidate_dimensions in (512, 256, 128):
+        if candidate_dimensions >= dimensions:
+            continue
+        for quantization in ("none", "int8"):
+            for factor in (2, 4, 8):
+                settings = dict(
+                    base_settings,
+                    similarity_engine="two_stage",
+                    candidate_dimensions=candidate_dimensions,
+                    candidate_quantization=quantization,
+                    rerank_factor=factor
+                )
+                with timer(timings, "similarity"):
+                    rows, cols, _ = SimilarityService(settings).find_pairs(vectors, normalized=True)
+                recall = recall_at_k(top_k_ids(rows, cols, pages, k), reference)
+
+                label = f"{candidate_dimensions}d" + (" int8" if quantization == "int8" else "")
+                print(
+                    f"{label:<22}{factor:>7}x{timings['similarity']:>8.2f}s"
+                    f"{reference_time / timings['similarity']:>7.1f}x{recall:>11.3f}"
+                )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--analysis-id", help="Utiliser les embeddings stockés d'une analyse")
+    parser.add_argument("--pages", type=int, default=20000)
+    parser.add_argument("--dimensions", type=int, default=3072)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--model", default="text-embedding-3-large")
+    args = parser.parse_args()
+    run(args.analysis_id, args.pages, args.dimensions, args.k, args.model)
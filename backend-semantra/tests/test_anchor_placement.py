@@ -0,0 +1,65 @@
+import pytest
+
+from app.services.anchor_placement import AnchorPlacer, lower_with_offsets, normalize_anchor
+
+TEXTS = [
+    "Le Jardin Potager : semer les tomates et l'arrosage au goutte-à-goutte.",
+    # « İ » devient deux caractères en minuscules : les positions se décalent
+    "İSTANBUL, İZMİR et İNEGÖL. Visite du Jardin Potager, puis arrosage des Tomates.",
+    "STRAẞE İİİ — jardinage, Jardin potager partagé ; ARROSAGE automatique.",
+    "Sans aucune ancre ici."
+]
+
+CANDIDATES = [
+    ["jardin potager"],
+    ["semis de tomates", "Tomates"],
+    ["  ARROSAGE  "],
+    ["jardin"],
+    ["inexistant", ""]
+]
+
+def brute_force_placement(text: str, anchors: list):
+    """Première ancre trouvée (limites de mots, casse ignorée) et sa position dans le texte d'origine"""
+    for rank, anchor in enumerate(anchors):
+        pattern = normalize_anchor(anchor)
+        if not pattern:
+            continue
+        for start in range(len(text)):
+            for end in range(start + 1, len(text) + 1):
+                if text[start:end].lower() != pattern:
+                    continue
+                if start > 0 and text[start - 1].isalnum():
+                    continue
+                if end < len(text) and text[end].isalnum():
+                    continue
+                return rank, start, end
+    return None
+
+def test_lower_with_offsets_maps_back_to_original():
+    text = "aİbẞc"
+    lowered, offsets = lower_with_offsets(text)
+    assert lowered == text.lower()
+    assert len(offsets) == len(lowered) + 1
+    assert [text[offsets[index]] for index in range(len(lowered))] == ["a", "İ", "İ", "b", "ẞ", "c"]
+    assert lower_with_offsets("Jardin") == ("jardin", None)
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_placement_matches_brute_force(text):
+    placements = AnchorPlacer(snippet_chars=10).place(text, CANDIDATES)
+    assert len(placements) == len(CANDIDATES)
+    for anchors, placement in zip(CANDIDATES, placements):
+        expected = brute_force_placement(text, anchors)
+        if expected is None:
+            assert placement is None
+            continue
+        rank, start, end = expected
+        assert (placement["candidate_rank"], placement["start"], placement["end"]) == (rank, start, end)
+        assert placement["anchor"] == anchors[rank]
+        assert placement["matched_text"] == text[start:end]
+        assert placement["matched_text"].lower() == normalize_anchor(anchors[rank])
+        assert placement["matched_text"] in placement["snippet"]
+
+def test_placement_ignores_partial_words():
+    text = "Le jardinage du jardinier, puis le jardin."
+    placement = AnchorPlacer().place(text, [["jardin"]])[0]
+    assert (placement["start"], placement["end"]) == (text.rindex("jardin"), text.rindex("jardin") + len("jardin"))
\ No newline at end of file
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from app.services.lexical_index import reciprocal_rank_fusion
+
+PAGES = 50
+NEIGHBOURS = 8
+
+@pytest.fixture(scope="module")
+def rankings() -> list:
+    """Listes de voisins de plusieurs moteurs (scores distincts par page, voisins en partie communs)"""
+    rng = np.random.default_rng(3)
+    lists = []
+    for _ in range(3):
+        rows, cols = [], []
+        for page in range(PAGES):
+            neighbours = rng.choice(np.delete(np.arange(PAGES), page), size=NEIGHBOURS, replace=False)
+            rows.extend([page] * NEIGHBOURS)
+            cols.extend(neighbours.tolist())
+        order = rng.permutation(len(rows))
+        lists.append((
+            np.asarray(rows, dtype=np.int64)[order],
+            np.asarray(cols, dtype=np.int64)[order],
+            rng.random(len(rows)).astype(np.float32)
+        ))
+    return lists
+
+def brute_force_fusion(rankings: list, k: int) -> dict:
+    """Score fusionné de chaque paire : somme des 1 / (k + rang), ramenée dans [0, 1]"""
+    fused = {}
+    for rows, cols, scores in rankings:
+        for page in range(PAGES):
+            mask = rows == page
+            ranked = cols[mask][np.argsort(-scores[mask])]
+            for rank, target in enumerate(ranked.tolist(), start=1):
+                fused[(page, target)] = fused.get((page, target), 0.0) + 1.0 / (k + rank)
+    return {pair: score * (k + 1) / len(rankings) for pair, score in fused.items()}
+
+@pytest.mark.parametrize("k", [1, 60])
+def test_fusion_matches_brute_force(rankings, k):
+    expected = brute_force_fusion(rankings, k)
+    rows, cols, scores = reciprocal_rank_fusion(rankings, PAGES, top_k=PAGES, k=k)
+    fused = dict(zip(zip(rows.tolist(), cols.tolist()), scores.tolist()))
+    assert fused.keys() == expected.keys()
+    for pair, score in expected.items():
+        assert fused[pair] == pytest.approx(score, rel=1e-6)
+
+@pytest.mark.parametrize("top_k", [1, 3, 10])
+def test_fusion_keeps_best_ranked_neighbours(rankings, top_k):
+    expected = brute_force_fusion(rankings, 60)
+    rows, cols, scores = reciprocal_rank_fusion(rankings, PAGES, top_k=top_k, k=60)
+    assert np.all(np.diff(rows) >= 0)
+    for page in range(PAGES):
+        mask = rows == page
+        page_scores = scores[mask]
+        assert np.all(np.diff(page_scores) <= 0)
+        best = sorted((score for (source, _), score in expected.items() if source == page), reverse=True)[:top_k]
+        assert page_scores.tolist() == pytest.approx(best, rel=1e-6)
+        assert page not in cols[mask].tolist()
+
+def test_fusion_of_identical_rankings_keeps_order(rankings):
+    rows, cols, scores = rankings[0]
+    fused_rows, fused_cols, fused_scores = reciprocal_rank_fusion([rankings[0]] * 2, PAGES, top_k=NEIGHBOURS)
+    order = np.lexsort((-scores, rows))
+    assert fused_rows.tolist() == rows[order].tolist()
+    assert fused_cols.tolist() == cols[order].tolist()
+    assert fused_scores[np.searchsorted(fused_rows, np.arange(PAGES))].tolist() == pytest.approx([1.0] * PAGES)
\ No newline at end of file
@@ -0,0 +1,143 @@
+import hashlib
+from datetime import datetime
+
+import pytest
+
+from app.core.config import settings
+from app.services.html_store import HtmlBlobStore, site_key
+from app.services.page_store import PAGE_FIELD_COLUMNS, PageReader, PageWriter
+
+PAGES = 23
+
+def page_html(index: int) -> str:
+    """HTML d'une page : gabarit commun du site et contenu propre à la page"""
+    body = " ".join(f"paragraphe {index} mot {word}" for word in range(index % 7 + 3))
+    return (
+        "<html><head><title>Site</title><link rel='stylesheet' href='/style.css'></head>"
+        "<body><nav><a href='/'>Accueil</a><a href='/blog'>Blog</a><a href='/contact'>Contact</a></nav>"
+        f"<main><h1>Page {index}</h1><p>{body}</p></main><footer>Mentions légales</footer></body></html>"
+    )
+
+def content_hash(html: str) -> str:
+    """Empreinte du contenu"""
+    return hashlib.sha256(html.encode("utf-8")).hexdigest()
+
+@pytest.fixture
+def pages() -> list:
+    """Pages crawlées (une sur deux avec son HTML dans le fichier, les autres dans les blobs)"""
+    records = []
+    for index in range(PAGES):
+        html = page_html(index)
+        records.append({
+            "url": f"https://exemple.fr/page-{index}",
+            "status_code": 200,
+            "title": f"Page {index}",
+            "description": None if index % 5 == 0 else f"Description {index}",
+            "headings": [f"Titre {index}", "Sous-titre"],
+            "text": f"Texte de la page {index}",
+            "outlinks": [f"https://exemple.fr/page-{(index + 1) % PAGES}"],
+            "content_hash": content_hash(html),
+            "content_bytes": len(html.encode("utf-8")),
+            "fetched_at": datetime(2024, 5, 1, 12, 0, index),
+            "fetch_ms": 12.5,
+            "content": html if index % 2 == 0 else None
+        })
+    return records
+
+def write_pages(path: str, pages: list, row_group_size: int) -> int:
+    """Écrire les pages dans un fichier Parquet"""
+    with PageWriter(path, row_group_size=row_group_size) as writer:
+        writer.write_all(pages)
+    return writer.count
+
+@pytest.mark.parametrize("row_group_size", [1, 4, 100])
+def test_page_round_trip(tmp_path, pages, row_group_size):
+    path = str(tmp_path / "pages.parquet")
+    assert write_pages(path, pages, row_group_size) == PAGES
+
+    reader = PageReader([path])
+    assert len(reader) == PAGES
+    assert reader.read() == pages
+    assert [list(page) for page in reader.iter_pages(PAGE_FIELD_COLUMNS)] == [list(PAGE_FIELD_COLUMNS)] * PAGES
+    assert reader.read(PAGE_FIELD_COLUMNS) == [{column: page[column] for column in PAGE_FIELD_COLUMNS} for page in pages]
+    assert reader.column("url") == [page["url"] for page in pages]
+
+def test_page_reader_filters_urls_across_files(tmp_path, pages):
+    paths = [str(tmp_path / f"pages-{part:04d}.parquet") for part in range(2)]
+    write_pages(paths[0], pages[:10], 3)
+    write_pages(paths[1], pages[10:], 3)
+
+    reader = PageReader(paths)
+    assert len(reader) == PAGES
+    urls = {pages[index]["url"] for index in (0, 7, 12, 22)}
+    assert reader.read(["title"], urls=urls) == [
+        {"title": pages[index]["title"], "url": pages[index]["url"]} for index in (0, 7, 12, 22)
+    ]
+    assert reader.read(["url"], urls=set()) == []
+
+def test_empty_page_file_keeps_schema(tmp_path):
+    path = str(tmp_path / "pages.parquet")
+    assert write_pages(path, [], 10) == 0
+    reader = PageReader([path])
+    assert len(reader) == 0
+    assert reader.read() == []
+    assert reader.column("content") == []
+
+def test_page_reader_loads_content_from_blobs(tmp_path, pages):
+    store = HtmlBlobStore(base_dir=str(tmp_path / "html"))
+    for index, page in enumerate(pages):
+        if page["content"] is None:
+            store.put(page["content_hash"], page_html(index))
+    path = str(tmp_path / "pages.parquet")
+    write_pages(path, pages, 4)
+
+    expected = [{"url": page["url"], "content": page_html(index)} for index, page in enumerate(pages)]
+    assert PageReader([path], blobs=store).read(["url", "content"]) == expected
+    assert PageReader([path]).read(["url", "content"]) == [
+        {"url": page["url"], "content": page["content"]} for page in pages
+    ]
+    assert PageReader([path], blobs=store).read(["content"], urls={pages[1]["url"]}) == [
+        {"content": page_html(1), "url": pages[1]["url"]}
+    ]
+
+def test_blob_store_round_trip_and_deduplication(tmp_path):
+    store = HtmlBlobStore(base_dir=str(tmp_path))
+    html = page_html(3) + " — accents éèà et emoji 🌱"
+    key = content_hash(html)
+    assert store.get(key) is None
+    assert not store.exists(key)
+    assert store.put(key, html) > 0
+    assert store.put(key, html) is None
+    assert store.exists(key)
+    assert store.get(key) == html
+    assert HtmlBlobStore(base_dir=str(tmp_path)).get(key) == html
+
+@pytest.mark.parametrize("samples", [8, 1000])
+def test_blob_writer_round_trip(tmp_path, monkeypatch, samples):
+    monkeypatch.setattr(settings, "HTML_STORE_DICTIONARY_SAMPLES", samples)
+    monkeypatch.setattr(settings, "HTML_STORE_DICTIONARY_SIZE", 4096)
+    site = site_key("https://Exemple.fr/page")
+    store = HtmlBlobStore(base_dir=str(tmp_path))
+    documents = [page_html(index % 40) for index in range(60)]
+
+    with store.writer(site) as writer:
+        for html in documents:
+            writer.put(content_hash(html), html)
+    stats = writer.stats
+
+    assert stats["pages"] == 60
+    assert stats["stored"] == 40
+    assert stats["deduplicated"] == 20
+    assert 0 < stats["compressed_bytes"] < stats["bytes"]
+    trained = store.site_dictionary(site)
+    if samples < 40:
+        assert trained is not None
+        assert stats["dictionary"] == trained.dict_id()
+    else:
+        # Site plus petit que l'échantillon : blobs compressés sans dictionnaire
+        assert trained is None
+        assert stats["dictionary"] is None
+
+    reopened = HtmlBlobStore(base_dir=str(tmp_path))
+    for html in documents:
+        assert reopened.get(content_hash(html)) == html
\ No newline at end of file
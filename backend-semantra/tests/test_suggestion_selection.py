@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from app.services.suggestion_selection import SuggestionSelector
+
+PAGES = 60
+
+@pytest.fixture(scope="module")
+def candidates():
+    """Toutes les paires orientées d'un petit site, scores distincts"""
+    rng = np.random.default_rng(7)
+    rows, cols = np.nonzero(~np.eye(PAGES, dtype=bool))
+    scores = rng.permutation(rows.size).astype(np.float32) / rows.size
+    return rows.astype(np.int64), cols.astype(np.int64), scores
+
+def brute_force_greedy(rows, cols, scores, max_outlinks, max_inlinks, max_total) -> list:
+    """Sélection gloutonne de référence sur toutes les paires"""
+    outlinks, inlinks, selected = {}, {}, []
+    for position in np.argsort(-scores, kind="stable").tolist():
+        source, target = int(rows[position]), int(cols[position])
+        if max_outlinks and outlinks.get(source, 0) >= max_outlinks:
+            continue
+        if max_inlinks and inlinks.get(target, 0) >= max_inlinks:
+            continue
+        outlinks[source] = outlinks.get(source, 0) + 1
+        inlinks[target] = inlinks.get(target, 0) + 1
+        selected.append((source, target))
+        if max_total and len(selected) >= max_total:
+            break
+    return selected
+
+def selector_pairs(candidates, batch_size: int, **budgets) -> list:
+    """Paires retenues par le sélecteur, candidats ajoutés par lots"""
+    rows, cols, scores = candidates
+    selector = SuggestionSelector(merge_min_size=batch_size, **budgets)
+    for start in range(0, rows.size, batch_size):
+        selector.add(rows[start:start + batch_size], cols[start:start + batch_size], scores[start:start + batch_size])
+    selected_rows, selected_cols, _ = selector.select()
+    return list(zip(selected_rows.tolist(), selected_cols.tolist()))
+
+@pytest.mark.parametrize("budgets", [
+    {"max_outlinks": 3},
+    {"max_inlinks": 2, "max_total": 40},
+    {"max_outlinks": 2, "max_total": 50},
+    {"max_total": 25},
+    {"max_outlinks": 3, "max_inlinks": 2, "max_total": 80, "overfetch": PAGES}
+])
+@pytest.mark.parametrize("batch_size", [97, 100_000])
+def test_selection_matches_brute_force(candidates, budgets, batch_size):
+    expected = brute_force_greedy(*candidates, budgets.get("max_outlinks"), budgets.get("max_inlinks"), budgets.get("max_total"))
+    assert selector_pairs(candidates, batch_size, **budgets) == expected
+
+@pytest.mark.parametrize("batch_size", [97, 100_000])
+def test_selection_respects_budgets(candidates, batch_size):
+    selected = selector_pairs(candidates, batch_size, max_outlinks=3, max_inlinks=2, max_total=80)
+    sources = np.bincount([source for source, _ in selected], minlength=PAGES)
+    targets = np.bincount([target for _, target in selected], minlength=PAGES)
+    assert len(set(selected)) == len(selected) == 80
+    assert sources.max() <= 3
+    assert targets.max() <= 2
+
+def test_selection_reaches_total_when_top_scores_concentrate():
+    # Les meilleurs scores partent tous de quelques pages saturées par leur budget
+    hubs = 3
+    rows, cols = np.nonzero(~np.eye(PAGES, dtype=bool))
+    scores = (np.where(rows < hubs, 1.0, 0.5) - cols / (10 * PAGES) - rows / (100 * PAGES * PAGES)).astype(np.float32)
+    selected = selector_pairs((rows.astype(np.int64), cols.astype(np.int64), scores), 500, max_outlinks=2, max_inlinks=5, max_total=30)
+    assert len(set(selected)) == len(selected) == 30
+    assert np.bincount([source for source, _ in selected]).max() <= 2
+    assert np.bincount([target for _, target in selected]).max() <= 5
+    assert selected[:2 * hubs] == brute_force_greedy(rows, cols, scores, 2, 5, 2 * hubs)
\ No newline at end of file
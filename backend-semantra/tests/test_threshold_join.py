@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from app.services.similarity_service import SimilarityService
+
+PAGES = 400
+DIMENSIONS = 32
+
+@pytest.fixture(scope="module")
+def vectors() -> np.ndarray:
+    """Embeddings normalisés regroupés par thèmes (beaucoup de paires proches)"""
+    rng = np.random.default_rng(42)
+    centers = rng.standard_normal((10, DIMENSIONS))
+    matrix = centers[rng.integers(0, len(centers), PAGES)] + 0.4 * rng.standard_normal((PAGES, DIMENSIONS))
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix.astype(np.float32)
+
+@pytest.fixture(scope="module")
+def exact_scores(vectors: np.ndarray) -> np.ndarray:
+    """Similarités de référence en double précision"""
+    matrix = vectors.astype(np.float64)
+    return matrix @ matrix.T
+
+def separated_threshold(scores: np.ndarray, target: float) -> float:
+    """Seuil proche de `target`, au milieu du plus grand écart entre deux scores voisins
+
+    Aucune paire n'est au ras du seuil : l'arrondi float32 des moteurs ne
+    peut pas faire basculer une paire d'un côté ou de l'autre.
+    """
+    values = np.sort(scores[np.triu_indices(scores.shape[0], k=1)])
+    window = values[(values > target - 0.05) & (values < target + 0.05)]
+    gaps = np.diff(window)
+    best = int(np.argmax(gaps))
+    assert gaps[best] > 1e-5
+    return float((window[best] + window[best + 1]) / 2)
+
+def brute_force_pairs(scores: np.ndarray, threshold: float) -> set:
+    """Toutes les paires i < j au-dessus du seuil"""
+    rows, cols = np.nonzero(np.triu(scores >= threshold, k=1))
+    return set(zip(rows.tolist(), cols.tolist()))
+
+def engine_pairs(vectors: np.ndarray, ai_settings: dict) -> set:
+    """Paires d'un moteur, orientées i < j"""
+    rows, cols, _ = SimilarityService(ai_settings).find_pairs(vectors, normalized=True)
+    sources, targets = np.minimum(rows, cols), np.maximum(rows, cols)
+    return set(zip(sources.tolist(), targets.tolist()))
+
+@pytest.mark.parametrize("target", [0.5, 0.7, 0.85])
+@pytest.mark.parametrize("executor", ["threads", "processes"])
+@pytest.mark.parametrize("engine", ["exact", "pruned"])
+def test_engine_matches_brute_force(vectors, exact_scores, engine, executor, target):
+    threshold = separated_threshold(exact_scores, target)
+    ai_settings = {
+        "similarity_engine": engine,
+        "similarity_mode": "threshold",
+        "similarity_threshold": threshold,
+        "similarity_executor": executor,
+        "similarity_workers": 2,
+        # Budget minuscule : plusieurs tuiles, donc plusieurs tâches réparties
+        "similarity_tile_memory_mb": 0.02,
+        "partition_clusters": 8
+    }
+
+    expected = brute_force_pairs(exact_scores, threshold)
+    assert expected
+    assert engine_pairs(vectors, ai_settings) == expected
+
+def test_pruned_join_skips_blocks(vectors, exact_scores):
+    threshold = separated_threshold(exact_scores, 0.85)
+    service = SimilarityService({
+        "similarity_engine": "pruned",
+        "similarity_threshold": threshold,
+        "similarity_executor": "threads",
+        "similarity_workers": 2,
+        "partition_clusters": 8
+    })
+    rows, cols, _ = service.find_pairs(vectors, normalized=True)
+
+    assert len(rows) == len(brute_force_pairs(exact_scores, threshold))
+    assert service.join_stats["computed_products"] < service.join_stats["total_products"]
\ No newline at end of file